@@ -164,6 +164,9 @@ class GPSDataAdmin(admin.ModelAdmin):
         'filename', 'start', 'end', 'number_entries'
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).metadata()
+
 
 @admin.register(NoGoAreas)
 class NoGoAreasAdmin(admin.ModelAdmin):
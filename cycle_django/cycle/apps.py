@@ -1,8 +1,10 @@
 import atexit
 import sys
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 from django.db.utils import OperationalError
 from .background import BackgroundThread
+from .spatial_index import create_table
 
 from my_base import Logging, SETTINGS_DIR
 
@@ -15,6 +17,7 @@ class CycleConfig(AppConfig):
 
     def ready(self):
         #super().ready()
+        post_migrate.connect(create_table, sender=self)
         if 'makemigrations' not in sys.argv and 'migrate' not in sys.argv and 'collectstatic' not in sys.argv:
             self.add_superuser()
             self.add_bicycle_if_none()
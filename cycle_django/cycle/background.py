@@ -1,10 +1,12 @@
 import os
 import psutil
 import threading
+from typing import Dict, Set
 from django.db.utils import OperationalError
 from django.conf import settings
 
-from my_base import Logging, TILES_FOLDERS
+from my_base import Logging, GPX_FOLDERS, PHOTO_FOLDERS, TILES_FOLDERS, photoStorage
+from .watcher import FileWatcher
 
 
 logger = Logging.setup_logger(__name__)
@@ -26,9 +28,30 @@ class BackgroundThread(threading.Thread):
         return cls._instance
 
     def run(self):
-        while not self.stopped.wait(self.first_interval or self.interval):
-            self.load_data_if_new()
-            self.first_interval = None
+        if self.stopped.wait(self.first_interval or self.interval):
+            return
+        self.load_data_if_new()
+        watcher = self.create_watcher()
+        try:
+            while not self.stopped.is_set():
+                # Without changes the summaries and deleted GPSData entries are still checked every interval
+                changes = watcher.wait_for_changes(self.interval, stopped=self.stopped)
+                if not self.stopped.is_set():
+                    self.load_changed_data(changes)
+        finally:
+            watcher.close()
+
+    def create_watcher(self) -> FileWatcher:
+        from .backup import LOAD_DUMP_FOLDER, SEGMENTS_SUFFIX
+        from .models import GPSData
+        watcher = FileWatcher(poll_interval=self.interval)
+        watcher.watch(LOAD_DUMP_FOLDER, 'dumps')
+        watcher.watch(os.path.join(LOAD_DUMP_FOLDER, GPSData.table_name + SEGMENTS_SUFFIX), 'dumps')
+        for folder in GPX_FOLDERS:
+            watcher.watch(folder, 'gpx', recursive=True)
+        for folder in PHOTO_FOLDERS:
+            watcher.watch(folder, 'photos', recursive=True)
+        return watcher
 
     def stop(self):
         self.stopped.set()
@@ -50,30 +73,83 @@ class BackgroundThread(threading.Thread):
         super().start()
 
     @staticmethod
-    def load_data_if_new():
+    def run_loader(model, loader):
+        try:
+            loader()
+        except EOFError as e:
+            logger.warning(f"File was not fully transferred?: {e}")
+        except OperationalError as e:
+            if str(e).startswith("no such table: "):
+                logger.warning(f"Missing Table for {model}")
+            elif str(e).startswith("database is locked"):
+                logger.warning(f"Database was locked when trying to load data for {model}")
+            else:
+                raise
+
+    @staticmethod
+    def update_summaries():
+        from .models import CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary
+        for summary in [CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary]:
+            summary.update_fields()
+
+    @staticmethod
+    def update_spatial_index():
+        # The only place that writes the index, the requests only read it, e.g. the tracks after an import
+        from .spatial_index import spatial_index
+        spatial_index.sync()
+
+    @classmethod
+    def load_data_if_new(cls):
         from .models import (
-            Bicycles, CycleRides, CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary, NoGoAreas,
-            GPSFilesToIgnore, GPSData, GeoLocateData, PhotoData
+            Bicycles, CycleRides, NoGoAreas, GPSFilesToIgnore, GPSData, GeoLocateData, PhotoData
         )
         for model in Bicycles, CycleRides, NoGoAreas, GPSFilesToIgnore, GPSData, GeoLocateData, PhotoData:
-            try:
-                model.load_data()
-            except EOFError as e:
-                logger.warning(f"File was not fully transferred?: {e}")
-            except OperationalError as e:
-                if str(e).startswith("no such table: "):
-                    logger.warning(f"Missing Table for {model}")
-                elif str(e).startswith("database is locked"):
-                    logger.warning(f"Database was locked when trying to load data for {model}")
-                else:
-                    raise
-        for summary in [CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary]:
-            summary.update_fields()
+            cls.run_loader(model, model.load_data)
+        cls.update_summaries()
+        cls.run_loader('spatial index', cls.update_spatial_index)
+
+    @classmethod
+    def load_changed_data(cls, changes: Dict[str, Set[str]]):
+        """ Only run the loaders that are affected by the changed files """
+        from .backup import DUMP_SUFFIX, SEGMENTS_SUFFIX
+        from .models import (
+            Bicycles, CycleRides, NoGoAreas, GPSFilesToIgnore, GPSData, GeoLocateData, PhotoData,
+            gpx_folder_scanner
+        )
+        changed_tables = set()
+        for path in changes.get('dumps', set()):
+            name = os.path.basename(path)
+            folder_name = os.path.basename(os.path.dirname(path))
+            if name.endswith(DUMP_SUFFIX):
+                changed_tables.add(name[:-len(DUMP_SUFFIX)])
+            elif name.endswith(SEGMENTS_SUFFIX):
+                changed_tables.add(name[:-len(SEGMENTS_SUFFIX)])
+            elif folder_name.endswith(SEGMENTS_SUFFIX):
+                changed_tables.add(folder_name[:-len(SEGMENTS_SUFFIX)])
+            else:   # e.g. the folder itself, when events were lost
+                changed_tables.add(None)
+        for model in Bicycles, CycleRides, NoGoAreas, GPSFilesToIgnore, GPSData, GeoLocateData, PhotoData:
+            if model.table_name in changed_tables or None in changed_tables:
+                logger.info(f"Loading {model.table_name} because the database dump changed")
+                cls.run_loader(model, model.load_data)
+        if 'gpx' in changes:
+            # A modified file doesn't change the mtime of its directory, so the scanner needs to list it again
+            gpx_folder_scanner.invalidate(
+                {path if os.path.isdir(path) else os.path.dirname(path) for path in changes['gpx']}
+            )
+        # Also without changes, to find GPSData entries that were deleted by other processes
+        cls.run_loader(GPSData, GPSData.import_gpx_file_to_database)
+        if 'photos' in changes:
+            photoStorage.refresh()
+            cls.run_loader(PhotoData, PhotoData.store_files_in_static_folder)
+        cls.update_summaries()
+        cls.run_loader('spatial index', cls.update_spatial_index)
 
     def do_first_startup_tasks(self):
         from .models import PhotoData
         PhotoData.store_files_in_static_folder()
         self.link_tiles_folder()
+        self.link_plotly_js()
         logger.info("Finished first startup tasks")
 
     @staticmethod
@@ -86,3 +162,18 @@ class BackgroundThread(threading.Thread):
                     os.symlink(TILES_FOLDER, tiles_folder_in_static)
                     logger.info(f"Linked {tiles_folder_in_static} to {TILES_FOLDER}")
                     break
+
+    @staticmethod
+    def link_plotly_js():
+        # The plotly.js of the installed plotly package, with the version in the filename to be cached by the browsers
+        from .plot_data import PLOTLY_JS, PLOTLY_JS_SOURCE
+        static_folder = settings.STATICFILES_DIRS[0] if settings.DEBUG else settings.STATIC_ROOT
+        plotly_js_in_static = os.path.join(static_folder, PLOTLY_JS)
+        if os.path.islink(plotly_js_in_static) and os.readlink(plotly_js_in_static) != PLOTLY_JS_SOURCE:
+            # Left by another environment or an older installation of plotly
+            os.remove(plotly_js_in_static)
+            logger.info(f"Removed the stale link {plotly_js_in_static}")
+        if not os.path.lexists(plotly_js_in_static):
+            os.makedirs(os.path.dirname(plotly_js_in_static), exist_ok=True)
+            os.symlink(PLOTLY_JS_SOURCE, plotly_js_in_static)
+            logger.info(f"Linked {plotly_js_in_static} to {PLOTLY_JS_SOURCE}")
@@ -1,7 +1,15 @@
+import atexit
 import datetime
 import glob
 import gzip
+import itertools
+import json
 import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Set, Tuple, Union
+from django.apps import apps
+from django.core import serializers
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.core.serializers.base import DeserializationError
@@ -11,17 +19,38 @@ import cycle.models
 from my_base import Logging, create_folder_if_required
 
 BACKUP_FOLDER = "backup_database"
+# Dumps that are loaded into the database, mountpoint in Docker
+LOAD_DUMP_FOLDER = "load_db_dump_at_startup"
+DUMP_SUFFIX = "_dump.json.gz"
+# Seconds to collect changes before the queued backups are written
+BACKUP_WINDOW = float(os.environ.get("BACKUP_WINDOW", 10))
+# Incremental backups: folder with the segments and their manifest, next to the dump
+SEGMENTS_SUFFIX = "_segments"
+SEGMENTS_MANIFEST = "manifest.json"
+# Only these tables are backed up in segments, loading a deletion needs their QuerySet.delete(run_backup=False)
+SEGMENTED_TABLES = ("GPSData",)
+# Segments are merged into the full dump, when there are too many or they get too big compared to the dump
+COMPACT_SEGMENTS = int(os.environ.get("BACKUP_COMPACT_SEGMENTS", 50))
+COMPACT_SEGMENTS_SIZE_RATIO = 0.25
 
 logger = Logging.setup_logger(__name__)
 
 
 class Backup:
     file_changed_last_loaded = {}
+    segment_loaded = {}     # data_name: sequence of the last loaded segment
     warn_db_dump_not_found = ["No database dump found"]
 
-    def __init__(self):
+    def __init__(self, window: float = BACKUP_WINDOW):
         create_folder_if_required(BACKUP_FOLDER)
         super().__init__()
+        self.window = window
+        self.pending: Dict[str, Tuple[Union[Callable[[], bytes], None], bool]] = {}
+        self.pending_segments: Dict[str, Tuple[Set[str], Set[str]]] = {}  # data_name: (changed keys, deleted keys)
+        self.pending_lock = threading.Lock()
+        self.pending_event = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.worker = None
 
     @staticmethod
     def remove_old_files(data_name):
@@ -71,7 +100,7 @@ class Backup:
     def dump_database_table(table: str):
         # To load last changes on production instance
         call_command(
-            "dumpdata", "cycle." + table, output=os.path.join(BACKUP_FOLDER, table + "_dump.json.gz")
+            "dumpdata", "cycle." + table, output=os.path.join(BACKUP_FOLDER, table + DUMP_SUFFIX)
         )
 
     def backup_table(self, data_name: str, data: bytes, csv_dump: bool = True):
@@ -84,10 +113,134 @@ class Backup:
 
         self.dump_database_table(data_name)
 
-    def load_database_dump(self, data_name: str):
-        database_dump_file = data_name + '_dump.json.gz'
-        # "load_db_dump_at_startup" is mountpoint in Docker
-        filename = os.path.join("load_db_dump_at_startup", database_dump_file)
+    def queue_backup(
+            self, data_name: str, data_callable: Union[Callable[[], bytes], None] = None, csv_dump: bool = True
+    ):
+        """ Mark the table for a backup, which is written by a worker thread after the backup window, so several
+        changes result in one backup. The data for the csv dump is only created when the backup is written.
+        """
+        with self.pending_lock:
+            previous_callable, previous_csv_dump = self.pending.get(data_name, (None, False))
+            self.pending[data_name] = (data_callable or previous_callable, csv_dump or previous_csv_dump)
+            self.start_worker()
+        self.pending_event.set()
+
+    def queue_segment(self, data_name: str, changed: Iterable[str] = (), deleted: Iterable[str] = ()):
+        """ Mark entries (by primary key) for the incremental backup, see write_segment """
+        self.check_segmented(data_name)
+        changed = set(changed)
+        deleted = set(deleted)
+        if not changed and not deleted:
+            return
+        with self.pending_lock:
+            pending_changed, pending_deleted = self.pending_segments.setdefault(data_name, (set(), set()))
+            pending_changed.difference_update(deleted)
+            pending_changed.update(changed)
+            pending_deleted.difference_update(changed)
+            pending_deleted.update(deleted)
+            self.start_worker()
+        self.pending_event.set()
+
+    def start_worker(self):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run_worker, name="backup", daemon=True)
+            self.worker.start()
+            atexit.register(self.flush)
+
+    def run_worker(self):
+        while True:
+            self.pending_event.wait()
+            time.sleep(self.window)
+            self.flush()
+
+    def flush(self):
+        """ Write the queued backups, also called at exit """
+        with self.flush_lock:
+            with self.pending_lock:
+                pending, self.pending = self.pending, {}
+                pending_segments, self.pending_segments = self.pending_segments, {}
+                self.pending_event.clear()
+            for data_name, (data_callable, csv_dump) in pending.items():
+                csv_dump = csv_dump and data_callable is not None
+                try:
+                    self.backup_table(data_name, data_callable() if csv_dump else b'', csv_dump=csv_dump)
+                except Exception as e:
+                    logger.error(f"Backup of {data_name} failed: {e}")
+            for data_name, (changed, deleted) in pending_segments.items():
+                try:
+                    self.write_segment(data_name, changed, deleted)
+                except Exception as e:
+                    logger.error(f"Incremental backup of {data_name} failed: {e}")
+
+    @staticmethod
+    def check_segmented(data_name: str):
+        if data_name not in SEGMENTED_TABLES:
+            raise ValueError(f"{data_name} is not backed up in segments, only {', '.join(SEGMENTED_TABLES)}")
+
+    @staticmethod
+    def read_segments_manifest(folder: str) -> Dict:
+        """ The manifest lists the segments in order: sequence, file with the changed entries (if any) and the
+        primary keys of deleted entries. The full dump contains all segments up to base_sequence.
+        """
+        try:
+            with open(os.path.join(folder, SEGMENTS_MANIFEST), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"base_sequence": 0, "segments": []}
+
+    @staticmethod
+    def write_segments_manifest(folder: str, manifest: Dict):
+        # Replace the file in one step, so a reader never sees a partial manifest
+        tmp_filename = os.path.join(folder, SEGMENTS_MANIFEST + ".tmp")
+        with open(tmp_filename, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_filename, os.path.join(folder, SEGMENTS_MANIFEST))
+
+    def write_segment(self, data_name: str, changed: Set[str], deleted: Set[str]):
+        """ Append the changed entries and the deleted keys as a new segment instead of dumping the whole table.
+        The segments are compacted into the full dump from time to time.
+        """
+        folder = os.path.join(BACKUP_FOLDER, data_name + SEGMENTS_SUFFIX)
+        create_folder_if_required(folder)
+        manifest = self.read_segments_manifest(folder)
+        sequence = max([manifest["base_sequence"]] + [segment["sequence"] for segment in manifest["segments"]]) + 1
+        segment = {"sequence": sequence, "deleted": sorted(deleted)}
+        if changed:
+            model = apps.get_model("cycle", data_name)
+            keys = sorted(changed)
+            objs = itertools.chain.from_iterable(
+                model.objects.filter(pk__in=keys[ii:ii + 500]) for ii in range(0, len(keys), 500)
+            )
+            segment["file"] = f"{data_name}_{sequence:08d}.json.gz"
+            with gzip.open(os.path.join(folder, segment["file"]), "wt") as f:
+                serializers.serialize("json", objs, stream=f)
+        manifest["segments"].append(segment)
+
+        dump_filename = os.path.join(BACKUP_FOLDER, data_name + DUMP_SUFFIX)
+        segments_size = sum(
+            os.path.getsize(os.path.join(folder, entry["file"])) for entry in manifest["segments"] if "file" in entry
+        )
+        if (not os.path.isfile(dump_filename) or len(manifest["segments"]) >= COMPACT_SEGMENTS or
+                segments_size > COMPACT_SEGMENTS_SIZE_RATIO * os.path.getsize(dump_filename)):
+            self.dump_database_table(data_name)
+            old_segments = manifest["segments"]
+            manifest = {"base_sequence": sequence, "segments": []}
+            self.write_segments_manifest(folder, manifest)
+            for entry in old_segments:
+                if "file" in entry:
+                    os.remove(os.path.join(folder, entry["file"]))
+            logger.info(f"Compacted {len(old_segments)} segments into {dump_filename}")
+        else:
+            self.write_segments_manifest(folder, manifest)
+            logger.info(f"Wrote segment {sequence} of {data_name}: {len(changed)} changed, {len(deleted)} deleted")
+
+    def load_database_dump(self, data_name: str, upgrade_entry: Union[Callable[[Dict], bool], None] = None):
+        """ Load the database dump of a table
+        :param upgrade_entry: converts the fields of an entry written by an older version of the model in place,
+                              returns True if the entry was changed
+        """
+        database_dump_file = data_name + DUMP_SUFFIX
+        filename = os.path.join(LOAD_DUMP_FOLDER, database_dump_file)
         if not os.path.isfile(filename):
             if self.warn_db_dump_not_found:
                 logger.warning(self.warn_db_dump_not_found.pop())
@@ -95,29 +248,85 @@ class Backup:
 
         file_changed = os.path.getmtime(filename)
 
-        if self.file_changed_last_loaded.get(database_dump_file):
-            if file_changed <= self.file_changed_last_loaded[database_dump_file]:
-                return
-            else:
+        loaded = False
+        if (not self.file_changed_last_loaded.get(database_dump_file) or
+                file_changed > self.file_changed_last_loaded[database_dump_file]):
+            if self.file_changed_last_loaded.get(database_dump_file):
                 logger.info(f"Load database dump {database_dump_file} as it has changed.")
+            if not self.load_fixture(filename, upgrade_entry):
+                return
+            self.__class__.file_changed_last_loaded[database_dump_file] = file_changed
+            logger.info(f"Loaded database dump {database_dump_file}.")
+            loaded = True
+
+        if data_name in SEGMENTED_TABLES:
+            loaded |= self.load_segments(data_name, upgrade_entry, dump_loaded=loaded)
+        return loaded or None
+
+    def load_fixture(self, filename: str, upgrade_entry: Union[Callable[[Dict], bool], None] = None) -> bool:
+        upgraded_filename = None
+        if upgrade_entry:
+            upgraded_filename = self.upgrade_database_dump(filename, upgrade_entry)
 
         try:
             # This will not remove data and just add data or replace data with the same primary key
-            call_command("loaddata", filename)
+            call_command("loaddata", upgraded_filename or filename)
         except DeserializationError as e:
             if str(e).find("Invalid model identifier") != -1:
                 logger.error(f"Deserialiser Error: {e}")
-                return
+                return False
             else:
                 raise
         except (CommandError, OperationalError) as e:
             logger.warning(f"Couldn't load backup: {e}")
-            return
+            return False
+        finally:
+            if upgraded_filename:
+                os.remove(upgraded_filename)
+        return True
 
-        self.__class__.file_changed_last_loaded[database_dump_file] = file_changed
-        logger.info(f"Loaded database dump {database_dump_file}.")
+    def load_segments(
+            self, data_name: str, upgrade_entry: Union[Callable[[Dict], bool], None] = None, dump_loaded: bool = False
+    ) -> bool:
+        """ Apply the segments of the incremental backup that are newer than the last loaded one """
+        self.check_segmented(data_name)
+        folder = os.path.join(LOAD_DUMP_FOLDER, data_name + SEGMENTS_SUFFIX)
+        manifest = self.read_segments_manifest(folder)
+        if dump_loaded:
+            self.__class__.segment_loaded[data_name] = manifest["base_sequence"]
+        last_loaded = max(self.segment_loaded.get(data_name, 0), manifest["base_sequence"])
+        segments = [segment for segment in manifest["segments"] if segment["sequence"] > last_loaded]
+        if not segments:
+            return False
+
+        model = apps.get_model("cycle", data_name)
+        for segment in segments:
+            if segment["deleted"]:
+                # Not queued as a new segment, the deletion is already in the backup
+                model.objects.filter(pk__in=segment["deleted"]).delete(run_backup=False)
+            if "file" in segment and not self.load_fixture(os.path.join(folder, segment["file"]), upgrade_entry):
+                return False
+            self.__class__.segment_loaded[data_name] = segment["sequence"]
+        logger.info(f"Loaded {len(segments)} segments of {data_name} up to {segments[-1]['sequence']}.")
         return True
 
+    @staticmethod
+    def upgrade_database_dump(filename: str, upgrade_entry: Callable[[Dict], bool]) -> Union[str, None]:
+        """ Returns the name of a temporary copy of the dump with upgraded entries, or None if nothing changed """
+        with gzip.open(filename, "rt") as f:
+            entries = json.load(f)
+        changed = 0
+        for entry in entries:
+            changed += upgrade_entry(entry['fields'])
+        if not changed:
+            return None
+
+        upgraded_filename = os.path.join(BACKUP_FOLDER, "upgraded_" + os.path.basename(filename))
+        with gzip.open(upgraded_filename, "wt") as f:
+            json.dump(entries, f)
+        logger.info(f"Upgraded {changed} entries of {filename} to the current database format")
+        return upgraded_filename
+
     def load_backup_mysql_based(self):
         """ Import the backup from the MySQL based version into this version
         - only required once
@@ -0,0 +1,136 @@
+""" Numbers with a pattern in their digits, e.g. 314.15, 1111 or 1:23:45, for the extra plots page
+
+The candidates don't change, they are built once per process. The rides are matched for a whole column at once.
+"""
+import functools
+import timeit
+from typing import Dict, Set, Union
+
+import numpy as np
+
+
+def convert_number_to_hms(number: int) -> Union[int, None]:
+    m, s = divmod(number, 100)
+    if m > 100:
+        h, m = divmod(m, 100)
+    else:
+        h = 0
+    if s < 60 and m < 60 and h < 24:
+        return h * 3600 + m * 60 + s
+    return None
+
+
+def convert_number_to_dhm(number: int) -> Union[int, None]:
+    h, m = divmod(number, 100)
+    if h > 100:
+        d, h = divmod(h, 100)
+    else:
+        d = 0
+    if m < 60 and h < 24:
+        return (d * 24 + h) * 3600 + m * 60
+    return None
+
+
+def convert_number_to_hm(number: int) -> Union[int, None]:
+    h, m = divmod(number, 100)
+    if m < 60:
+        return h * 3600 + m * 60
+    return None
+
+
+def _candidate_sets() -> Dict[str, Set]:
+    possible_numbers = {
+        31415, 314159, 3141592, 31415926, 314159265, 27182, 271828, 2718281, 27182818, 271828182,
+        2468, 8642, 86420, 1357, 7531, 13579, 97531
+    }
+    possible_times_s = {convert_number_to_hms(i) for i in possible_numbers}
+    possible_times_s_total = {convert_number_to_dhm(i) for i in possible_numbers}
+    possible_times_s_total.update({convert_number_to_hm(i) for i in possible_numbers})
+    """ Add all the numbers with the same digit for 4 to 7 digits: 1111 to 9999999 """
+    for i in range(1, 10):
+        number = 0
+        for repeat in range(7):
+            number += int(i * 10**repeat)
+            if repeat >= 3:
+                possible_numbers.add(number)
+                possible_times_s_total.add(convert_number_to_hm(number))
+    for i in range(1, 6):
+        possible_times_s.add(671 * i)        # (11 * i) * (60 + 1), e.g. 22:22
+        possible_times_s.add(4271 * i)       # (11 * i) * (60 + 1) + 3600 * i, e.g 5:55:55
+        if i <= 2:
+            possible_times_s.add(40271 * i)  # (11 * i) * (3600 + 60 + 1), e.g. 11:11:11
+            days = 0
+            for j in range(5):
+                days += int(i * 10**j)
+                possible_times_s_total.add(40260 * i + 86400 * days)  # (11 * i) * (60 + 3600) + 24 * 3600 * days
+    """ All the number with increasing digits 3210, 9876543, 9876 and the reverses"""
+    for i in range(7):
+        number = 0
+        for repeat in range(min(10 if i == 0 else 9, 10-i)):     # for i == 0 create a 10 digit number, as the inverse would start with a 0
+            number += int((i + repeat) * 10**repeat)
+            if repeat < 3:
+                continue
+            possible_numbers.add(number)
+            possible_times_s.add(convert_number_to_hms(number))
+            possible_times_s_total.add(convert_number_to_dhm(number))
+            possible_times_s_total.add(convert_number_to_hm(number))
+            if i == 0 and repeat < 4:   # don't use 0123
+                continue
+            number_r = int(str(number)[::-1])   # reverse number
+            possible_numbers.add(number_r)
+            possible_times_s.add(convert_number_to_hms(number_r))
+            possible_times_s_total.add(convert_number_to_dhm(number_r))
+            possible_times_s_total.add(convert_number_to_hm(number_r))
+    possible_numbers.update(
+        {round(0.1 * number, 1) for number in possible_numbers} |
+        {round(0.01 * number, 2) for number in possible_numbers}
+    )
+    return {'numbers': possible_numbers, 'times_s': possible_times_s, 'times_s_total': possible_times_s_total}
+
+
+@functools.lru_cache(maxsize=None)
+def candidates() -> Dict[str, np.ndarray]:
+    """ Sorted, numbers: distances and speeds, times_s: durations in seconds, times_s_total: total durations """
+    return {
+        kind: np.array(sorted(number for number in numbers if number is not None), dtype=np.float64)
+        for kind, numbers in _candidate_sets().items()
+    }
+
+
+def matches(values: np.ndarray, kind: str) -> np.ndarray:
+    """ Whether each of the values is one of the candidates of the kind, with a binary search """
+    sorted_candidates = candidates()[kind]
+    positions = np.searchsorted(sorted_candidates, values)
+    return sorted_candidates[np.minimum(positions, sorted_candidates.shape[0] - 1)] == values
+
+
+def benchmark(number_rides: int = 6000, repeat: int = 20):
+    """ Time per request for matching the columns of the extra plots page, compared to building the candidates """
+    rng = np.random.default_rng(1)
+    distances = np.round(rng.uniform(1, 100, number_rides), 2)
+    durations = rng.integers(600, 20000, number_rides).astype(np.float64)
+
+    def match_columns():
+        matches(distances, 'numbers')
+        matches(distances.cumsum(), 'numbers')
+        matches(durations, 'times_s')
+        matches(durations.cumsum(), 'times_s_total')
+
+    def build_and_match_each():
+        # As before: the sets built for each request, a lookup for each ride
+        sets = _candidate_sets()
+        for values, kind in [(distances, 'numbers'), (distances.cumsum(), 'numbers'), (durations, 'times_s'),
+                             (durations.cumsum(), 'times_s_total')]:
+            [value in sets[kind] for value in values.tolist()]
+
+    candidates.cache_clear()
+    build = timeit.timeit(candidates, number=1)
+    match = timeit.timeit(match_columns, number=repeat) / repeat
+    before = timeit.timeit(build_and_match_each, number=repeat) / repeat
+    print(f"Building the candidates once per process: {build * 1E3:.2f} ms")
+    print(f"Per request for {number_rides} rides: {match * 1E3:.2f} ms, before {before * 1E3:.2f} ms")
+
+
+if __name__ == '__main__':
+    # python -m cycle.curiosity_numbers
+    benchmark()
@@ -0,0 +1,37 @@
+""" Versions of the data in the tables, to know when cached results are outdated
+
+The version of a table is the modification time of a file in DATA_VERSION_FOLDER, so it is shared between the
+processes of the web server and the background thread. Saving, deleting or loading data bumps the version.
+"""
+import os
+import time
+from typing import Tuple
+
+DATA_VERSION_FOLDER = os.environ.get('DATA_VERSION_FOLDER', '/tmp/cycle_data_versions')
+
+
+def _path(name: str) -> str:
+    return os.path.join(DATA_VERSION_FOLDER, name)
+
+
+def get(name: str) -> int:
+    """ 0 if the data was never changed since the folder was created """
+    try:
+        return os.stat(_path(name)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def get_all(*names: str) -> Tuple[int, ...]:
+    return tuple(get(name) for name in names)
+
+
+def bump(*names: str):
+    os.makedirs(DATA_VERSION_FOLDER, exist_ok=True)
+    for name in names:
+        path = _path(name)
+        # The file system might store the time with a lower resolution, so make sure the version changes
+        version = max(time.time_ns(), get(name) + 1000)
+        with open(path, 'a'):
+            pass
+        os.utime(path, ns=(version, version))
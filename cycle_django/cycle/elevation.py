@@ -0,0 +1,153 @@
+""" Elevations from SRTM HGT tiles for whole tracks
+
+The tiles are found in the folders given by SRTM1_DIR (30m) and SRTM3_DIR (90m), the 90m data is only used for points
+without 30m data. Each tile is a big-endian int16 raster of n x n values (3601 or 1201) starting at the north-west
+corner; neighbouring tiles overlap by one row/column. Unzipped tiles are memory mapped, zipped tiles need to be read
+in full (26 MB for 30m data), so only the few recently used ones are kept.
+"""
+import os
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from .figure_cache import FigureCache
+
+ZIPPED_TILES_IN_MEMORY = int(os.environ.get('SRTM_ZIPPED_TILES_IN_MEMORY', 4))
+VOID_VALUE = -32768     # no reading, e.g. because of too steep landscape
+INVALID_ELEVATION = -1  # stored for voids and elevations below 0 m
+_hgt_type = np.dtype('>i2')
+
+
+class NoElevationData(Exception):
+    """ None of the sources has a tile for a point """
+
+
+class BadTileFile(Exception):
+    """ A HGT file has the wrong size """
+
+
+class TileSource:
+    """ The HGT files in one folder, loaded on first use """
+
+    def __init__(self, hgt_dir: Union[str, Path]):
+        self.hgt_dir = Path(hgt_dir)
+        self.paths: Dict[Tuple[int, int], Path] = {}
+        self.memmaps: Dict[Tuple[int, int], np.ndarray] = {}
+        self.zipped_rasters = FigureCache(ZIPPED_TILES_IN_MEMORY, folder=None)
+        for hgt_path in self.hgt_dir.glob('**/*.hgt*'):
+            self.paths[self.base_from_file_name(hgt_path.name.split('.')[0])] = hgt_path
+
+    @staticmethod
+    def base_from_file_name(hgt_name: str) -> Tuple[int, int]:
+        """ Lower left corner of the tile, e.g. N38W006 -> (38, -6) """
+        hgt_name = hgt_name.upper()
+        latitude = int(hgt_name[1:3]) * (1 if hgt_name[0] == 'N' else -1)
+        longitude = int(hgt_name[4:7]) * (1 if hgt_name[3] == 'E' else -1)
+        return latitude, longitude
+
+    def get_raster(self, base: Tuple[int, int]) -> np.ndarray:
+        path = self.paths[base]
+        if '.zip' in path.suffixes:
+            return self.zipped_rasters.get_or_calculate(base, lambda: self.read_raster(path))
+        if base not in self.memmaps:
+            self.memmaps[base] = self.read_raster(path)
+        return self.memmaps[base]
+
+    @staticmethod
+    def read_raster(path: Path) -> np.ndarray:
+        if '.zip' in path.suffixes:
+            with zipfile.ZipFile(path) as zipped:
+                names = [name for name in zipped.namelist() if '.hgt' in name]
+                if len(names) != 1:
+                    raise BadTileFile(f"ZIP at {path} contains {len(names)} hgt files")
+                raster = np.frombuffer(zipped.read(names[0]), dtype=_hgt_type)
+        else:
+            raster = np.memmap(path, dtype=_hgt_type, mode='r')
+        size = int(round(np.sqrt(raster.shape[0])))
+        if size * size != raster.shape[0] or size not in (1201, 3601):
+            raise BadTileFile(f"Unexpected number of bytes found in {path}: {raster.nbytes}")
+        return raster.reshape(size, size)
+
+
+class ElevationService:
+    """ Looks up the elevations of many points at once, grouped by tile """
+
+    def __init__(self, hgt_dirs: List[Union[str, Path]]):
+        """ :param hgt_dirs: folders in order of preference, e.g. 30m data first """
+        self.sources = [TileSource(hgt_dir) for hgt_dir in hgt_dirs]
+
+    @classmethod
+    def from_environment(cls) -> 'ElevationService':
+        return cls([os.environ[name] for name in ('SRTM1_DIR', 'SRTM3_DIR') if os.environ.get(name)])
+
+    def get_elevations(
+            self, latitudes: np.ndarray, longitudes: np.ndarray, interpolate: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the elevations in m (INVALID_ELEVATION for voids and below 0 m) and whether they are valid.
+        Raises NoElevationData if a point is not covered by any of the sources.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        elevations = np.full(latitudes.shape, VOID_VALUE, dtype=np.int64)
+        missing = np.ones(latitudes.shape, dtype=bool)
+        base_latitudes = np.floor(latitudes).astype(np.int64)
+        base_longitudes = np.floor(longitudes).astype(np.int64)
+
+        for source in self.sources:
+            if not missing.any():
+                break
+            tiles, tile_index = np.unique(
+                np.column_stack((base_latitudes[missing], base_longitudes[missing])), axis=0, return_inverse=True
+            )
+            indexes = np.flatnonzero(missing)
+            for ii, (base_latitude, base_longitude) in enumerate(tiles):
+                base = (int(base_latitude), int(base_longitude))
+                if base not in source.paths:
+                    continue
+                points = indexes[tile_index.ravel() == ii]
+                elevations[points] = self._lookup(
+                    source.get_raster(base), base, latitudes[points], longitudes[points], interpolate
+                )
+                missing[points] = False
+
+        if missing.any():
+            first = np.flatnonzero(missing)[0]
+            raise NoElevationData(
+                f"No SRTM data for {missing.sum()} points, e.g. {latitudes[first]}, {longitudes[first]}"
+            )
+        valid = elevations >= 0
+        elevations[~valid] = INVALID_ELEVATION
+        return elevations, valid
+
+    @staticmethod
+    def _lookup(
+            raster: np.ndarray, base: Tuple[int, int], latitudes: np.ndarray, longitudes: np.ndarray,
+            interpolate: bool
+    ) -> np.ndarray:
+        last = raster.shape[0] - 1
+        rows = (base[0] + 1 - latitudes) * last
+        columns = (longitudes - base[1]) * last
+        # Same pixel as python-srtm uses (round half to even)
+        nearest = raster[
+            np.clip(np.round(rows).astype(np.int64), 0, last), np.clip(np.round(columns).astype(np.int64), 0, last)
+        ].astype(np.int64)
+        if not interpolate:
+            return nearest
+
+        row0 = np.clip(np.floor(rows).astype(np.int64), 0, last - 1)
+        column0 = np.clip(np.floor(columns).astype(np.int64), 0, last - 1)
+        row_fraction = np.clip(rows - row0, 0, 1)
+        column_fraction = np.clip(columns - column0, 0, 1)
+        corners = np.stack((
+            raster[row0, column0], raster[row0, column0 + 1], raster[row0 + 1, column0], raster[row0 + 1, column0 + 1]
+        )).astype(np.float64)
+        weights = np.stack((
+            (1 - row_fraction) * (1 - column_fraction), (1 - row_fraction) * column_fraction,
+            row_fraction * (1 - column_fraction), row_fraction * column_fraction
+        ))
+        interpolated = np.round((corners * weights).sum(axis=0)).astype(np.int64)
+        # Don't mix voids into the result
+        has_void = (corners == VOID_VALUE).any(axis=0)
+        return np.where(has_void, nearest, interpolated)
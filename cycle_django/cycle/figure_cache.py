@@ -0,0 +1,122 @@
+""" Cache of the rendered plots, so unchanged data doesn't need pandas and Plotly for each page load
+
+The keys contain the data versions of the plotted tables (see data_version.py), so changed data is never served from
+the cache, the outdated entries are removed when they are the least recently used. Optionally the entries are also
+stored in FIGURE_CACHE_FOLDER, shared between the processes of the web server and kept after a restart.
+The results of the GPS analysis use the same (analysis_cache), optionally stored in ANALYSIS_CACHE_FOLDER and limited
+by size. Other results that are expensive to calculate use a FigureCache without folder as a least recently used
+cache in memory, e.g. the trimmed ranges of the tracks and the decoded elevation tiles.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Union
+
+from my_base import Logging
+
+logger = Logging.setup_logger(__name__)
+
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 50))     # number of entries in memory
+FIGURE_CACHE_FOLDER = os.environ.get('FIGURE_CACHE_FOLDER')     # no on-disk backend if not set
+FIGURE_CACHE_DISK_SIZE = int(os.environ.get('FIGURE_CACHE_DISK_SIZE', 500))   # number of files
+# The results of analyse_gps_data_sets, e.g. of all tracks, are large and expensive
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 10))
+ANALYSIS_CACHE_FOLDER = os.environ.get('ANALYSIS_CACHE_FOLDER')     # no on-disk backend if not set
+ANALYSIS_CACHE_DISK_BYTES = int(os.environ.get('ANALYSIS_CACHE_DISK_BYTES', 500 * 2**20))
+_suffix = '.pickle'
+
+
+class FigureCache:
+
+    def __init__(
+            self, max_entries: int = FIGURE_CACHE_SIZE, folder: Union[str, None] = FIGURE_CACHE_FOLDER,
+            max_files: int = FIGURE_CACHE_DISK_SIZE, max_bytes: Union[int, None] = None
+    ):
+        self.max_entries = max_entries
+        self.folder = folder
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, key: Hashable) -> str:
+        return os.path.join(self.folder, hashlib.sha1(repr(key).encode()).hexdigest() + _suffix)
+
+    def _load(self, key: Hashable) -> Any:
+        """ KeyError if the entry is not on disk """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, result = pickle.load(f)
+            os.utime(path)   # for the least recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            raise KeyError(key)
+        if stored_key != key:
+            raise KeyError(key)
+        return result
+
+    def _store(self, key: Hashable, result: Any):
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            # Other processes should never read a partly written file
+            with tempfile.NamedTemporaryFile('wb', dir=self.folder, suffix='.tmp', delete=False) as f:
+                pickle.dump((key, result), f)
+            os.replace(f.name, self._path(key))
+        except OSError as e:
+            logger.warning(f"Couldn't store the figure in {self.folder}: {e}")
+            return
+        self._remove_old_files()
+
+    def _remove_old_files(self):
+        files = []
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.name.endswith(_suffix):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                pass    # removed by another process
+        files.sort()
+        number_files = len(files)
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if number_files <= self.max_files and (self.max_bytes is None or total_bytes <= self.max_bytes):
+                break
+            number_files -= 1
+            total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_or_calculate(self, key: Hashable, calculate: Callable[[], Any]) -> Any:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        try:
+            if not self.folder:
+                raise KeyError(key)
+            result = self._load(key)
+        except KeyError:
+            result = calculate()
+            if self.folder:
+                self._store(key, result)
+        with self.lock:
+            self.entries[key] = result
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+figure_cache = FigureCache()
+analysis_cache = FigureCache(
+    ANALYSIS_CACHE_SIZE, ANALYSIS_CACHE_FOLDER, max_files=FIGURE_CACHE_DISK_SIZE, max_bytes=ANALYSIS_CACHE_DISK_BYTES
+)
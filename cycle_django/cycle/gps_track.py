@@ -0,0 +1,140 @@
+""" Packed binary storage of the GPS tracks
+
+A track is stored as a small header followed by little-endian columns, so it can be read with np.frombuffer without
+any parsing:
+    header: magic, version, flags, number of points, start timestamp
+    times: int32 difference to the previous point in seconds (first entry is 0)
+    latitudes, longitudes: int32 in 1E-5 degrees (the GPX data is rounded to 5 digits on import)
+    altitudes: int32 in m
+    alt_srtm: int32 in m (only if FLAG_SRTM)
+    speeds: float32 in km/h (only if FLAG_SPEEDS)
+"""
+import base64
+import json
+import struct
+import zlib
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+TRACK_MAGIC = b'GPST'
+TRACK_VERSION = 1
+FLAG_SRTM = 1
+FLAG_SPEEDS = 2
+COORDINATE_SCALE = 1E5
+LEGACY_FIELDS = ('datetimes', 'latitudes', 'longitudes', 'altitudes', 'alt_srtm', 'speeds')
+
+_header = struct.Struct('<4sBBIq')
+_int_type = np.dtype('<i4')
+_float_type = np.dtype('<f4')
+
+
+def pack_track(
+        datetimes: Sequence[int],
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        altitudes: Sequence[int],
+        alt_srtm: Union[Sequence[int], None] = None,
+        speeds: Union[Sequence[float], None] = None
+) -> bytes:
+    """ Create the binary representation of a track, datetimes are the unix timestamps in seconds """
+    times = np.asarray(datetimes, dtype=np.int64)
+    number_points = times.shape[0]
+    flags = 0
+    time_diff = np.zeros(number_points, dtype=np.int64)
+    time_diff[1:] = times[1:] - times[:-1]
+    columns = [
+        time_diff,
+        np.round(np.asarray(latitudes, dtype=np.float64) * COORDINATE_SCALE),
+        np.round(np.asarray(longitudes, dtype=np.float64) * COORDINATE_SCALE),
+        np.asarray(altitudes, dtype=np.int64),
+    ]
+    data = [column.astype(_int_type).tobytes() for column in columns]
+    if alt_srtm is not None and len(alt_srtm):
+        flags |= FLAG_SRTM
+        data.append(np.asarray(alt_srtm, dtype=np.int64).astype(_int_type).tobytes())
+    if speeds is not None and len(speeds):
+        flags |= FLAG_SPEEDS
+        data.append(np.asarray(speeds, dtype=_float_type).tobytes())
+
+    start = int(times[0]) if number_points else 0
+    return _header.pack(TRACK_MAGIC, TRACK_VERSION, flags, number_points, start) + b''.join(data)
+
+
+def read_header(data: Union[bytes, memoryview]) -> Dict:
+    magic, version, flags, number_points, start = _header.unpack_from(data)
+    if magic != TRACK_MAGIC or version != TRACK_VERSION:
+        raise ValueError(f"Not a packed GPS track: magic {magic}, version {version}")
+    return {'flags': flags, 'number_points': number_points, 'start': start}
+
+
+def number_of_points(data: Union[bytes, memoryview]) -> int:
+    return read_header(data)['number_points']
+
+
+def track_checksum(data: Union[bytes, memoryview]) -> int:
+    """ Stored with the track, so derived values (e.g. GPSDataMetrics) know if they are outdated """
+    return zlib.crc32(data)
+
+
+def unpack_track(data: Union[bytes, memoryview]) -> Dict[str, np.ndarray]:
+    """ Returns the columns of the track, as names used in the analysis. Optional columns are None if not stored """
+    header = read_header(data)
+    number_points = header['number_points']
+    offset = _header.size
+
+    def next_column(dtype):
+        nonlocal offset
+        column = np.frombuffer(data, dtype=dtype, count=number_points, offset=offset)
+        offset += number_points * dtype.itemsize
+        return column
+
+    times = header['start'] + np.cumsum(next_column(_int_type), dtype=np.int64)
+    result = {
+        'Times': times,
+        'Latitudes_deg': next_column(_int_type) / COORDINATE_SCALE,
+        'Longitudes_deg': next_column(_int_type) / COORDINATE_SCALE,
+        'Altitudes': next_column(_int_type).astype(np.int64),
+        'Altitudes_srtm': None,
+        'Speeds': None,
+    }
+    if header['flags'] & FLAG_SRTM:
+        result['Altitudes_srtm'] = next_column(_int_type).astype(np.int64)
+    if header['flags'] & FLAG_SPEEDS:
+        result['Speeds'] = next_column(_float_type).astype(np.float64)
+    if offset != len(data):
+        raise ValueError(f"Packed GPS track has {len(data)} bytes, expected {offset}")
+
+    return result
+
+
+def upgrade_legacy_fields(fields: Dict) -> bool:
+    """ Convert the json text columns of a GPSData entry from a database dump into the packed track and add the
+    number of entries and the checksum of the track, if missing.
+    The dict is modified in place (the track is base64 encoded, as the json serializer expects it for a
+    BinaryField), returns whether anything was changed.
+    """
+    if 'datetimes' not in fields:
+        if 'track' not in fields or ('number_entries' in fields and 'track_checksum' in fields):
+            return False
+        track = base64.b64decode(fields['track'])
+        fields.setdefault('number_entries', number_of_points(track))
+        fields.setdefault('track_checksum', track_checksum(track))
+        return True
+
+    def load_column(name: str) -> Union[List, None]:
+        text = fields.get(name)
+        if not text:
+            return None
+        return json.loads(text)
+
+    track = pack_track(
+        load_column('datetimes'), load_column('latitudes'), load_column('longitudes'), load_column('altitudes'),
+        alt_srtm=load_column('alt_srtm'), speeds=load_column('speeds')
+    )
+    for name in LEGACY_FIELDS:
+        fields.pop(name, None)
+    fields['number_entries'] = number_of_points(track)
+    fields['track_checksum'] = track_checksum(track)
+    fields['track'] = base64.b64encode(track).decode()
+    return True
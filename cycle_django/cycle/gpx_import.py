@@ -0,0 +1,244 @@
+""" Reading of GPX files into packed tracks
+
+The parsing and the elevation lookup of the files run in a process pool, the caller receives the results in batches
+and writes them into the database (so there is only one writer).
+"""
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import time
+import gpxpy
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Set, Tuple, Union
+
+from my_base import Logging
+from . import elevation, gps_track
+
+logger = Logging.setup_logger(__name__)
+
+# Number of processes to read the GPX files, 1 reads them in the calling thread
+GPX_IMPORT_WORKERS = int(os.environ.get('GPX_IMPORT_WORKERS', min(4, os.cpu_count() or 1)))
+GPX_IMPORT_BATCH_SIZE = 50
+PROGRESS_INTERVAL = 30  # seconds between progress messages
+
+# Make SRTM available
+hasSrtm = False
+if os.environ.get('SRTM1_DIR'):
+    try:
+        elevation_service = elevation.ElevationService.from_environment()
+        hasSrtm = True
+    except OSError as e:
+        logger.warning(f'Failed loading the SRTM data: {e}')
+else:
+    logger.warning('Not using SRTM!')
+
+
+def read_gpx_file(foldername: str, filename: str) -> Union[Dict, None]:
+    """ Read a GPX file and add the SRTM elevation. Returns the fields for a GPSData entry or None if the file
+    should be ignored. Runs in the worker processes, hence no database access.
+    """
+    bad = False
+    with open(os.path.join(foldername, filename), 'rb') as gpx_file:
+        content = gpx_file.read()
+    gpx = gpxpy.parse(content.decode())
+    datetimes = []
+    latitudes = []
+    longitudes = []
+    altitudes = []
+    for track in gpx.tracks:
+        if bad:
+            break
+        for segment in track.segments:
+            if bad:
+                break
+            for point in segment.points:
+                if not point.time:
+                    logger.warning(f"Point without timestamp in {filename}: {point} - will ignore file")
+                    bad = True
+                    break
+                if abs(point.latitude) == 90:   # ignore dummy values
+                    continue
+                if not datetimes:
+                    start = point.time
+                datetimes.append(int(point.time.timestamp()))
+                latitudes.append(round(point.latitude, 5))
+                longitudes.append(round(point.longitude, 5))
+                altitudes.append(point.elevation)
+
+        end = point.time
+    if bad or len(datetimes) < 20:
+        logger.warning(f"Ignored {len(datetimes)} points from {filename}")
+        return None
+
+    alt_srtm = []
+    alt_diff = []
+    if hasSrtm:
+        try:
+            alt_srtm, valid = elevation_service.get_elevations(latitudes, longitudes)
+        except (elevation.NoElevationData, elevation.BadTileFile) as e:
+            logger.warning(f'Cannot read srtm data, will not read the file {filename}: {e}')
+            return None
+        diff = alt_srtm[valid] - np.asarray(altitudes, dtype=np.float64)[valid]
+        alt_diff = diff[np.abs(diff) < 200]
+
+    alt_adjust_text = ''
+    if len(alt_diff) > 50:
+        alt_adjust = np.median(alt_diff)
+        if abs(alt_adjust) >= 10:   # Some devices don't record the correct gps elevation
+            for i in range(len(altitudes)):
+                altitudes[i] = altitudes[i] + alt_adjust
+            alt_adjust_text = f', moved altitudes by {alt_adjust:.1f}m to match SRTM'
+    for i in range(len(altitudes)):
+        altitudes[i] = int(round(altitudes[i]))
+    logger.info(f"Read {len(datetimes)} points from {filename}{alt_adjust_text}")
+
+    return {
+        'filename': filename, 'start': start, 'end': end,
+        'track': gps_track.pack_track(datetimes, latitudes, longitudes, altitudes, alt_srtm=alt_srtm),
+        'content_hash': hashlib.sha1(content).hexdigest()
+    }
+
+
+def file_hash(path: str) -> str:
+    """ Same hash as read_gpx_file stores """
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _read_gpx_file_or_none(foldername: str, filename: str) -> Union[Dict, None]:
+    try:
+        return read_gpx_file(foldername, filename)
+    except Exception as e:
+        logger.error(f"Failed to read {filename}: {e}")
+        return None
+
+
+def import_gpx_files(
+        gpx_files: List[Tuple[str, str]],
+        save_batch: Callable[[List[Dict]], None],
+        workers: int = GPX_IMPORT_WORKERS,
+        batch_size: int = GPX_IMPORT_BATCH_SIZE
+) -> int:
+    """ Read the (folder, filename) entries with a pool of workers processes and give the results in batches to
+    save_batch. Returns the number of files read successfully.
+    """
+    if not gpx_files:
+        return 0
+    begin = time.time()
+    last_progress = begin
+    number_done = 0
+    number_read = 0
+    batch = []
+
+    def handle_result(result: Union[Dict, None]):
+        nonlocal last_progress, number_done, number_read, batch
+        number_done += 1
+        if result is not None:
+            number_read += 1
+            batch.append(result)
+        if len(batch) >= batch_size:
+            save_batch(batch)
+            batch = []
+        now = time.time()
+        if now - last_progress >= PROGRESS_INTERVAL:
+            last_progress = now
+            rate = number_done / (now - begin)
+            logger.info(
+                f"Processed {number_done} of {len(gpx_files)} GPX files ({100 * number_done / len(gpx_files):.1f}%), "
+                f"{rate:.1f} files/s, about {(len(gpx_files) - number_done) / rate / 60:.1f} min left"
+            )
+
+    workers = max(1, min(workers, len(gpx_files)))
+    if workers == 1:
+        for foldername, filename in gpx_files:
+            handle_result(_read_gpx_file_or_none(foldername, filename))
+    else:
+        # spawn, as forking the threaded server process can copy held locks into the workers
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            futures = [
+                executor.submit(_read_gpx_file_or_none, foldername, filename) for foldername, filename in gpx_files
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                handle_result(future.result())
+    if batch:
+        save_batch(batch)
+
+    logger.info(f"Read {number_read} of {len(gpx_files)} GPX files with {workers} worker(s) in "
+                f"{time.time() - begin:.1f}s")
+    return number_read
+
+
+class FolderScanner:
+    """ Finds new or changed files below folders. The content of a directory is only listed again if its mtime
+    changed (a file was added, removed or renamed), otherwise a scan only needs one stat per directory.
+    """
+
+    def __init__(self, suffix: str = '.gpx'):
+        self.suffix = suffix
+        self.directories: Dict[str, Tuple[float, List[str]]] = {}  # directory: (mtime, subdirectories)
+        self.files: Dict[str, Tuple[int, float]] = {}               # path: (size, mtime) of the handled files
+        # directory: paths of the files that failed, they might still be written
+        self.recheck: Dict[str, Set[str]] = {}
+        self.initialised = False
+        self.manifest_version = None  # data version of the stored file states when they were read
+
+    def reset(self, files: Dict[str, Tuple[int, float]]):
+        """ Replace the known files, e.g. from the manifest, and list all directories again """
+        self.files = dict(files)
+        self.directories = {}
+        self.recheck = {}
+        self.initialised = True
+
+    def invalidate(self, directories: Iterable[str]):
+        """ List the directories again with the next scan, e.g. a file was modified without changing the directory """
+        for directory in directories:
+            self.directories.pop(directory, None)
+
+    def mark(self, path: str, size: int, mtime: float, recheck: bool = False):
+        self.files[path] = (size, mtime)
+        directory = os.path.dirname(path)
+        if recheck:
+            self.recheck.setdefault(directory, set()).add(path)
+        elif directory in self.recheck:
+            self._stop_recheck(directory, {path})
+
+    def _stop_recheck(self, directory: str, paths: Set[str]):
+        self.recheck[directory] -= paths
+        if not self.recheck[directory]:
+            del self.recheck[directory]
+
+    def scan(self, folders: Iterable[str]) -> List[Tuple[str, str, int, float]]:
+        """ Returns (folder, filename, size, mtime) of the files that were not marked with the same size and mtime """
+        changed_files = []
+        pending = list(folders)
+        while pending:
+            directory = pending.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                self.directories.pop(directory, None)
+                continue
+            cached = self.directories.get(directory)
+            if cached and cached[0] == mtime and directory not in self.recheck:
+                pending.extend(cached[1])
+                continue
+            subdirectories = []
+            paths = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.name.endswith(self.suffix) and entry.is_file():
+                        paths.add(entry.path)
+                        stat = entry.stat()
+                        if self.files.get(entry.path) != (stat.st_size, stat.st_mtime):
+                            changed_files.append((directory, entry.name, stat.st_size, stat.st_mtime))
+            if directory in self.recheck:
+                # The failed files that were removed
+                self._stop_recheck(directory, self.recheck[directory] - paths)
+            self.directories[directory] = (mtime, subdirectories)
+            pending.extend(subdirectories)
+        return changed_files
@@ -1,37 +1,25 @@
 import datetime
-import gpxpy
 import io
-import json
 import os
 from PIL import Image
 import numpy as np
-from typing import Union, Tuple
+from typing import Dict, List, Union, Tuple
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Q, Sum, Count
+from django.db import models, transaction
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncMonth, TruncWeek, TruncYear
 from django.urls import reverse
 import django.utils.duration
 # using: python manage.py inspectdb > models.py
 
 from my_base import Logging, create_timezone_object, photoStorage, GPX_FOLDERS
+from . import data_version, gps_track, gpx_import, simplify, track_metrics
 from .backup import Backup
 
 logger = Logging.setup_logger(__name__)
 backup_instance = Backup()
-
-# Make SRTM available
-hasSrtm = False
-if os.environ.get('SRTM1_DIR'):
-    try:
-        import srtm
-        elevation_data_30m = srtm.Srtm1HeightMapCollection()
-        elevation_data_90m = srtm.Srtm3HeightMapCollection()
-        hasSrtm = True
-    except OSError as e:
-        logger.warning(f'Failed loading the SRTM data: {e}')
-else:
-    logger.warning('Not using SRTM!')
+gpx_folder_scanner = gpx_import.FolderScanner()
 
 def convert_to_str_hours(value: Union[int, datetime.timedelta, None]) -> Union[str, None]:
     if isinstance(value, datetime.timedelta):
@@ -81,12 +69,12 @@ class Bicycles(models.Model):
     def __str__(self):
         return self.description
 
-    def backup(self):
-        data_string = ""
-        for obj in Bicycles.objects.all():
-            data_string += f"{obj.description};{obj.notes}\n"
+    @staticmethod
+    def csv_data() -> bytes:
+        return "".join(f"{obj.description};{obj.notes}\n" for obj in Bicycles.objects.all()).encode()
 
-        backup_instance.backup_table(self.table_name, data_string.encode())
+    def backup(self):
+        backup_instance.queue_backup(self.table_name, self.csv_data)
 
     def save(self, *args, no_check=False, **kwargs):
         if self.is_default:
@@ -147,7 +135,7 @@ class CycleRides(models.Model):
     def get_gps_objs(self):
         """Returns the url to access a gps plot"""
         date = create_timezone_object(self.date)
-        objs = GPSData.objects.filter(
+        objs = GPSData.objects.metadata().filter(
             start__lt=date+datetime.timedelta(days=1)-datetime.timedelta(seconds=1), end__gt=date
         ).order_by('start')
         return objs
@@ -159,155 +147,192 @@ class CycleRides(models.Model):
             data.append([reverse('gps_detail', args=[obj.filename]), obj.filename.rsplit('.', 1)[0]])
         return data
 
-    def backup(self, csv_update: bool = True):
-        data_string = ""
-        if csv_update:
-            for obj in CycleRides.objects.all():
-                data_string += (f"{obj.date.strftime('%Y-%m-%d')};{obj.distance};{convert_to_str_hours(obj.duration)};"
-                                f"{obj.totaldistance};{convert_to_str_hours(obj.totalduration)};{obj.bicycle.id}\n")
+    @staticmethod
+    def csv_data() -> bytes:
+        return "".join(
+            f"{date.strftime('%Y-%m-%d')};{distance};{convert_to_str_hours(duration)};"
+            f"{totaldistance};{convert_to_str_hours(totalduration)};{bicycle_id}\n"
+            for date, distance, duration, totaldistance, totalduration, bicycle_id in CycleRides.objects.values_list(
+                'date', 'distance', 'duration', 'totaldistance', 'totalduration', 'bicycle_id'
+            )
+        ).encode()
 
-        backup_instance.backup_table(self.table_name, data_string.encode(), csv_dump=csv_update)
+    def backup(self, csv_update: bool = True):
+        backup_instance.queue_backup(self.table_name, self.csv_data, csv_dump=csv_update)
 
     def save(self, *args, no_more_modifications=False, run_backup=True, run_summary=True, **kwargs):
 
         if no_more_modifications:
             # Just run parent save for entries that don't need more modification
             super().save(*args, **kwargs)
+            data_version.bump(self.table_name)
             return
 
         # Add speeds before saving
         self.speed = round(self.distance / self.duration.total_seconds() * 3600, 4)
         self.totalspeed = round(self.totaldistance / self.totalduration.total_seconds() * 3600, 4)
 
+        previous_date = None
+        if self.pk:
+            previous_date = CycleRides.objects.filter(pk=self.pk).values_list('date', flat=True).first()
         super().save(*args, **kwargs)
 
         if run_backup:
             self.backup()
 
         if run_summary:
-            self.mark_summary_tables(self)
+            self.mark_summary_tables(self, previous_date=previous_date)
 
-        self.update_cumulative_values()
+        self.update_cumulative_values(previous_date=previous_date)
+        data_version.bump(self.table_name)
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
+        data_version.bump(self.table_name)
         self.backup()
+        self.mark_summary_tables(self)
+
+    def update_cumulative_values(self, previous_date: Union[datetime.date, None] = None):
+        # Calculate cumulative values, starting from the earlier of the new and the original date
+        date_for_cum = min(self.date, previous_date) if previous_date else self.date
+
+        with transaction.atomic():
+            changed = self.recalculate_cumulative_values(
+                CycleRides.objects.filter(bicycle=self.bicycle), date_for_cum, 'cumbicycledistance',
+                'cumbicycleduration'
+            )
+            if changed:
+                logger.info(f"Updated cumulative values for {changed} entries from {date_for_cum} for bycle: "
+                            f"{self.bicycle}")
+            changed_all = self.recalculate_cumulative_values(
+                CycleRides.objects.all(), date_for_cum, 'cumdistance', 'cumduration', speed_field='cumspeed'
+            )
+            if changed_all:
+                logger.info(f"Updated cumulative values for {changed_all} entries from {date_for_cum} for all "
+                            f"bicycles")
+
+        if changed or changed_all:
+            self.backup(csv_update=False)
 
-    def update_cumulative_values(self):
-        # Calculate cumulative values
-        date_for_cum = self.date
-        if self.pk:
-            # Object already exists in the database, check for field changes
-            original_obj = CycleRides.objects.get(pk=self.pk)
-            date_for_cum = min(date_for_cum, original_obj.date)
-
-        # Last object with a cumulative distance (for the current bicycle)
-        for obj in CycleRides.objects.filter(date__lt=date_for_cum, bicycle=self.bicycle).order_by('-date'):
-            if obj.cumbicycledistance and obj.cumbicycleduration:
-                prev_cumdistance = obj.cumbicycledistance
-                prev_cumduration = obj.cumbicycleduration
-                break
-            else:
-                date_for_cum = obj.date
-        else:
-            prev_cumdistance = 0.0
-            prev_cumduration = datetime.timedelta(0)
-
-        change = False
-        for obj in CycleRides.objects.filter(date__gte=date_for_cum, bicycle=self.bicycle).order_by('date'):
-            prev_cumdistance += obj.distance
-            prev_cumduration += obj.duration
-            obj.cumbicycledistance = round(prev_cumdistance, 4)
-            obj.cumbicycleduration = prev_cumduration
-            obj.save(no_more_modifications=True)
-            change = True
-            logger.info(f"Updated cumulative values for entry {obj.pk}: {obj.date} for bycle: {self.bicycle}")
-
-        # Last object with a cumulative distance (for all)
-        for obj in CycleRides.objects.filter(date__lt=date_for_cum).order_by('-date'):
-            if obj.cumdistance and obj.cumduration:
-                prev_cumdistance = obj.cumdistance
-                prev_cumduration = obj.cumduration
+    @staticmethod
+    def recalculate_cumulative_values(
+            rides: models.QuerySet, date_for_cum: datetime.date, distance_field: str, duration_field: str,
+            speed_field: Union[str, None] = None
+    ) -> int:
+        """ Set the cumulative values of the rides from date_for_cum on with one bulk update of the changed entries,
+        returns the number of changed entries
+        """
+        # Last object with a cumulative distance
+        prev_cumdistance = 0.0
+        prev_cumduration = datetime.timedelta(0)
+        for date, cumdistance, cumduration in rides.filter(date__lt=date_for_cum).order_by('-date').values_list(
+                'date', distance_field, duration_field
+        ).iterator():
+            if cumdistance and cumduration:
+                prev_cumdistance = cumdistance
+                prev_cumduration = cumduration
                 break
-            else:
-                date_for_cum = obj.date
-        else:
-            prev_cumdistance = 0
-            prev_cumduration = datetime.timedelta(0)
-
-        for obj in CycleRides.objects.filter(date__gte=date_for_cum).order_by('date'):
-            prev_cumdistance += obj.distance
-            prev_cumduration += obj.duration
-            obj.cumdistance = round(prev_cumdistance, 4)
-            obj.cumduration = prev_cumduration
-            obj.cumspeed = round(obj.cumdistance / obj.cumduration.total_seconds() * 3600, 4)
-            obj.save(no_more_modifications=True)
-            change = True
-            logger.info(f"Updated cumulative values for entry {obj.pk}: {obj.date} for all bicycles")
-
-        if change:
-            self.backup(csv_update=False)
+            date_for_cum = date
+
+        fields = ['entryid', 'distance', 'duration', distance_field, duration_field]
+        if speed_field:
+            fields.append(speed_field)
+        entries = list(rides.filter(date__gte=date_for_cum).order_by('date').values_list(*fields))
+        if not entries:
+            return 0
+
+        # Same additions in the same order as adding up one entry after the other
+        one_microsecond = datetime.timedelta(microseconds=1)
+        cumdistances = np.cumsum([prev_cumdistance] + [entry[1] for entry in entries])[1:].tolist()
+        cumdurations = np.cumsum(
+            [prev_cumduration // one_microsecond] + [entry[2] // one_microsecond for entry in entries],
+            dtype=np.int64
+        )[1:].tolist()
+
+        objs = []
+        for entry, cumdistance, cumduration in zip(entries, cumdistances, cumdurations):
+            values = {
+                distance_field: round(cumdistance, 4), duration_field: datetime.timedelta(microseconds=cumduration)
+            }
+            if speed_field:
+                values[speed_field] = round(
+                    values[distance_field] / values[duration_field].total_seconds() * 3600, 4
+                )
+            if list(values.values()) != list(entry[3:]):
+                objs.append(CycleRides(entryid=entry[0], **values))
+        CycleRides.objects.bulk_update(objs, list(values.keys()), batch_size=500)
+        return len(objs)
 
     @staticmethod
-    def mark_summary_tables(obj: Union["CycleRides", None], update_all: bool = False):
+    def mark_summary_tables(
+            obj: Union["CycleRides", None], update_all: bool = False, previous_date: Union[datetime.date, None] = None
+    ):
         # Mark in the summary tables that dates were updated
         if update_all:
             dates_to_mark = CycleRides.objects.values_list("date", flat=True)
             logger.info("Mark all summary tables to be updated")
         else:
             dates_to_mark = [obj.date]
-            if obj.pk:
-                # Object already exists in the database, check for field changes
-                original_obj = CycleRides.objects.get(pk=obj.pk)
-                dates_to_mark.append(original_obj.date)
+            if previous_date:
+                # The entry was moved, the original period needs to be updated as well
+                dates_to_mark.append(previous_date)
 
         begin_of_week = set([date - datetime.timedelta(days=date.weekday()) for date in dates_to_mark])
         begin_of_month = set([datetime.date(date.year, date.month, 1) for date in dates_to_mark])
         begin_of_year = set([datetime.date(date.year, 1, 1) for date in begin_of_month])
-        for date in begin_of_week:
-            try:
-                obj = CycleWeeklySummary.objects.get(date=date)
-            except CycleWeeklySummary.DoesNotExist:
-                obj = CycleWeeklySummary(date=date)
-            obj.updated = True
-            obj.save()
-        for date in begin_of_month:
-            try:
-                obj = CycleMonthlySummary.objects.get(date=date)
-            except CycleMonthlySummary.DoesNotExist:
-                obj = CycleMonthlySummary(date=date)
-            obj.updated = True
-            obj.save()
-        for date in begin_of_year:
-            try:
-                obj = CycleYearlySummary.objects.get(date=date)
-            except CycleYearlySummary.DoesNotExist:
-                obj = CycleYearlySummary(date=date)
-            obj.updated = True
-            obj.save()
+        for summary, dates in (
+                (CycleWeeklySummary, begin_of_week), (CycleMonthlySummary, begin_of_month),
+                (CycleYearlySummary, begin_of_year)
+        ):
+            summary.objects.bulk_create(
+                [summary(date=date, updated=True) for date in dates], update_conflicts=True, unique_fields=['date'],
+                update_fields=['updated'], batch_size=500
+            )
 
     @classmethod
     def load_data(cls):
         loaded_backup = backup_instance.load_database_dump(cls.table_name)
         if CycleRides.objects.all().count() == 0:
             loaded_backup |= backup_instance.load_backup_mysql_based()
+        data_version.bump(cls.table_name)
         if loaded_backup:
             # Update the summary tables if database dump or backup was loaded successfully
             cls.mark_summary_tables(None, update_all=True)
 
 
-def update_fields_common(my_filter, obj):
-    summary = CycleRides.objects.filter(my_filter).aggregate(
+def update_fields_common(summary, truncate, period_days: int):
+    """ Recalculate the summary entries marked as updated with one GROUP BY over the rides, the periods are given by
+    truncating the date of the ride (e.g. TruncWeek) and are at most period_days long
+    """
+    dates = set(summary.objects.filter(updated=True).values_list("date", flat=True))
+    if not dates:
+        return
+    # Up to the end of the last period, e.g. a week continues into the next year
+    rows = CycleRides.objects.filter(
+        date__gte=min(dates), date__lt=max(dates) + datetime.timedelta(days=period_days)
+    ).annotate(period=truncate("date")).order_by().values("period").annotate(
         distance=Sum("distance"),
         duration=Sum("duration"),
         numberofdays=Count("entryid")
     )
-    obj.distance = round(summary["distance"], 4)
-    obj.duration = summary["duration"]
-    obj.speed = round(summary["distance"] / summary["duration"].total_seconds() * 3600, 4)
-    obj.numberofdays = summary["numberofdays"]
-    obj.updated = False
-    obj.save()
+    objs = []
+    for row in rows:
+        if row["period"] not in dates:
+            continue
+        objs.append(summary(
+            date=row["period"], distance=round(row["distance"], 4), duration=row["duration"],
+            speed=round(row["distance"] / row["duration"].total_seconds() * 3600, 4),
+            numberofdays=row["numberofdays"], updated=False
+        ))
+    summary.objects.bulk_create(
+        objs, update_conflicts=True, unique_fields=["date"],
+        update_fields=["distance", "duration", "speed", "numberofdays", "updated"], batch_size=500
+    )
+    # No rides left in these periods
+    empty_dates = dates - {obj.date for obj in objs}
+    if empty_dates:
+        summary.objects.filter(date__in=empty_dates).delete()
+    data_version.bump(summary.table_name)
 
 
 class CycleWeeklySummary(models.Model):
@@ -318,6 +343,8 @@ class CycleWeeklySummary(models.Model):
     numberofdays = models.IntegerField(blank=True, null=True)
     updated = models.BooleanField(null=True)
 
+    table_name = 'CycleWeeklySummary'
+
     class Meta:
         ordering = ['date']
 
@@ -326,14 +353,12 @@ class CycleWeeklySummary(models.Model):
 
     @staticmethod
     def update_fields():
-        for obj in CycleWeeklySummary.objects.filter(updated=True):
-            my_filter = Q(date__gte=obj.date) & Q(date__lt=obj.date + datetime.timedelta(days=7))
-            update_fields_common(my_filter, obj)
+        update_fields_common(CycleWeeklySummary, TruncWeek, 7)
 
     def get_gps_objs(self):
         """Returns the url to access a gps plot"""
         date = create_timezone_object(self.date)
-        objs = GPSData.objects.filter(
+        objs = GPSData.objects.metadata().filter(
             start__lt=date+datetime.timedelta(days=7)-datetime.timedelta(seconds=1), end__gt=date
         ).order_by('start')
         return objs
@@ -347,6 +372,8 @@ class CycleMonthlySummary(models.Model):
     numberofdays = models.IntegerField(blank=True, null=True)
     updated = models.BooleanField(null=True)
 
+    table_name = 'CycleMonthlySummary'
+
     class Meta:
         ordering = ['date']
 
@@ -355,18 +382,14 @@ class CycleMonthlySummary(models.Model):
 
     @staticmethod
     def update_fields():
-        for obj in CycleMonthlySummary.objects.filter(updated=True):
-            end_date = obj.date + datetime.timedelta(days=31)
-            end_date -= datetime.timedelta(days=end_date.day - 1)
-            my_filter = Q(date__gte=obj.date) & Q(date__lt=end_date)
-            update_fields_common(my_filter, obj)
+        update_fields_common(CycleMonthlySummary, TruncMonth, 31)
 
     def get_gps_objs(self):
         """Returns the url to access a gps plot"""
         date = create_timezone_object(self.date)
         end_date = date + datetime.timedelta(days=31)
         end_date -= datetime.timedelta(days=end_date.day - 1)
-        objs = GPSData.objects.filter(
+        objs = GPSData.objects.metadata().filter(
             start__lt=end_date-datetime.timedelta(seconds=1), end__gt=date
         ).order_by('start')
         return objs
@@ -379,6 +402,8 @@ class CycleYearlySummary(models.Model):
     numberofdays = models.IntegerField(help_text='Give the number of days with exercise in that year', null=True)
     updated = models.BooleanField(null=True)
 
+    table_name = 'CycleYearlySummary'
+
     class Meta:
         ordering = ['date']
 
@@ -387,16 +412,13 @@ class CycleYearlySummary(models.Model):
 
     @staticmethod
     def update_fields():
-        for obj in CycleYearlySummary.objects.filter(updated=True):
-            end_date = datetime.date(obj.date.year+1, 1, 1)
-            my_filter = Q(date__gte=obj.date) & Q(date__lt=end_date)
-            update_fields_common(my_filter, obj)
+        update_fields_common(CycleYearlySummary, TruncYear, 366)
 
     def get_gps_objs(self):
         """Returns the url to access a gps plot"""
         date = create_timezone_object(self.date)
         end_date = datetime.date(date.year + 1, 1, 1)
-        objs = GPSData.objects.filter(
+        objs = GPSData.objects.metadata().filter(
             start__lt=end_date-datetime.timedelta(seconds=1), end__gt=date
         ).order_by('start')
         return objs
@@ -408,12 +430,12 @@ class GPSFilesToIgnore(models.Model):
 
     table_name = 'GPSFilesToIgnore'
 
-    def backup(self):
-        data_string = ""
-        for obj in GPSFilesToIgnore.objects.all():
-            data_string += f"{obj.filename};{obj.notes}\n"
+    @staticmethod
+    def csv_data() -> bytes:
+        return "".join(f"{obj.filename};{obj.notes}\n" for obj in GPSFilesToIgnore.objects.all()).encode()
 
-        backup_instance.backup_table(self.table_name, data_string.encode())
+    def backup(self):
+        backup_instance.queue_backup(self.table_name, self.csv_data)
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -423,31 +445,77 @@ class GPSFilesToIgnore(models.Model):
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
         self.backup()
+        GPXFileManifest.forget([self.filename])
 
     @classmethod
     def load_data(cls):
         backup_instance.load_database_dump(cls.table_name)
 
 
+class GPXFileManifest(models.Model):
+    """ State of the files in GPX_FOLDERS, so the import only needs to look at new or changed files.
+    Not backed up, it is rebuilt by scanning the folders.
+    """
+    table_name = 'GPXFileManifest'
+    IMPORTED = 'imported'
+    IGNORED = 'ignored'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(IMPORTED, 'Imported'), (IGNORED, 'Ignored'), (FAILED, 'Failed')]
+
+    path = models.CharField(primary_key=True, max_length=500)
+    filename = models.CharField(max_length=100, db_index=True)
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    content_hash = models.CharField(max_length=40, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+
+    def __str__(self):
+        return f"{self.path} - {self.status}"
+
+    @staticmethod
+    def forget(filenames: List[str]):
+        """ The files will be checked again by the next import, e.g. after the GPSData entry was deleted """
+        deleted, _ = GPXFileManifest.objects.filter(filename__in=filenames).delete()
+        if deleted:
+            # Tells the importers of all processes to read the manifest again
+            data_version.bump(GPXFileManifest.table_name)
+
+
+class GPSDataQuerySet(models.QuerySet):
+    def metadata(self):
+        """ Don't load the (large) track, e.g. for lists of files """
+        return self.defer('track')
+
+    def delete(self, run_backup=True):
+        """ run_backup=False when the deletion comes from a backup, e.g. a segment being loaded """
+        filenames = list(self.values_list('filename', flat=True))
+        if not filenames:
+            return 0, {}
+        GPXFileManifest.forget(filenames)
+        result = super().delete()
+        data_version.bump(GPSData.table_name)
+        if run_backup:
+            backup_instance.queue_segment(GPSData.table_name, deleted=filenames)
+        return result
+
+
 class GPSData(models.Model):
     filename = models.CharField(primary_key=True, max_length=100)
     start = models.DateTimeField()
     end = models.DateTimeField()
-    datetimes = models.TextField()
-    latitudes = models.TextField()
-    longitudes = models.TextField()
-    altitudes = models.TextField()
-    alt_srtm = models.TextField()
-    speeds = models.TextField(null=True)
+    number_entries = models.IntegerField(default=0, help_text='Will be filled automatically')
+    track = models.BinaryField(help_text='Packed track, see gps_track.py')
+    track_checksum = models.BigIntegerField(default=0, help_text='Will be filled automatically')
+
+    objects = GPSDataQuerySet.as_manager()
 
     table_name = 'GPSData'
 
     class Meta:
         ordering = ['start']
 
-    @property
-    def number_entries(self) -> int:
-        return self.datetimes.count(',') + 1
+    def get_track(self) -> Dict[str, np.ndarray]:
+        return gps_track.unpack_track(self.track)
 
     def __str__(self):
         return f"{self.filename} - {self.number_entries}"
@@ -456,122 +524,223 @@ class GPSData(models.Model):
         """Returns the url to access a detail record for this GPS file."""
         return reverse('gps_detail', args=[self.filename])
 
-    def backup(self):
-        backup_instance.backup_table(self.table_name, ''.encode(), csv_dump=False)
+    def backup(self, deleted: bool = False):
+        # Incremental, the tracks of all files are too big to dump them for each change
+        if deleted:
+            backup_instance.queue_segment(self.table_name, deleted=[self.filename])
+        else:
+            backup_instance.queue_segment(self.table_name, changed=[self.filename])
 
     def save(self, *args, run_backup=True, **kwargs):
+        has_track = 'track' not in self.get_deferred_fields()
+        if has_track:
+            self.number_entries = gps_track.number_of_points(self.track)
+            self.track_checksum = gps_track.track_checksum(self.track)
         super().save(*args, **kwargs)
+        if has_track:
+            GPSDataMetrics.store([GPSDataMetrics.calculate(self)])
+            GPSDataLevels.store([GPSDataLevels.calculate(self.filename, self.track, self.track_checksum)])
+        data_version.bump(self.table_name)
         if run_backup:
             self.backup()
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
-        self.backup()
+        data_version.bump(self.table_name)
+        self.backup(deleted=True)
+        GPXFileManifest.forget([self.filename])
 
     @classmethod
     def load_data(cls):
-        backup_instance.load_database_dump(cls.table_name)
+        backup_instance.load_database_dump(cls.table_name, upgrade_entry=gps_track.upgrade_legacy_fields)
+        data_version.bump(cls.table_name)
+        GPSDataMetrics.update_outdated()
 
         cls.import_gpx_file_to_database()
 
     @staticmethod
     def import_gpx_file_to_database():
-        gpx_ignore_files = GPSFilesToIgnore.objects.values_list('filename', flat=True)
-        # Get all gpxfiles that are not in the database
-        for folder in GPX_FOLDERS:
-            gpx_files = []
-            for foldername, subfolders, filenames in os.walk(folder):
-                gpx_files += [
-                    (foldername, filename) for filename in filenames
-                    if filename.endswith(".gpx") and
-                       filename not in gpx_ignore_files and
-                       not GPSData.objects.filter(filename=filename).exists()
-                ]
+        # Entries of the manifest are forgotten (also by other processes) when GPSData entries are deleted, then
+        # check all files again. The version is read first, so a change while reading is noticed by the next import.
+        manifest_version = data_version.get(GPXFileManifest.table_name)
+        if not gpx_folder_scanner.initialised or manifest_version != gpx_folder_scanner.manifest_version:
+            gpx_folder_scanner.reset({
+                path: (size, mtime) for path, size, mtime in GPXFileManifest.objects.exclude(
+                    status=GPXFileManifest.FAILED   # try again after a restart, e.g. when SRTM data was added
+                ).values_list('path', 'size', 'mtime')
+            })
+            gpx_folder_scanner.manifest_version = manifest_version
+        # Get all gpxfiles that are new or changed since the last scan
+        changed_files = gpx_folder_scanner.scan(GPX_FOLDERS)
+        if not changed_files:
+            return
+
+        gpx_ignore_files = set(GPSFilesToIgnore.objects.values_list('filename', flat=True))
+        known_files = set(GPSData.objects.values_list('filename', flat=True))
+        manifest = GPXFileManifest.objects.in_bulk([os.path.join(*file[:2]) for file in changed_files])
+        entries = []
+        gpx_files = []
+        for foldername, filename, size, mtime in changed_files:
+            path = os.path.join(foldername, filename)
+            entry = manifest.get(path)
+            if entry is None:
+                entry = GPXFileManifest(path=path, filename=filename, status=GPXFileManifest.IMPORTED)
+            elif filename in known_files and entry.content_hash != gpx_import.file_hash(path):
+                known_files.remove(filename)    # read the modified file again
+            entry.size, entry.mtime = size, mtime
+            entries.append(entry)
+            if filename in gpx_ignore_files:
+                entry.status = GPXFileManifest.IGNORED
+            elif filename not in known_files:
+                gpx_files.append((foldername, filename))
+                known_files.add(filename)     # same file in several folders
+
+        imported_hashes = {}
+
+        def save_batch(results: List[Dict]):
+            objs = []
+            for result in results:
+                objs.append(GPSData(
+                    filename=result['filename'], start=result['start'], end=result['end'], track=result['track'],
+                    number_entries=gps_track.number_of_points(result['track']),
+                    track_checksum=gps_track.track_checksum(result['track'])
+                ))
+                imported_hashes[result['filename']] = result['content_hash']
+            GPSData.objects.bulk_create(
+                objs, update_conflicts=True, unique_fields=['filename'],
+                update_fields=['start', 'end', 'number_entries', 'track', 'track_checksum']
+            )
+            GPSDataMetrics.store([GPSDataMetrics.calculate(obj) for obj in objs])
+            GPSDataLevels.store([GPSDataLevels.calculate(obj.filename, obj.track, obj.track_checksum) for obj in objs])
+
         # Read the gpx files
-        for ii, (foldername, filename) in enumerate(gpx_files):
-            bad = False
-            with open(os.path.join(foldername, filename), 'r') as gpx_file:
-                gpx = gpxpy.parse(gpx_file)
-                datetimes = []
-                latitudes = []
-                longitudes = []
-                altitudes = []
-                alt_srtm = []
-                alt_diff = []
-                for track in gpx.tracks:
-                    if bad:
-                        break
-                    for segment in track.segments:
-                        if bad:
-                            break
-                        for point in segment.points:
-                            if not point.time:
-                                logger.warning(f"Point without timestamp in {filename}: {point} - will ignore file")
-                                bad = True
-                                break
-                            if abs(point.latitude) == 90:   # ignore dummy values
-                                continue
-                            if not datetimes:
-                                start = point.time
-                            datetimes.append(int(point.time.timestamp()))
-                            latitudes.append(round(point.latitude, 5))
-                            longitudes.append(round(point.longitude, 5))
-                            altitudes.append(point.elevation)
-                            if hasSrtm:
-                                for i, elevation_data_source in enumerate({elevation_data_30m, elevation_data_90m}):
-                                    try:
-                                        elevation_srtm = elevation_data_source.get_altitude(
-                                            latitude=point.latitude, longitude=point.longitude
-                                        )
-                                    # except KeyError:  # That exception is only internally to srtm
-                                    #     logger.warning(f'No SRTM data for {point.latitude}, {point.longitude}')
-                                    #     elevation_srtm = -1E6
-                                    except srtm.exceptions.NoHeightMapDataException:
-                                        if i == 1:
-                                            logger.warning(f'Cannot read srtm data, will not read the file')
-                                            bad = True
-                                    except AssertionError as e:
-                                        if str(e).startswith('Unexpected number of bytes found in'):
-                                            logger.warning(f'Problem with (zipped) htg file: {e}')
-                                            bad = True
-                                            break
-                                        else:
-                                            raise
-                                    else:   # no exceptions, don't try second elevation_data_source
-                                        break
-                                if bad:
-                                    break
-                                # SRTM data below 0 m has an underflow of the uint to values above 65000
-                                # SRTM data that could not be determined because of too steep landscape is set to 32768
-                                alt_srtm.append(
-                                    -1 if elevation_srtm > 65000 else
-                                    elevation_srtm if elevation_srtm < 30000 else -1 # np.nan
-                                )
-                                diff = elevation_srtm - point.elevation
-                                if abs(diff) < 200:
-                                    alt_diff.append(diff)
-
-                    end = point.time
-                if bad or len(datetimes) < 20:
-                    logger.warning(f"Ignored {len(datetimes)} points from {filename}")
+        if gpx_import.import_gpx_files(gpx_files, save_batch):
+            data_version.bump(GPSData.table_name)
+            backup_instance.queue_segment(GPSData.table_name, changed=set(imported_hashes))
+
+        read_files = {os.path.join(foldername, filename) for foldername, filename in gpx_files}
+        for entry in entries:
+            if entry.path in read_files:
+                if entry.filename in imported_hashes:
+                    entry.status = GPXFileManifest.IMPORTED
+                    entry.content_hash = imported_hashes[entry.filename]
                 else:
-                    alt_adjust_text = ''
-                    if len(alt_diff) > 50:
-                        alt_adjust = np.median(alt_diff)
-                        if abs(alt_adjust) >= 10:   # Some devices don't record the correct gps elevation
-                            for i in range(len(altitudes)):
-                                altitudes[i] = altitudes[i] + alt_adjust
-                            alt_adjust_text = f', moved altitudes by {alt_adjust:.1f}m to match SRTM'
-                    for i in range(len(altitudes)):
-                        altitudes[i] = int(round(altitudes[i]))
-                    obj = GPSData(
-                        filename=filename, start=start, end=end, datetimes=json.dumps(datetimes),
-                        latitudes=json.dumps(latitudes), longitudes=json.dumps(longitudes),
-                        altitudes=json.dumps(altitudes), alt_srtm=json.dumps(alt_srtm)
-                    )
-                    # not just -1 but -10, as otherwise empty files can be an issue
-                    obj.save(run_backup=(ii >= len(gpx_files)-(min(10, len(gpx_files)))))
-                    logger.info(f"Loaded {len(datetimes)} points from {filename}{alt_adjust_text}")
+                    entry.status = GPXFileManifest.FAILED
+            gpx_folder_scanner.mark(
+                entry.path, entry.size, entry.mtime, recheck=(entry.status == GPXFileManifest.FAILED)
+            )
+        GPXFileManifest.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=['path'],
+            update_fields=['filename', 'size', 'mtime', 'content_hash', 'status']
+        )
+
+
+class GPSDataMetrics(models.Model):
+    """ Values derived from each point of a track, see track_metrics.py. The views select the points of the decimated
+    and trimmed tracks from them. Not backed up, they are calculated again when the track or the parameters change.
+    """
+    gps = models.OneToOneField(GPSData, primary_key=True, on_delete=models.CASCADE, related_name='metrics')
+    parameters = models.CharField(max_length=50)
+    track_checksum = models.BigIntegerField()
+    metrics = models.BinaryField(help_text='Packed per point values, see track_metrics.py')
+
+    def __str__(self):
+        return self.gps_id
+
+    def get_metrics(self) -> Dict[str, np.ndarray]:
+        return track_metrics.unpack_metrics(self.metrics)
+
+    @classmethod
+    def calculate(cls, gps_obj: GPSData) -> 'GPSDataMetrics':
+        metrics = track_metrics.calculate_metrics(track_metrics.points_frame(gps_obj.get_track(), 1), 1)
+        return cls(
+            gps_id=gps_obj.filename, parameters=track_metrics.PARAMETERS, track_checksum=gps_obj.track_checksum,
+            metrics=track_metrics.pack_metrics(metrics)
+        )
+
+    @staticmethod
+    def stored(checksums: Dict[str, int]) -> Dict[str, Dict[str, np.ndarray]]:
+        """ The metrics of the tracks ({filename: checksum}) that are up to date """
+        return {
+            obj.gps_id: obj.get_metrics() for obj in GPSDataMetrics.objects.filter(
+                gps_id__in=list(checksums), parameters=track_metrics.PARAMETERS
+            ) if obj.track_checksum == checksums[obj.gps_id]
+        }
+
+    @staticmethod
+    def store(objs: List['GPSDataMetrics']):
+        GPSDataMetrics.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=['gps'],
+            update_fields=['parameters', 'track_checksum', 'metrics'], batch_size=500
+        )
+
+    @staticmethod
+    def update_outdated(batch_size: int = 100):
+        """ Calculate the missing and outdated metrics, e.g. after a database dump was loaded or the parameters
+        changed
+        """
+        current = set(GPSDataMetrics.objects.filter(parameters=track_metrics.PARAMETERS).values_list(
+            'gps_id', 'track_checksum'
+        ))
+        outdated = [
+            filename for filename, checksum in GPSData.objects.values_list('filename', 'track_checksum')
+            if (filename, checksum) not in current
+        ]
+        for ii in range(0, len(outdated), batch_size):
+            gps_objs = GPSData.objects.filter(filename__in=outdated[ii:ii + batch_size])
+            GPSDataMetrics.store([GPSDataMetrics.calculate(obj) for obj in gps_objs])
+        if outdated:
+            logger.info(f"Calculated the metrics of {len(outdated)} tracks")
+
+
+class GPSDataLevels(models.Model):
+    """ Level of detail of each point of a track for the map, see simplify.py. Not backed up, they are calculated
+    again when needed.
+    """
+    gps = models.OneToOneField(GPSData, primary_key=True, on_delete=models.CASCADE, related_name='levels')
+    track_checksum = models.BigIntegerField()
+    levels = models.BinaryField(help_text='One byte per point, see simplify.py')
+    lat_min = models.FloatField()
+    lat_max = models.FloatField()
+    lon_min = models.FloatField()
+    lon_max = models.FloatField()
+
+    def __str__(self):
+        return self.gps_id
+
+    def get_levels(self) -> np.ndarray:
+        return simplify.unpack_levels(self.levels)
+
+    @classmethod
+    def calculate(cls, filename: str, track: bytes, checksum: Union[int, None] = None) -> 'GPSDataLevels':
+        points = gps_track.unpack_track(track)
+        lats = points['Latitudes_deg']
+        lons = points['Longitudes_deg']
+        return cls(
+            gps_id=filename, track_checksum=gps_track.track_checksum(track) if checksum is None else checksum,
+            levels=simplify.pack_levels(simplify.point_levels(lats, lons)),
+            lat_min=float(lats.min()), lat_max=float(lats.max()), lon_min=float(lons.min()), lon_max=float(lons.max())
+        )
+
+    @staticmethod
+    def store(objs: List['GPSDataLevels']):
+        GPSDataLevels.objects.bulk_create(
+            objs, update_conflicts=True, unique_fields=['gps'],
+            update_fields=['track_checksum', 'levels', 'lat_min', 'lat_max', 'lon_min', 'lon_max'], batch_size=500
+        )
+
+    @staticmethod
+    def for_tracks(tracks: Dict[str, Tuple[bytes, int]]) -> Dict[str, np.ndarray]:
+        """ The levels of the tracks ({filename: (track, checksum)}), calculates missing or outdated ones """
+        stored = GPSDataLevels.objects.in_bulk(list(tracks))
+        new_objs = []
+        for filename, (track, checksum) in tracks.items():
+            if filename not in stored or stored[filename].track_checksum != checksum:
+                stored[filename] = GPSDataLevels.calculate(filename, track, checksum)
+                new_objs.append(stored[filename])
+        if new_objs:
+            GPSDataLevels.store(new_objs)
+        return {filename: stored[filename].get_levels() for filename in tracks}
 
 
 class NoGoAreas(models.Model):
@@ -583,19 +752,23 @@ class NoGoAreas(models.Model):
 
     table_name = 'NoGoAreas'
 
-    def backup(self):
-        data_string = ""
-        for obj in NoGoAreas.objects.all():
-            data_string += f"{obj.name};{obj.latitude};{obj.longitude};{obj.radius};\n"
+    @staticmethod
+    def csv_data() -> bytes:
+        return "".join(
+            f"{obj.name};{obj.latitude};{obj.longitude};{obj.radius};\n" for obj in NoGoAreas.objects.all()
+        ).encode()
 
-        backup_instance.backup_table(self.table_name, data_string.encode())
+    def backup(self):
+        backup_instance.queue_backup(self.table_name, self.csv_data)
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        data_version.bump(self.table_name)
         self.backup()
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
+        data_version.bump(self.table_name)
         self.backup()
 
     @classmethod
@@ -609,6 +782,18 @@ class NoGoAreas(models.Model):
             logger.warning(f"No no-go-area defined, hence will create one for the whole world")
             obj = NoGoAreas(name=cls.auto_whole_world, latitude=0., longitude=0, radius=40000.)
             obj.save()
+        data_version.bump(cls.table_name)
+
+    @staticmethod
+    def as_vectors() -> np.ndarray:
+        """ sin(latitude), cos(latitude), longitude in radians and radius in radians of each area """
+        areas = np.array(
+            list(NoGoAreas.objects.values_list('latitude', 'longitude', 'radius')), dtype=np.float64
+        ).reshape(-1, 3)
+        latitudes = np.radians(areas[:, 0])
+        return np.column_stack((
+            np.sin(latitudes), np.cos(latitudes), np.radians(areas[:, 1]), areas[:, 2] / track_metrics.EARTH_RADIUS
+        ))
 
 
 class GeoLocateData(models.Model):
@@ -626,20 +811,24 @@ class GeoLocateData(models.Model):
     def identifier(self):
         return f"{self.name}_{self.latitude}_{self.longitude}".replace('.', '_').replace(' ', '')
 
-    def backup(self):
-        data_string = ""
-        for obj in GeoLocateData.objects.all():
-            data_string += f"{obj.name};{obj.latitude};{obj.longitude};{obj.radius};\n"
+    @staticmethod
+    def csv_data() -> bytes:
+        return "".join(
+            f"{obj.name};{obj.latitude};{obj.longitude};{obj.radius};\n" for obj in GeoLocateData.objects.all()
+        ).encode()
 
-        backup_instance.backup_table(self.table_name, data_string.encode())
+    def backup(self):
+        backup_instance.queue_backup(self.table_name, self.csv_data)
 
     def save(self, *args, run_backup=True, **kwargs):
         super().save(*args, **kwargs)
+        data_version.bump(self.table_name)
         if run_backup:
             self.backup()
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
+        data_version.bump(self.table_name)
         self.backup()
 
     @classmethod
@@ -647,6 +836,7 @@ class GeoLocateData(models.Model):
         loaded_backup = backup_instance.load_database_dump(cls.table_name)
         if GeoLocateData.objects.all().count() == 0:
             loaded_backup = backup_instance.load_backup_GeoLocateData_file_based()
+        data_version.bump(cls.table_name)
 
 
 class PhotoData(models.Model):
@@ -677,25 +867,31 @@ class PhotoData(models.Model):
         logger.info(f"112 {image.width, image.height}")
         return {'width': image.width, 'height': image.height}
 
-    def backup(self):
-        data_string = ""
-        for obj in PhotoData.objects.all():
-            data_string += f"{obj.filename};{obj.description};{obj.latitude};{obj.longitude};\n"
+    @staticmethod
+    def csv_data() -> bytes:
+        return "".join(
+            f"{obj.filename};{obj.description};{obj.latitude};{obj.longitude};\n"
+            for obj in PhotoData.objects.defer('thumbnail')
+        ).encode()
 
-        backup_instance.backup_table(self.table_name, data_string.encode())
+    def backup(self):
+        backup_instance.queue_backup(self.table_name, self.csv_data)
 
     def save(self, *args, run_backup=True, **kwargs):
         super().save(*args, **kwargs)
+        data_version.bump(self.table_name)
         if run_backup:
             self.backup()
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
+        data_version.bump(self.table_name)
         self.backup()
 
     @classmethod
     def load_data(cls):
         backup_instance.load_database_dump(cls.table_name)
+        data_version.bump(cls.table_name)
         cls.store_files_in_static_folder()
 
     @classmethod
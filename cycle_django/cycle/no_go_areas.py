@@ -0,0 +1,57 @@
+""" Remove the beginning and the end of tracks inside no-go areas
+
+The points are checked in windows of TRIM_STEPS points, starting at both ends, until a window has no point inside any
+no-go area. The angular distances of all points to all areas are calculated at once.
+"""
+import os
+from typing import Tuple
+
+import numpy as np
+
+from .figure_cache import FigureCache
+
+TRIM_STEPS = 10
+TRIM_CACHE_SIZE = int(os.environ.get('NOGO_TRIM_CACHE_SIZE', 20000))    # number of tracks
+
+
+def unsafe_points(sin_lats: np.ndarray, cos_lats: np.ndarray, lons: np.ndarray, nogos: np.ndarray) -> np.ndarray:
+    """ Whether each point is inside any of the areas
+    :param lons: longitudes in radians
+    :param nogos: one row per area: sin(latitude), cos(latitude), longitude in radians, radius in radians
+    """
+    nogos = np.asarray(nogos, dtype=np.float64).reshape(-1, 4)
+    # points x areas, clip against rounding errors for points in the center of an area
+    separation = np.arccos(np.clip(
+        sin_lats[:, None] * nogos[None, :, 0] +
+        cos_lats[:, None] * nogos[None, :, 1] * np.cos(lons[:, None] - nogos[None, :, 2]),
+        -1, 1
+    ))
+    return (separation < nogos[None, :, 3]).any(axis=1)
+
+
+def _number_to_trim(unsafe: np.ndarray, steps: int) -> int:
+    """ Number of points at the beginning in windows with unsafe points, before the first safe window """
+    number_points = unsafe.shape[0]
+    if number_points == 0:
+        return 0
+    # The last window ends with the last point
+    window_begins = np.arange(0, number_points, steps)
+    window_begins[-1] = max(0, number_points - steps)
+    window_ends = np.minimum(window_begins + steps, number_points)
+    unsafe_sum = np.concatenate(([0], np.cumsum(unsafe)))
+    window_unsafe = unsafe_sum[window_ends] > unsafe_sum[window_begins]
+    if window_unsafe.all():
+        return number_points
+    first_safe = int(np.argmin(window_unsafe))
+    return int(window_ends[first_safe - 1]) if first_safe > 0 else 0
+
+
+def trim_range(unsafe: np.ndarray, steps: int = TRIM_STEPS) -> Tuple[int, int]:
+    """ Returns begin and end (exclusive) of the points to keep """
+    begin = _number_to_trim(unsafe, steps)
+    end = unsafe.shape[0] - _number_to_trim(unsafe[begin:][::-1], steps)
+    return begin, end
+
+
+# The trimmed ranges of the recently used tracks, only in memory
+trim_cache = FigureCache(TRIM_CACHE_SIZE, folder=None)
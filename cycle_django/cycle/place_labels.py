@@ -0,0 +1,139 @@
+""" Names of the places (GeoLocateData) along the tracks, for the labels of the elevation profile
+
+The places are stored in a KD-tree of their unit vectors, each node knows the largest radius of its places. All
+points of the track are queried at once, the tree is traversed one depth after the other. Of the places whose circle
+contains a point, the closest one is used. Afterwards the labels are selected from the closest to the farthest,
+skipping labels too close to the ones already selected.
+"""
+import bisect
+from typing import List, Tuple
+
+import numpy as np
+import pandas
+
+from .track_metrics import EARTH_RADIUS
+
+LEAF_SIZE = 16
+POINT_COLUMNS = ('Latitudes_deg', 'Longitudes_deg', 'Longitudes_rad', 'sin_lat', 'cos_lat')
+PLACE_COLUMNS = ('lat_min', 'lat_max', 'lon_min', 'lon_max', 'Longitudes_rad', 'sin_lat', 'cos_lat', 'radius')
+
+
+def unit_vectors(sin_lats: np.ndarray, cos_lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """ Longitudes in radians """
+    return np.column_stack((cos_lats * np.cos(lons), cos_lats * np.sin(lons), sin_lats))
+
+
+class PlaceTree:
+
+    def __init__(self, vectors: np.ndarray, radii: np.ndarray):
+        """ radii: angles in radians """
+        self.vectors = vectors
+        # Distance between the unit vectors, a bit more to be safe from rounding
+        self.reaches = 2 * np.sin(np.clip(radii, 0, np.pi) / 2) * (1 + 1E-9) + 1E-12
+        self.order = np.arange(vectors.shape[0])
+        self.begins, self.ends, self.lows, self.highs, self.node_reaches, self.children = [], [], [], [], [], []
+        if vectors.shape[0]:
+            self._build(0, vectors.shape[0])
+        self.begins, self.ends = np.array(self.begins, dtype=int), np.array(self.ends, dtype=int)
+        self.lows, self.highs = np.array(self.lows).reshape(-1, 3), np.array(self.highs).reshape(-1, 3)
+        self.node_reaches = np.array(self.node_reaches)
+        self.children = np.array(self.children, dtype=int).reshape(-1, 2)
+
+    def _build(self, begin: int, end: int) -> int:
+        node = len(self.begins)
+        places = self.order[begin:end]
+        low, high = self.vectors[places].min(axis=0), self.vectors[places].max(axis=0)
+        self.begins.append(begin)
+        self.ends.append(end)
+        self.lows.append(low)
+        self.highs.append(high)
+        self.node_reaches.append(self.reaches[places].max())
+        self.children.append([-1, -1])
+        if end - begin > LEAF_SIZE:
+            # Split at the median of the widest axis
+            axis = np.argmax(high - low)
+            middle = (end - begin) // 2
+            self.order[begin:end] = places[np.argpartition(self.vectors[places, axis], middle)]
+            self.children[node] = [self._build(begin, begin + middle), self._build(begin + middle, end)]
+        return node
+
+    def candidates(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Pairs of indexes of the vectors and the places, which might contain the vector """
+        if not self.begins.shape[0] or not vectors.shape[0]:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        queries = np.arange(vectors.shape[0])
+        nodes = np.zeros(vectors.shape[0], dtype=int)
+        leaf_queries, leaf_nodes = [], []
+        while queries.shape[0]:
+            # Distance to the bounding box of the node
+            points = vectors[queries]
+            outside = np.maximum(self.lows[nodes] - points, 0) + np.maximum(points - self.highs[nodes], 0)
+            near = (outside * outside).sum(axis=1) <= self.node_reaches[nodes] ** 2
+            queries, nodes = queries[near], nodes[near]
+            is_leaf = self.children[nodes, 0] < 0
+            leaf_queries.append(queries[is_leaf])
+            leaf_nodes.append(nodes[is_leaf])
+            queries, nodes = queries[~is_leaf], nodes[~is_leaf]
+            queries = np.concatenate((queries, queries))
+            nodes = np.concatenate((self.children[nodes, 0], self.children[nodes, 1]))
+        queries, nodes = np.concatenate(leaf_queries), np.concatenate(leaf_nodes)
+        # All places of the leaves
+        counts = self.ends[nodes] - self.begins[nodes]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        positions = np.repeat(self.begins[nodes] - offsets, counts) + np.arange(counts.sum())
+        return np.repeat(queries, counts), self.order[positions]
+
+
+def nearest_places(points: pandas.DataFrame, places: pandas.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """ For each point the index of the closest place, which contains the point, and the angle to it (nan if there
+    is none). On the same angle the first place is used. The radius of the places is in km.
+    """
+    points = {column: points[column].to_numpy(dtype=np.float64) for column in POINT_COLUMNS}
+    places = {column: places[column].to_numpy(dtype=np.float64) for column in PLACE_COLUMNS}
+    number_points = points['sin_lat'].shape[0]
+    place_index = np.full(number_points, -1)
+    separation = np.full(number_points, np.nan)
+    radii = places['radius'] / EARTH_RADIUS
+    tree = PlaceTree(unit_vectors(places['sin_lat'], places['cos_lat'], places['Longitudes_rad']), radii)
+    point_ids, place_ids = tree.candidates(
+        unit_vectors(points['sin_lat'], points['cos_lat'], points['Longitudes_rad'])
+    )
+    lats, lons = points['Latitudes_deg'][point_ids], points['Longitudes_deg'][point_ids]
+    in_box = ((places['lat_min'][place_ids] < lats) & (lats < places['lat_max'][place_ids]) &
+              (places['lon_min'][place_ids] < lons) & (lons < places['lon_max'][place_ids]))
+    point_ids, place_ids = point_ids[in_box], place_ids[in_box]
+    with np.errstate(invalid='ignore'):
+        angles = np.arccos(
+            points['sin_lat'][point_ids] * places['sin_lat'][place_ids] +
+            points['cos_lat'][point_ids] * places['cos_lat'][place_ids] *
+            np.cos(points['Longitudes_rad'][point_ids] - places['Longitudes_rad'][place_ids])
+        )
+    inside = angles < radii[place_ids]
+    point_ids, place_ids, angles = point_ids[inside], place_ids[inside], angles[inside]
+    # Sorted by point, then angle, then place
+    order = np.lexsort((place_ids, angles, point_ids))
+    _, first = np.unique(point_ids[order], return_index=True)
+    closest = order[first]
+    place_index[point_ids[closest]] = place_ids[closest]
+    separation[point_ids[closest]] = angles[closest]
+    return place_index, separation
+
+
+def select_labels(positions: np.ndarray, separation: np.ndarray, min_distance: float) -> List[int]:
+    """ Indexes of the points to label, the closest to their place first. Points closer than min_distance to an
+    already selected point along the x-axis (positions) are skipped, nan separations are never selected.
+    """
+    candidates = np.flatnonzero(~np.isnan(separation))
+    candidates = candidates[np.argsort(separation[candidates], kind='stable')]
+    selected_positions = []
+    labels = []
+    for index in candidates:
+        position = positions[index]
+        neighbour = bisect.bisect_left(selected_positions, position)
+        if neighbour > 0 and position < selected_positions[neighbour - 1] + min_distance:
+            continue
+        if neighbour < len(selected_positions) and selected_positions[neighbour] - min_distance < position:
+            continue
+        selected_positions.insert(neighbour, position)
+        labels.append(index)
+    return labels
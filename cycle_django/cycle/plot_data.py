@@ -0,0 +1,44 @@
+""" Compact JSON of the plotly figures, which are drawn by static/js/plots.js with the static plotly.js
+
+Numeric arrays are sent as base64 of their bytes: {"dtype": "f8", "bdata": "..."}, like newer versions of plotly.js
+expect them. The plotly.js of the installed plotly package doesn't know this format yet, hence plots.js converts them
+into typed arrays.
+"""
+import base64
+import json
+import os
+
+import numpy as np
+import plotly
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs_version
+from plotly.utils import PlotlyJSONEncoder
+
+# The version in the name, so browsers can cache it forever
+PLOTLY_JS = f"js/plotly-{get_plotlyjs_version()}.min.js"
+PLOTLY_JS_SOURCE = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+_int32 = np.iinfo(np.int32)
+
+
+def typed_array(values: np.ndarray) -> dict:
+    if values.dtype.kind in 'iu' and (values.size == 0 or (values.min() >= _int32.min and values.max() <= _int32.max)):
+        values = values.astype('<i4')
+    else:
+        # Javascript has no typed arrays for 64 bit integers that plotly can use
+        values = values.astype('<f8')
+    return {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values.tobytes()).decode()}
+
+
+def _compact(value):
+    if isinstance(value, np.ndarray) and value.ndim == 1 and value.dtype.kind in 'fiu':
+        return typed_array(value)
+    if isinstance(value, dict):
+        return {key: _compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    return value
+
+
+def figure_json(fig: go.Figure) -> str:
+    """ Data and layout of the figure, safe to be used inside a <script> element """
+    return json.dumps(_compact(fig.to_plotly_json()), cls=PlotlyJSONEncoder).replace('<', '\\u003c')
@@ -0,0 +1,95 @@
+""" The largest distances and durations cycled within a number of consecutive days (ExtraPlots)
+
+The rides are summed per day into a dense array from the first to the last ride, with its prefix sums each window
+ending on a day with a ride is a single difference. Of the largest windows (np.argpartition) the records are selected
+from the largest down, skipping windows that overlap with the ones already selected. A window starts at its first
+ride, so records don't overlap because of days without rides.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+WINDOW_DAYS = (
+    list(range(1, 8)) + [10, 14, 21] + list(range(30, 91, 20)) + list(range(120, 181, 30)) +
+    [270, 365, 365 * 2, 365 * 4 + 1]
+)
+DAILY_DATA_SINCE = np.datetime64('2006-12-06')    # before, rides were not logged for each day
+DAILY_WINDOW_DAYS = 10      # shorter windows only use the daily data
+NUMBER_RECORDS = 5
+
+
+def select_records(starts: np.ndarray, ends: np.ndarray, values: np.ndarray, count: int = NUMBER_RECORDS) -> List[int]:
+    """ Indexes of the largest values whose windows [start, end] don't overlap, the largest first. On the same value
+    the earlier window is preferred.
+    """
+    size = min(values.shape[0], 8 * count)
+    while size:
+        # All windows with at least the value of the size-th largest one
+        threshold = -np.partition(-values, size - 1)[size - 1]
+        top = np.flatnonzero(values >= threshold)
+        top = top[np.lexsort((ends[top], -values[top]))]
+        selected = []
+        for index in top:
+            if all(ends[index] < starts[other] or starts[index] > ends[other] for other in selected):
+                selected.append(index)
+                if len(selected) == count:
+                    return selected
+        if top.shape[0] == values.shape[0]:
+            return selected
+        # Too many of the largest windows overlap
+        size = min(values.shape[0], 4 * size)
+    return []
+
+
+class DailyTotals:
+
+    def __init__(self, dates: np.ndarray, values: Dict[str, np.ndarray]):
+        """ dates: datetime64[D] of the rides, values: for each ride """
+        self.first = dates.min()
+        offsets = (dates - self.first).astype(np.int64)
+        self.ride_days = np.unique(offsets)
+        self.prefix_sums = {}
+        for name, ride_values in values.items():
+            daily = np.zeros(offsets.max() + 1, dtype=ride_values.dtype)
+            np.add.at(daily, offsets, ride_values)
+            self.prefix_sums[name] = np.concatenate(([0], np.cumsum(daily)))
+
+    def records(self, name: str, days: int, since: np.datetime64 = None, count: int = NUMBER_RECORDS) -> List[Dict]:
+        """ The largest sums of the values within days, of the windows ending on a day with a ride. Only the rides
+        from since on are used.
+        """
+        low = 0 if since is None else max(0, (since - self.first).astype(np.int64))
+        ends = self.ride_days[self.ride_days >= low]
+        begins = np.maximum(ends - days + 1, low)
+        # The first ride of the window
+        starts = self.ride_days[np.searchsorted(self.ride_days, begins)]
+        prefix_sums = self.prefix_sums[name]
+        sums = prefix_sums[ends + 1] - prefix_sums[begins]
+        return [
+            {'start': str(self.first + starts[index]), 'end': str(self.first + ends[index]), name: sums[index]}
+            for index in select_records(starts, ends, sums, count)
+        ]
+
+
+def dist_time_per_days(dates: np.ndarray, distances: np.ndarray, durations: np.ndarray) -> List[Dict]:
+    """ The records of distance and duration for each of WINDOW_DAYS, durations as timedelta64, in seconds in the
+    result
+    """
+    totals = DailyTotals(
+        dates.astype('datetime64[D]'),
+        {'distance': distances.astype(np.float64), 'duration': durations.astype('timedelta64[us]').astype(np.int64)}
+    )
+    dist_per_days = []
+    for days in WINDOW_DAYS:
+        since = DAILY_DATA_SINCE if days < DAILY_WINDOW_DAYS else None
+        result_all = {'days': days}
+        for name in ['distance', 'duration']:
+            result = totals.records(name, days, since=since)
+            if name == 'duration':
+                for record in result:
+                    record[name] = record[name] / 1E6
+            if result:
+                result_all[name] = result
+        if len(result_all.keys()) > 1:
+            dist_per_days.append(result_all)
+    return dist_per_days
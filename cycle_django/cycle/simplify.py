@@ -0,0 +1,125 @@
+""" Level of detail of the GPS tracks for the map
+
+The points are simplified with Douglas-Peucker in Web Mercator coordinates (degrees at the equator), so the
+tolerance of a level is a fraction of a screen pixel at the zoom of the map. Each point stores the coarsest level
+it is part of, a level contains all points of the coarser levels. Points that are in none of the levels are only
+shown at zooms above the last level (FULL_DETAIL).
+"""
+from typing import List, Tuple, Union
+
+import numpy as np
+
+LEVEL_ZOOMS = (5, 8, 11, 14)    # zoom of the map for which each level is made
+FULL_DETAIL = len(LEVEL_ZOOMS)
+PIXEL_TOLERANCE = 1.0     # like the smoothFactor of Leaflet
+_level_type = np.dtype('u1')
+
+
+def tolerance(zoom: int) -> float:
+    """ In degrees of longitude """
+    return PIXEL_TOLERANCE * 360 / (256 * 2 ** zoom)
+
+
+LEVEL_TOLERANCES = np.array([tolerance(zoom) for zoom in LEVEL_ZOOMS])
+
+
+def level_for_zoom(zoom: int) -> int:
+    """ The coarsest level that is fine enough for the zoom """
+    for level, level_zoom in enumerate(LEVEL_ZOOMS):
+        if zoom <= level_zoom:
+            return level
+    return FULL_DETAIL
+
+
+def mercator(latitudes: np.ndarray, longitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    latitudes = np.clip(np.asarray(latitudes, dtype=np.float64), -85, 85)
+    return np.asarray(longitudes, dtype=np.float64), np.degrees(np.log(np.tan(np.pi / 4 + np.radians(latitudes) / 2)))
+
+
+def point_levels(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """ The coarsest level of each point, FULL_DETAIL if it's in none of the levels """
+    number_points = len(latitudes)
+    if number_points == 0:
+        return np.zeros(0, dtype=_level_type)
+    x, y = mercator(latitudes, longitudes)
+    significance = np.zeros(number_points)
+    significance[[0, -1]] = np.inf
+    min_tolerance = LEVEL_TOLERANCES[-1]
+    # All segments of the same depth are split at once: first point, last point, significance of the splitting point
+    firsts = np.array([0])
+    lasts = np.array([number_points - 1])
+    parent_significances = np.array([np.inf])
+    while True:
+        has_interior = lasts - firsts > 1
+        firsts, lasts, parent_significances = (
+            firsts[has_interior], lasts[has_interior], parent_significances[has_interior]
+        )
+        if firsts.shape[0] == 0:
+            break
+        # The interior points of all segments, one after the other
+        interior_counts = lasts - firsts - 1
+        offsets = np.concatenate(([0], np.cumsum(interior_counts)[:-1]))
+        segment = np.repeat(np.arange(firsts.shape[0]), interior_counts)
+        interior = firsts[segment] + 1 + np.arange(segment.shape[0]) - offsets[segment]
+        dx = (x[lasts] - x[firsts])[segment]
+        dy = (y[lasts] - y[firsts])[segment]
+        px = x[interior] - x[firsts][segment]
+        py = y[interior] - y[firsts][segment]
+        # Distance to the segment (not the line), in case the track returns to its start
+        length = dx * dx + dy * dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(length > 0, np.clip((px * dx + py * dy) / length, 0, 1), 0)
+        distance = np.hypot(px - fraction * dx, py - fraction * dy)
+        max_distance = np.maximum.reduceat(distance, offsets)
+        # The first point with the maximum distance of each segment
+        is_max = np.flatnonzero(distance == max_distance[segment])
+        _, first_max = np.unique(segment[is_max], return_index=True)
+        splits = interior[is_max[first_max]]
+        to_split = max_distance >= min_tolerance
+        firsts, lasts, splits = firsts[to_split], lasts[to_split], splits[to_split]
+        # A point is only kept if the points splitting the segments before are kept
+        split_significances = np.minimum(max_distance[to_split], parent_significances[to_split])
+        significance[splits] = split_significances
+        firsts, lasts, parent_significances = (
+            np.concatenate((firsts, splits)), np.concatenate((splits, lasts)),
+            np.concatenate((split_significances, split_significances))
+        )
+    return (LEVEL_TOLERANCES[None, :] > significance[:, None]).sum(axis=1).astype(_level_type)
+
+
+def pack_levels(levels: np.ndarray) -> bytes:
+    return levels.astype(_level_type).tobytes()
+
+
+def unpack_levels(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=_level_type)
+
+
+def select_points(
+        levels: np.ndarray, level: int, begin: int = 0, end: Union[int, None] = None
+) -> np.ndarray:
+    """ Indexes of the points between begin and end (exclusive) for the level, including begin and end - 1 """
+    end = levels.shape[0] if end is None else end
+    if end <= begin:
+        return np.array([], dtype=np.int64)
+    indexes = begin + np.flatnonzero(levels[begin:end] <= level)
+    return np.unique(np.concatenate(([begin], indexes, [end - 1])))
+
+
+def split_in_bounds(
+        indexes: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, bounds: List[float]
+) -> List[np.ndarray]:
+    """ The parts of the line through the points that might cross the bounds (south, west, north, east) """
+    south, west, north, east = bounds
+    lats = latitudes[indexes]
+    lons = longitudes[indexes]
+    if indexes.shape[0] < 2:
+        inside = (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+        return [indexes] if inside.all() and indexes.shape[0] else []
+    # Segments between consecutive points with their bounding box intersecting the bounds
+    shown = (
+        (np.minimum(lats[:-1], lats[1:]) <= north) & (np.maximum(lats[:-1], lats[1:]) >= south) &
+        (np.minimum(lons[:-1], lons[1:]) <= east) & (np.maximum(lons[:-1], lons[1:]) >= west)
+    )
+    changes = np.flatnonzero(np.diff(np.concatenate(([0], shown.astype(np.int8), [0]))))
+    return [indexes[part_begin:part_end + 1] for part_begin, part_end in zip(changes[::2], changes[1::2])]
@@ -0,0 +1,40 @@
+""" The numbers shown on the home page
+
+They are read with a single query of scalar subqueries and kept in the figure cache until the data version of one
+of the tables changes (see data_version.py), so most visits of the home page don't query the database at all.
+"""
+from typing import Dict
+
+from django.db import connection, models
+
+from . import data_version
+from .figure_cache import figure_cache
+from .models import CycleRides, CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary, GPSData
+
+COUNTED = {
+    'number_of_days': CycleRides, 'number_of_weeks': CycleWeeklySummary, 'number_of_months': CycleMonthlySummary,
+    'number_of_years': CycleYearlySummary, 'number_of_gps_files': GPSData
+}
+
+
+def query_statistics() -> Dict:
+    quote = connection.ops.quote_name
+    rides = quote(CycleRides._meta.db_table)
+    date = quote(CycleRides._meta.get_field('date').column)
+    subqueries = [f"(SELECT MIN({date}) FROM {rides})", f"(SELECT MAX({date}) FROM {rides})"] + [
+        f"(SELECT COUNT(*) FROM {quote(model._meta.db_table)})" for model in COUNTED.values()
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(subqueries)}")
+        start_date, end_date, *counts = cursor.fetchone()
+    statistics = {
+        'start_date': models.DateField().to_python(start_date), 'end_date': models.DateField().to_python(end_date)
+    }
+    statistics.update(zip(COUNTED.keys(), counts))
+    return statistics
+
+
+def site_statistics() -> Dict:
+    """ start_date and end_date of the rides (None without rides) and the number_of_* entries of the tables """
+    versions = data_version.get_all(*[model.table_name for model in COUNTED.values()])
+    return figure_cache.get_or_calculate(('site_statistics', versions), query_statistics)
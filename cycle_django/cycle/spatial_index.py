@@ -0,0 +1,213 @@
+""" Spatial index of the GPS tracks, photos and places in an SQLite R*Tree
+
+Each track has a bounding box for the whole track and one for every SEGMENT_POINTS points (consecutive segments
+share a point, so the line between them is covered). Photos are points and places (GeoLocateData) the boxes around
+their circles. The R*Tree is stored in the database itself, so all processes share it. Only the background thread
+writes it (see background.py), the requests just read it. It's made up to date with the data versions (see
+data_version.py) of the tables, which are stored in the index as well. Tracks are compared by the checksum of the
+track and only the new or changed ones are loaded, photos and places are indexed again completely.
+The R*Tree stores the coordinates as 32 bit floats, rounded outwards, hence the results might contain entries just
+outside the bounds.
+"""
+import threading
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+import numpy as np
+from django.db import connection, connections, transaction
+
+from my_base import Logging
+
+from . import data_version, track_metrics
+
+logger = Logging.setup_logger(__name__)
+
+TABLE = 'cycle_spatial_index'
+SEGMENT_POINTS = 100
+TRACK, SEGMENT, PHOTO, PLACE, VERSION = 'track', 'segment', 'photo', 'place', 'version'
+# The data versions of the indexed tables are stored in rows with fixed ids
+VERSION_IDS = {'GPSData': -1, 'PhotoData': -2, 'GeoLocateData': -3}
+TRACKS_PER_QUERY = 50    # tracks are large, don't load all of them at once
+NAMES_PER_QUERY = 500    # below the maximum number of variables of SQLite
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def track_signature(gps_obj) -> str:
+    """ Changes when a track is replaced, without loading the track """
+    return str(gps_obj.track_checksum)
+
+
+def segment_boxes(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """ lat_min, lat_max, lon_min, lon_max of each segment of SEGMENT_POINTS points, including the first point of
+    the next segment
+    """
+    number_points = latitudes.shape[0]
+    if number_points == 0:
+        return np.zeros((0, 4))
+    starts = np.arange(0, max(number_points - 1, 1), SEGMENT_POINTS)
+    boxes = []
+    for values in (latitudes, longitudes):
+        minima = np.minimum.reduceat(values, starts)
+        maxima = np.maximum.reduceat(values, starts)
+        minima[:-1] = np.minimum(minima[:-1], values[starts[1:]])
+        maxima[:-1] = np.maximum(maxima[:-1], values[starts[1:]])
+        boxes += [minima, maxima]
+    return np.column_stack(boxes)
+
+
+def place_box(latitude: float, longitude: float, radius: float) -> Tuple[float, float, float, float]:
+    """ Around the circle with the radius in km, doesn't work for longitudes at +- 180 and poles """
+    radius_deg = radius / (track_metrics.EARTH_RADIUS * np.radians(1))
+    radius_deg_lon = radius_deg / np.cos(np.radians(latitude))
+    return latitude - radius_deg, latitude + radius_deg, longitude - radius_deg_lon, longitude + radius_deg_lon
+
+
+def create_table(using: str = 'default', **kwargs):
+    """ Run after the migrations (post_migrate signal), Django's models can't describe virtual tables """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING rtree("
+            f"id, lat_min, lat_max, lon_min, lon_max, +kind, +name, +signature)"
+        )
+
+
+class SpatialIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _cursor():
+        return connection.cursor()
+
+    @staticmethod
+    def _insert(cursor, rows: List[Tuple]):
+        if not rows:
+            return
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (lat_min, lat_max, lon_min, lon_max, kind, name, signature) "
+            f"VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            rows
+        )
+
+    @staticmethod
+    def _stored_versions(cursor) -> Dict[str, str]:
+        cursor.execute(
+            f"SELECT name, signature FROM {TABLE} WHERE id IN ({', '.join(['%s'] * len(VERSION_IDS))})",
+            list(VERSION_IDS.values())
+        )
+        return dict(cursor.fetchall())
+
+    @staticmethod
+    def _store_version(cursor, name: str, version: int):
+        cursor.execute(f"DELETE FROM {TABLE} WHERE id = %s", [VERSION_IDS[name]])
+        cursor.execute(
+            f"INSERT INTO {TABLE} (id, lat_min, lat_max, lon_min, lon_max, kind, name, signature) "
+            f"VALUES (%s, 0, 0, 0, 0, %s, %s, %s)",
+            [VERSION_IDS[name], VERSION, name, str(version)]
+        )
+
+    def _index_tracks(self, gps_objs: List):
+        """ Add or replace the boxes of the tracks, the objects need the track loaded """
+        rows = []
+        for obj in gps_objs:
+            track = obj.get_track()
+            boxes = segment_boxes(track['Latitudes_deg'], track['Longitudes_deg'])
+            if boxes.shape[0] == 0:
+                continue
+            signature = track_signature(obj)
+            rows.append((
+                boxes[:, 0].min(), boxes[:, 1].max(), boxes[:, 2].min(), boxes[:, 3].max(), TRACK, obj.filename,
+                signature
+            ))
+            rows += [(*box, SEGMENT, obj.filename, signature) for box in boxes.tolist()]
+        with self._cursor() as cursor:
+            self._remove_tracks(cursor, [obj.filename for obj in gps_objs])
+            self._insert(cursor, rows)
+
+    @staticmethod
+    def _remove_tracks(cursor, filenames: List[str]):
+        for chunk in _chunks(filenames, NAMES_PER_QUERY):
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE kind IN (%s, %s) AND name IN ({', '.join(['%s'] * len(chunk))})",
+                [TRACK, SEGMENT] + chunk
+            )
+
+    def _sync_tracks(self, cursor):
+        from .models import GPSData
+        cursor.execute(f"SELECT name, signature FROM {TABLE} WHERE kind = %s", [TRACK])
+        indexed = dict(cursor.fetchall())
+        signatures = {obj.filename: track_signature(obj) for obj in GPSData.objects.only('track_checksum')}
+        self._remove_tracks(cursor, [filename for filename in indexed if filename not in signatures])
+        changed = [filename for filename, signature in signatures.items() if indexed.get(filename) != signature]
+        if changed:
+            logger.info(f"Adding {len(changed)} tracks to the spatial index")
+        for chunk in _chunks(changed, TRACKS_PER_QUERY):
+            self._index_tracks(GPSData.objects.filter(filename__in=chunk).only('track_checksum', 'track'))
+
+    def _sync_photos(self, cursor):
+        from .models import PhotoData
+        cursor.execute(f"DELETE FROM {TABLE} WHERE kind = %s", [PHOTO])
+        self._insert(cursor, [
+            (latitude, latitude, longitude, longitude, PHOTO, filename, '')
+            for filename, latitude, longitude in PhotoData.objects.values_list('filename', 'latitude', 'longitude')
+        ])
+
+    def _sync_places(self, cursor):
+        from .models import GeoLocateData
+        cursor.execute(f"DELETE FROM {TABLE} WHERE kind = %s", [PLACE])
+        self._insert(cursor, [
+            (*place_box(latitude, longitude, radius), PLACE, str(pk), '')
+            for pk, latitude, longitude, radius in GeoLocateData.objects.values_list(
+                'pk', 'latitude', 'longitude', 'radius'
+            )
+        ])
+
+    def sync(self):
+        """ Update the index for the tables that changed since the last time, only called by the background thread,
+        so the requests don't need to write to the database
+        """
+        versions = dict(zip(VERSION_IDS, data_version.get_all(*VERSION_IDS)))
+        with self.lock, transaction.atomic(), self._cursor() as cursor:
+            stored_versions = self._stored_versions(cursor)
+            for name, sync in (
+                    ('GPSData', self._sync_tracks), ('PhotoData', self._sync_photos),
+                    ('GeoLocateData', self._sync_places)
+            ):
+                if stored_versions.get(name) != str(versions[name]):
+                    sync(cursor)
+                    self._store_version(cursor, name, versions[name])
+
+    def indexed_versions(self) -> Tuple[Union[str, None], ...]:
+        """ The data versions of the tables the index is up to date with, e.g. for the keys of cached results """
+        with self._cursor() as cursor:
+            stored_versions = self._stored_versions(cursor)
+        return tuple(stored_versions.get(name) for name in VERSION_IDS)
+
+    def _in_bounds(self, kind: str, bounds: List[float]) -> Set[str]:
+        """ bounds: south, west, north, east """
+        south, west, north, east = bounds
+        with self._cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT name FROM {TABLE} "
+                f"WHERE lat_max >= %s AND lat_min <= %s AND lon_max >= %s AND lon_min <= %s AND kind = %s",
+                [south, north, west, east, kind]
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def tracks_in_bounds(self, bounds: List[float]) -> Set[str]:
+        """ The filenames of the tracks with a segment intersecting the bounds """
+        return self._in_bounds(SEGMENT, bounds)
+
+    def photos_in_bounds(self, bounds: List[float]) -> Set[str]:
+        return self._in_bounds(PHOTO, bounds)
+
+    def places_in_bounds(self, bounds: List[float]) -> Set[int]:
+        """ The primary keys of the places, whose circle might intersect the bounds """
+        return {int(pk) for pk in self._in_bounds(PLACE, bounds)}
+
+
+spatial_index = SpatialIndex()
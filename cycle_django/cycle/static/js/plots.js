@@ -0,0 +1,50 @@
+// Draws the plotly figures of the page, which are compact JSON (see plot_data.py): either loaded from the url in
+// data-url (the figure called data-name of the response) or from the <script> element with the id in data-figure.
+(function () {
+  const typedArrays = {
+    f8: Float64Array, f4: Float32Array, i4: Int32Array, u4: Uint32Array,
+    i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array
+  };
+
+  // The installed plotly.js doesn't know {dtype, bdata} yet
+  function decodeTypedArrays(value) {
+    if (Array.isArray(value)) {
+      return value.map(decodeTypedArrays);
+    }
+    if (value === null || typeof value !== 'object') {
+      return value;
+    }
+    if (typeof value.bdata === 'string' && value.dtype in typedArrays) {
+      const bytes = Uint8Array.from(atob(value.bdata), c => c.charCodeAt(0));
+      return new typedArrays[value.dtype](bytes.buffer);
+    }
+    const result = {};
+    for (const [key, item] of Object.entries(value)) {
+      result[key] = decodeTypedArrays(item);
+    }
+    return result;
+  }
+
+  function draw(div, figure) {
+    if (!figure) {
+      return;
+    }
+    figure = decodeTypedArrays(figure);
+    Plotly.newPlot(div, figure.data, figure.layout, {responsive: true});
+  }
+
+  // Several figures of a page share the same request
+  const requests = {};
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('.plotly-figure').forEach(function (div) {
+      if (div.dataset.url) {
+        if (!(div.dataset.url in requests)) {
+          requests[div.dataset.url] = fetch(div.dataset.url).then(response => response.json());
+        }
+        requests[div.dataset.url].then(figures => draw(div, figures[div.dataset.name]));
+      } else {
+        draw(div, JSON.parse(document.getElementById(div.dataset.figure).textContent));
+      }
+    });
+  });
+})();
@@ -1,7 +1,10 @@
 import datetime
 from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
 
 from my_base import Logging
+from ..plot_data import PLOTLY_JS
 
 register = template.Library()
 logger = Logging.setup_logger(__name__)
@@ -63,3 +66,11 @@ def date_as_yyyymm(date):
 @register.filter
 def date_as_yyyy(date):
     return date.strftime('%Y')
+
+
+@register.simple_tag
+def plotly_js():
+    """ The scripts to draw the figures of plot_data.py
+    Use {% plotly_js %} in the head
+    """
+    return format_html('<script src="{}"></script><script src="{}"></script>', static(PLOTLY_JS), static('js/plots.js'))
@@ -1,9 +1,15 @@
+import os
 import random
-from datetime import date, datetime
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from django.db import models
 from django.test import TestCase
 from unittest.mock import call, MagicMock, mock_open, patch
 
+from cycle import gps_track
 from cycle.backup import Backup
+from cycle.models import GPSData
 
 MODULE_PATH = "cycle.backup."
 
@@ -75,3 +81,109 @@ class TestBackupDB(TestCase):
             self.backup = Backup()
 
         _create_folder_if_required.assert_called_once_with("bd")
+
+
+@patch(MODULE_PATH + "Backup.backup_table")
+class TestQueueBackup(BackupTest):
+
+    def test_changes_are_combined(self, _backup_table):
+        self.backup.run_worker = MagicMock()  # flush manually
+        data_callable = MagicMock(return_value=b'data')
+
+        self.backup.queue_backup('CycleRides', data_callable, csv_dump=False)
+        self.backup.queue_backup('CycleRides', data_callable)
+        self.backup.queue_backup('GPSData', csv_dump=False)
+        self.backup.flush()
+        self.backup.flush()
+
+        self.assertEqual(
+            [call('CycleRides', b'data', csv_dump=True), call('GPSData', b'', csv_dump=False)],
+            _backup_table.call_args_list
+        )
+        data_callable.assert_called_once_with()
+
+    def test_worker(self, _backup_table):
+        self.backup.window = 0.01
+
+        self.backup.queue_backup('NoGoAreas', MagicMock(return_value=b'data'))
+        for _ in range(100):
+            if _backup_table.called:
+                break
+            time.sleep(0.05)
+
+        _backup_table.assert_called_once_with('NoGoAreas', b'data', csv_dump=True)
+
+
+class TestSegments(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patches = [
+            patch(MODULE_PATH + 'BACKUP_FOLDER', self.tmp_dir.name),
+            patch(MODULE_PATH + 'LOAD_DUMP_FOLDER', self.tmp_dir.name),
+            patch(MODULE_PATH + 'COMPACT_SEGMENTS_SIZE_RATIO', 100),    # the test dump is tiny
+            patch.dict(Backup.file_changed_last_loaded, clear=True),
+            patch.dict(Backup.segment_loaded, clear=True),
+        ]
+        for item in self.patches:
+            item.start()
+        self.backup = Backup()
+        self.segments_folder = os.path.join(self.tmp_dir.name, 'GPSData_segments')
+
+    def tearDown(self) -> None:
+        for item in self.patches:
+            item.stop()
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def create_gps_data(filename):
+        track = gps_track.pack_track([0, 1], [50.0, 50.1], [11.0, 11.1], [100, 101])
+        GPSData.objects.bulk_create([GPSData(
+            filename=filename, start=datetime(2023, 6, 20, tzinfo=timezone.utc),
+            end=datetime(2023, 6, 20, tzinfo=timezone.utc), number_entries=2, track=track
+        )])
+
+    def test_write_and_load(self):
+        self.create_gps_data('a.gpx')
+        self.create_gps_data('b.gpx')
+        # No full dump yet, so it is created
+        self.backup.write_segment('GPSData', {'a.gpx', 'b.gpx'}, set())
+        self.assertEqual({'base_sequence': 1, 'segments': []}, Backup.read_segments_manifest(self.segments_folder))
+        self.create_gps_data('c.gpx')
+        models.QuerySet.delete(GPSData.objects.filter(filename='a.gpx'))
+
+        self.backup.write_segment('GPSData', {'c.gpx'}, {'a.gpx'})
+
+        manifest = Backup.read_segments_manifest(self.segments_folder)
+        self.assertEqual(
+            [{'sequence': 2, 'deleted': ['a.gpx'], 'file': 'GPSData_00000002.json.gz'}], manifest['segments']
+        )
+        models.QuerySet.delete(GPSData.objects.all())
+
+        with patch(MODULE_PATH + 'Backup.queue_segment') as _queue_segment:
+            self.assertTrue(self.backup.load_database_dump('GPSData'))
+            self.assertIsNone(self.backup.load_database_dump('GPSData'))
+
+        # The loaded deletion is not written as a new segment
+        _queue_segment.assert_not_called()
+
+        self.assertEqual(['b.gpx', 'c.gpx'], sorted(GPSData.objects.values_list('filename', flat=True)))
+        self.assertEqual(2, Backup.segment_loaded['GPSData'])
+
+    def test_compaction(self):
+        self.create_gps_data('a.gpx')
+        self.backup.write_segment('GPSData', {'a.gpx'}, set())
+
+        with patch(MODULE_PATH + 'COMPACT_SEGMENTS', 2):
+            self.backup.write_segment('GPSData', {'a.gpx'}, set())
+            self.assertEqual(1, len(Backup.read_segments_manifest(self.segments_folder)['segments']))
+            self.backup.write_segment('GPSData', set(), {'a.gpx'})
+
+        self.assertEqual({'base_sequence': 3, 'segments': []}, Backup.read_segments_manifest(self.segments_folder))
+        self.assertEqual(['manifest.json'], os.listdir(self.segments_folder))
+
+    def test_only_segmented_tables(self):
+        with self.assertRaises(ValueError):
+            self.backup.queue_segment('Bicycles', changed=['1'])
+        with self.assertRaises(ValueError):
+            self.backup.load_segments('Bicycles')
@@ -0,0 +1,41 @@
+import datetime
+from django.test import TestCase
+
+from cycle.columns import load_columns
+from cycle.models import Bicycles, CycleRides, CycleWeeklySummary
+
+
+class TestLoadColumns(TestCase):
+
+    def test_same_as_models(self):
+        bicycle = Bicycles.objects.bulk_create([Bicycles(description='a')])[0]
+        for day, distance in [(2, 10.5), (1, 20.)]:
+            duration = datetime.timedelta(hours=1, seconds=day, microseconds=7)
+            CycleRides(
+                date=datetime.date(2020, 1, day), distance=distance, duration=duration, totaldistance=distance,
+                totalduration=duration, bicycle=bicycle
+            ).save(run_backup=False)
+        names = ['date', 'distance', 'duration', 'bicycle']
+        queryset = CycleRides.objects.order_by('date')
+
+        data_frame = load_columns(queryset, names)
+
+        self.assertEqual(names, list(data_frame.columns))
+        for row, ride in zip(data_frame.itertuples(index=False), queryset):
+            self.assertEqual((ride.date, ride.distance, ride.duration, bicycle.pk), tuple(row))
+
+    def test_missing_values(self):
+        CycleWeeklySummary.objects.create(date=datetime.date(2020, 1, 6), updated=True)
+
+        data_frame = load_columns(CycleWeeklySummary.objects.all(), ['date', 'distance', 'duration', 'updated'])
+
+        self.assertEqual([datetime.date(2020, 1, 6)], data_frame['date'].tolist())
+        self.assertTrue(data_frame['distance'].isna().all())
+        self.assertTrue(data_frame['duration'].isna().all())
+        self.assertEqual([True], data_frame['updated'].tolist())
+
+    def test_empty(self):
+        data_frame = load_columns(CycleRides.objects.all(), ['date', 'duration'])
+
+        self.assertEqual(0, len(data_frame))
+        self.assertEqual(['date', 'duration'], list(data_frame.columns))
@@ -0,0 +1,37 @@
+from unittest.mock import patch
+import numpy as np
+from django.test import TestCase
+
+from cycle import curiosity_numbers
+
+
+class TestCuriosityNumbers(TestCase):
+
+    def test_matches(self):
+        values = np.array([314.15, 1111, 12.34, 12.35, 0.5, 9876543210, 1E12, np.nan])
+
+        np.testing.assert_array_equal(
+            [True, True, True, False, False, True, False, False], curiosity_numbers.matches(values, 'numbers')
+        )
+        # 22:22 and 1:23:45
+        np.testing.assert_array_equal(
+            [True, True, False], curiosity_numbers.matches(np.array([1342, 5025, 5026]), 'times_s')
+        )
+
+    def test_same_as_sets(self):
+        sets = curiosity_numbers._candidate_sets()
+        values = np.concatenate([np.round(np.arange(0, 200, 0.01), 2), np.arange(100000.)])
+        for kind, numbers in sets.items():
+            np.testing.assert_array_equal(
+                [value in numbers for value in values.tolist()], curiosity_numbers.matches(values, kind)
+            )
+
+    def test_built_once(self):
+        curiosity_numbers.candidates.cache_clear()
+        with patch.object(
+                curiosity_numbers, '_candidate_sets', wraps=curiosity_numbers._candidate_sets
+        ) as candidate_sets:
+            for _ in range(3):
+                curiosity_numbers.matches(np.array([1111.]), 'numbers')
+
+        candidate_sets.assert_called_once()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import zipfile
+import numpy as np
+from django.test import TestCase
+from unittest.mock import patch
+
+from cycle import elevation
+
+
+class TestElevationService(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_30m = os.path.join(self.tmp_dir.name, '1')
+        self.dir_90m = os.path.join(self.tmp_dir.name, '3')
+        os.makedirs(os.path.join(self.dir_30m, 'sub'))
+        os.makedirs(self.dir_90m)
+        # Elevation increases by 1 m per column, the first row is 2000 m
+        size = 1201
+        self.raster = (2000 - np.arange(size)[:, None] + np.arange(size)[None, :]).astype('>i2')
+        self.raster[10, 10] = elevation.VOID_VALUE
+        self.raster[20, 20] = -5
+        self.raster.tofile(os.path.join(self.dir_30m, 'sub', 'N50E011.hgt'))
+        with zipfile.ZipFile(os.path.join(self.dir_90m, 'S01W001.hgt.zip'), 'w') as zipped:
+            zipped.writestr('S01W001.hgt', (np.full((size, size), 7, dtype='>i2')).tobytes())
+        self.service = elevation.ElevationService([self.dir_30m, self.dir_90m])
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_nearest_pixel(self):
+        step = 1 / 1200
+        elevations, valid = self.service.get_elevations(
+            [51 - 3 * step, 50.0, 51 - 10 * step, 51 - 20 * step, -0.5],
+            [11 + 4.4 * step, 11.0, 11 + 10 * step, 11 + 20 * step, -0.5],
+        )
+
+        np.testing.assert_array_equal([2001, 800, -1, -1, 7], elevations)
+        np.testing.assert_array_equal([True, True, False, False, True], valid)
+
+    def test_interpolation(self):
+        step = 1 / 1200
+        elevations, _ = self.service.get_elevations(
+            [51 - 3.5 * step, 51 - 9.6 * step], [11 + 4.3 * step, 11 + 9.6 * step], interpolate=True
+        )
+
+        # 2000 - 3.5 + 4.3, rounded; next to a void the nearest value is used
+        np.testing.assert_array_equal([2001, -1], elevations)
+
+    def test_no_tile(self):
+        with self.assertRaises(elevation.NoElevationData):
+            self.service.get_elevations([50.5, 48.5], [11.5, 11.5])
+
+    def test_bad_tile(self):
+        with open(os.path.join(self.dir_30m, 'N48E011.hgt'), 'wb') as f:
+            f.write(b'12345678')
+        service = elevation.ElevationService([self.dir_30m])
+
+        with self.assertRaises(elevation.BadTileFile):
+            service.get_elevations([48.5], [11.5])
+
+    def test_few_zipped_tiles_in_memory(self):
+        for name in ['S01E000', 'S01E001']:
+            with zipfile.ZipFile(os.path.join(self.dir_90m, f'{name}.hgt.zip'), 'w') as zipped:
+                zipped.writestr(f'{name}.hgt', (np.full((1201, 1201), 8, dtype='>i2')).tobytes())
+        with patch('cycle.elevation.ZIPPED_TILES_IN_MEMORY', 2):
+            service = elevation.ElevationService([self.dir_90m])
+
+        elevations, _ = service.get_elevations([-0.5, -0.5, -0.5], [-0.5, 0.5, 1.5])
+
+        np.testing.assert_array_equal([7, 8, 8], elevations)
+        self.assertEqual([(-1, 0), (-1, 1)], list(service.sources[0].zipped_rasters.entries))
@@ -0,0 +1,98 @@
+import datetime
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+from django.test import TestCase
+from django.urls import reverse
+
+from cycle import views
+from cycle.figure_cache import FigureCache, figure_cache
+from cycle.models import Bicycles, CycleRides
+
+
+class TestFigureCache(TestCase):
+
+    def test_least_recently_used(self):
+        cache = FigureCache(max_entries=2, folder=None)
+        cache.get_or_calculate('a', lambda: 1)
+        cache.get_or_calculate('b', lambda: 2)
+        cache.get_or_calculate('a', lambda: 3)
+        cache.get_or_calculate('c', lambda: 4)
+
+        self.assertEqual(1, cache.get_or_calculate('a', lambda: 5))
+        self.assertEqual(6, cache.get_or_calculate('b', lambda: 6))
+
+    def test_on_disk(self):
+        with tempfile.TemporaryDirectory() as folder:
+            FigureCache(folder=folder).get_or_calculate(('plot', 1), lambda: '<div>')
+            calculate = MagicMock(return_value='other')
+
+            # Another process
+            self.assertEqual('<div>', FigureCache(folder=folder).get_or_calculate(('plot', 1), calculate))
+            self.assertEqual('other', FigureCache(folder=folder).get_or_calculate(('plot', 2), calculate))
+            calculate.assert_called_once()
+
+    def test_on_disk_eviction(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FigureCache(folder=folder, max_files=2)
+            for key in range(3):
+                cache.get_or_calculate(key, lambda: key)
+
+            self.assertEqual(2, len(os.listdir(folder)))
+
+    def test_on_disk_size(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FigureCache(folder=folder, max_bytes=2500)
+            for key in range(3):
+                cache.get_or_calculate(key, lambda: b'x' * 1000)
+
+            self.assertEqual(2, len(os.listdir(folder)))
+
+
+class TestCachedPlots(TestCase):
+
+    def setUp(self) -> None:
+        figure_cache.clear()
+        self.bicycle = Bicycles.objects.bulk_create([Bicycles(description='a')])[0]
+        self.add_ride(datetime.date(2020, 1, 1))
+
+    def add_ride(self, date):
+        duration = datetime.timedelta(hours=1)
+        CycleRides(
+            date=date, distance=20, duration=duration, totaldistance=20, totalduration=duration, bicycle=self.bicycle
+        ).save(run_backup=False)
+
+    @patch.object(views.DataListView, 'create_scatter_plot', return_value=None)
+    def test_cached_until_data_changes(self, create_scatter_plot):
+        self.client.get(reverse('plot_data', args=['day']))
+        self.client.get(reverse('plot_data', args=['day']))
+
+        self.assertEqual(1, create_scatter_plot.call_count)
+
+        self.client.get(reverse('plot_data', args=['day']) + '?x_data=date&y_data=duration&z_data=none')
+        self.add_ride(datetime.date(2020, 1, 2))
+        self.client.get(reverse('plot_data', args=['day']))
+
+        self.assertEqual(3, create_scatter_plot.call_count)
+
+    def test_plot_data(self):
+        self.add_ride(datetime.date(2020, 1, 2))
+        response = self.client.get(reverse('plot_data', args=['day']))
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+        self.assertEqual('scatter', response.json()['plot']['data'][0]['type'])
+
+        # Unchanged data
+        response = self.client.get(reverse('plot_data', args=['day']), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.content)
+
+    def test_plot_data_unknown(self):
+        self.assertEqual(404, self.client.get(reverse('plot_data', args=['unknown'])).status_code)
+
+    def test_page_links_plot_data(self):
+        response = self.client.get(reverse('cycle_data') + '?y_data=duration')
+
+        self.assertContains(response, f'data-url="{reverse("plot_data", args=["day"])}?x_data=date&amp;y_data=duration')
+        self.assertNotContains(response, 'Plotly.newPlot')
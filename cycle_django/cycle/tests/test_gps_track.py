@@ -0,0 +1,67 @@
+import base64
+import json
+import numpy as np
+from django.test import TestCase
+
+from cycle import gps_track
+
+
+class TestPackTrack(TestCase):
+
+    def setUp(self) -> None:
+        self.datetimes = [1269530756, 1269530758, 1269530761, 1269530800]
+        self.latitudes = [50.91978, 50.9198, -0.00001, 89.99999]
+        self.longitudes = [11.47739, -179.99999, 11.4774, 0.0]
+        self.altitudes = [123, -4, 0, 8848]
+        self.alt_srtm = [120, -1, 3, 8840]
+
+    def test_round_trip(self):
+        data = gps_track.pack_track(
+            self.datetimes, self.latitudes, self.longitudes, self.altitudes, alt_srtm=self.alt_srtm
+        )
+        track = gps_track.unpack_track(data)
+
+        np.testing.assert_array_equal(self.datetimes, track['Times'])
+        # Same values as parsing the json text
+        np.testing.assert_array_equal(np.array(self.latitudes, dtype=np.float64), track['Latitudes_deg'])
+        np.testing.assert_array_equal(np.array(self.longitudes, dtype=np.float64), track['Longitudes_deg'])
+        np.testing.assert_array_equal(self.altitudes, track['Altitudes'])
+        np.testing.assert_array_equal(self.alt_srtm, track['Altitudes_srtm'])
+        self.assertIsNone(track['Speeds'])
+        self.assertEqual(4, gps_track.number_of_points(data))
+
+    def test_without_srtm(self):
+        data = gps_track.pack_track(self.datetimes, self.latitudes, self.longitudes, self.altitudes, alt_srtm=[])
+
+        self.assertIsNone(gps_track.unpack_track(data)['Altitudes_srtm'])
+
+    def test_wrong_data(self):
+        with self.assertRaises(ValueError):
+            gps_track.unpack_track(b'something else, but long enough')
+
+    def test_upgrade_legacy_fields(self):
+        fields = {
+            'start': '2010-03-25T15:25:56Z', 'end': '2010-03-25T15:26:40Z',
+            'datetimes': json.dumps(self.datetimes), 'latitudes': json.dumps(self.latitudes),
+            'longitudes': json.dumps(self.longitudes), 'altitudes': json.dumps(self.altitudes),
+            'alt_srtm': json.dumps(self.alt_srtm), 'speeds': None,
+        }
+
+        self.assertTrue(gps_track.upgrade_legacy_fields(fields))
+
+        self.assertEqual(['start', 'end', 'number_entries', 'track_checksum', 'track'], list(fields.keys()))
+        self.assertEqual(4, fields['number_entries'])
+        data = base64.b64decode(fields['track'])
+        self.assertEqual(gps_track.track_checksum(data), fields['track_checksum'])
+        track = gps_track.unpack_track(data)
+        np.testing.assert_array_equal(self.datetimes, track['Times'])
+        self.assertFalse(gps_track.upgrade_legacy_fields(fields))
+
+    def test_upgrade_number_entries(self):
+        data = gps_track.pack_track(self.datetimes, self.latitudes, self.longitudes, self.altitudes)
+        fields = {'start': '2010-03-25T15:25:56Z', 'track': base64.b64encode(data).decode()}
+
+        self.assertTrue(gps_track.upgrade_legacy_fields(fields))
+
+        self.assertEqual(4, fields['number_entries'])
+        self.assertEqual(gps_track.track_checksum(data), fields['track_checksum'])
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import numpy as np
+from django.test import TestCase
+from unittest.mock import patch
+
+from cycle import gps_track, gpx_import
+
+MODULE_PATH = "cycle.gpx_import."
+
+
+def create_gpx_text(number_points: int, start_second: int = 0) -> str:
+    points = "".join(
+        f'<trkpt lat="{50.9 + ii * 1E-4:.5f}" lon="{11.4 + ii * 1E-4:.5f}"><ele>{100 + ii}</ele>'
+        f'<time>2023-06-20T10:{(start_second + ii) // 60:02d}:{(start_second + ii) % 60:02d}Z</time></trkpt>'
+        for ii in range(number_points)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><gpx version="1.1" creator="test" '
+        'xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>' + points + '</trkseg></trk></gpx>'
+    )
+
+
+@patch(MODULE_PATH + 'hasSrtm', False)
+class TestImportGpxFiles(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.gpx_files = []
+        for ii, number_points in enumerate([30, 5, 40]):
+            filename = f'track{ii}.gpx'
+            with open(os.path.join(self.tmp_dir.name, filename), 'w') as f:
+                f.write(create_gpx_text(number_points, start_second=ii))
+            self.gpx_files.append((self.tmp_dir.name, filename))
+        self.batches = []
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_read_gpx_file(self):
+        result = gpx_import.read_gpx_file(*self.gpx_files[0])
+
+        self.assertEqual('track0.gpx', result['filename'])
+        self.assertEqual(0, result['start'].second)
+        self.assertEqual(29, result['end'].second)
+        track = gps_track.unpack_track(result['track'])
+        np.testing.assert_array_equal(np.arange(100, 130), track['Altitudes'])
+        self.assertIsNone(track['Altitudes_srtm'])
+
+    def test_too_few_points(self):
+        self.assertIsNone(gpx_import.read_gpx_file(*self.gpx_files[1]))
+
+    def test_import_gpx_files_batches(self):
+        number_read = gpx_import.import_gpx_files(self.gpx_files, self.batches.append, workers=1, batch_size=1)
+
+        self.assertEqual(2, number_read)
+        self.assertEqual([['track0.gpx'], ['track2.gpx']], [[r['filename'] for r in b] for b in self.batches])
+
+    def test_import_gpx_files_pool(self):
+        number_read = gpx_import.import_gpx_files(self.gpx_files, self.batches.append, workers=2)
+
+        self.assertEqual(2, number_read)
+        self.assertEqual(1, len(self.batches))
+        self.assertEqual(['track0.gpx', 'track2.gpx'], sorted(r['filename'] for r in self.batches[0]))
+
+
+class TestFolderScanner(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.tmp_dir.name
+        os.makedirs(os.path.join(self.folder, 'sub'))
+        for filename in ['a.gpx', os.path.join('sub', 'b.gpx'), 'notes.txt']:
+            with open(os.path.join(self.folder, filename), 'w') as f:
+                f.write(filename)
+        self.scanner = gpx_import.FolderScanner()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def scan_and_mark(self):
+        changed_files = self.scanner.scan([self.folder])
+        for foldername, filename, size, mtime in changed_files:
+            self.scanner.mark(os.path.join(foldername, filename), size, mtime)
+        return sorted(filename for _, filename, _, _ in changed_files)
+
+    def test_only_new_files(self):
+        self.assertEqual(['a.gpx', 'b.gpx'], self.scan_and_mark())
+        self.assertEqual([], self.scan_and_mark())
+
+        with open(os.path.join(self.folder, 'sub', 'c.gpx'), 'w') as f:
+            f.write('c')
+
+        self.assertEqual(['c.gpx'], self.scan_and_mark())
+
+    def test_unchanged_directory_is_not_listed(self):
+        self.scan_and_mark()
+
+        with patch(MODULE_PATH + 'os.scandir') as _scandir:
+            self.assertEqual([], self.scanner.scan([self.folder]))
+
+        _scandir.assert_not_called()
+
+    def test_reset(self):
+        self.scan_and_mark()
+        path = os.path.join(self.folder, 'a.gpx')
+
+        self.scanner.reset({path: self.scanner.files[path]})
+
+        self.assertEqual(['b.gpx'], self.scan_and_mark())
+
+    def test_recheck_failed_files(self):
+        self.scan_and_mark()
+        path = os.path.join(self.folder, 'a.gpx')
+        self.scanner.mark(path, *self.scanner.files[path], recheck=True)
+        self.scanner.mark(os.path.join(self.folder, 'gone.gpx'), 1, 1.0, recheck=True)
+
+        with patch(MODULE_PATH + 'os.scandir', wraps=os.scandir) as _scandir:
+            self.scanner.scan([self.folder])
+        _scandir.assert_called_once_with(self.folder)
+
+        self.scanner.mark(path, *self.scanner.files[path])
+
+        with patch(MODULE_PATH + 'os.scandir') as _scandir:
+            self.assertEqual([], self.scanner.scan([self.folder]))
+        _scandir.assert_not_called()
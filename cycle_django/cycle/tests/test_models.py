@@ -1,9 +1,16 @@
 import datetime
+import os
+import tempfile
 from django.db import connection, transaction
 from django.test import TestCase
 from unittest.mock import MagicMock, patch
 
-from cycle.models import convert_to_str_hours, CycleRides
+from cycle import gps_track, gpx_import, track_metrics
+from cycle.models import (
+    convert_to_str_hours, Bicycles, CycleRides, CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary, GPSData,
+    GPSDataMetrics, GPSFilesToIgnore, GPXFileManifest
+)
+from cycle.tests.test_gpx_import import create_gpx_text
 
 
 class TestConvertToStrHours(TestCase):
@@ -47,4 +54,240 @@ class TestConvertToStrHours(TestCase):
         obj = CycleRides.objects[0]
         obj.save()
 
-        _backup_db.assert_called_once_with()"""
\ No newline at end of file
+        _backup_db.assert_called_once_with()"""
+
+
+@patch('cycle.models.backup_instance')
+class TestCumulativeValues(TestCase):
+
+    def setUp(self) -> None:
+        self.bicycles = Bicycles.objects.bulk_create([Bicycles(description='a'), Bicycles(description='b')])
+        rides = []
+        for ii in range(40):
+            duration = datetime.timedelta(seconds=1800 + 37 * ii, microseconds=ii)
+            rides.append(CycleRides(
+                date=datetime.date(2008, 1, 1) + datetime.timedelta(days=ii), distance=10.1 + ii * 0.37,
+                duration=duration, totaldistance=0, totalduration=duration, bicycle=self.bicycles[ii % 3 == 0]
+            ))
+        CycleRides.objects.bulk_create(rides)
+
+    @staticmethod
+    def expected_values():
+        """ Adding up one entry after the other """
+        result = {}
+        cumdistance, cumduration = 0.0, datetime.timedelta(0)
+        cumbicycle = {}
+        for obj in CycleRides.objects.order_by('date'):
+            cumdistance += obj.distance
+            cumduration += obj.duration
+            bicycle_distance, bicycle_duration = cumbicycle.get(obj.bicycle_id, (0.0, datetime.timedelta(0)))
+            cumbicycle[obj.bicycle_id] = (bicycle_distance + obj.distance, bicycle_duration + obj.duration)
+            result[obj.pk] = (
+                round(cumbicycle[obj.bicycle_id][0], 4), cumbicycle[obj.bicycle_id][1], round(cumdistance, 4),
+                cumduration, round(round(cumdistance, 4) / cumduration.total_seconds() * 3600, 4)
+            )
+        return result
+
+    @staticmethod
+    def stored_values():
+        return {
+            values[0]: values[1:] for values in CycleRides.objects.values_list(
+                'pk', 'cumbicycledistance', 'cumbicycleduration', 'cumdistance', 'cumduration', 'cumspeed'
+            )
+        }
+
+    def test_update_all(self, _backup_instance):
+        for bicycle in self.bicycles:
+            CycleRides.objects.filter(bicycle=bicycle).first().update_cumulative_values()
+
+        self.assertEqual(self.expected_values(), self.stored_values())
+
+    def test_change_old_entry(self, _backup_instance):
+        for bicycle in self.bicycles:
+            CycleRides.objects.filter(bicycle=bicycle).first().update_cumulative_values()
+        obj = CycleRides.objects.get(date=datetime.date(2008, 1, 5))
+        obj.distance += 3.3
+        obj.date = datetime.date(2008, 2, 15)
+
+        obj.save(run_backup=False, run_summary=False)
+
+        self.assertEqual(self.expected_values(), self.stored_values())
+
+
+class TestSummaries(TestCase):
+
+    def setUp(self) -> None:
+        bicycle = Bicycles.objects.bulk_create([Bicycles(description='a')])[0]
+        rides = []
+        for ii in range(0, 500, 3):
+            duration = datetime.timedelta(seconds=1800 + 37 * ii)
+            rides.append(CycleRides(
+                date=datetime.date(2019, 11, 3) + datetime.timedelta(days=ii), distance=10.1 + ii * 0.37,
+                duration=duration, totaldistance=0, totalduration=duration, bicycle=bicycle
+            ))
+        CycleRides.objects.bulk_create(rides)
+
+    @staticmethod
+    def expected_values(begin_of_period):
+        result = {}
+        for obj in CycleRides.objects.all():
+            distance, duration, days = result.get(begin_of_period(obj.date), (0, datetime.timedelta(0), 0))
+            result[begin_of_period(obj.date)] = (distance + obj.distance, duration + obj.duration, days + 1)
+        return {
+            date: (round(distance, 4), duration, round(distance / duration.total_seconds() * 3600, 4), days)
+            for date, (distance, duration, days) in result.items()
+        }
+
+    def test_update_all(self):
+        CycleRides.mark_summary_tables(None, update_all=True)
+        for summary in CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary:
+            summary.update_fields()
+
+        for summary, begin_of_period in (
+                (CycleWeeklySummary, lambda date: date - datetime.timedelta(days=date.weekday())),
+                (CycleMonthlySummary, lambda date: datetime.date(date.year, date.month, 1)),
+                (CycleYearlySummary, lambda date: datetime.date(date.year, 1, 1)),
+        ):
+            values = {
+                obj[0]: obj[1:] for obj in summary.objects.values_list(
+                    'date', 'distance', 'duration', 'speed', 'numberofdays'
+                )
+            }
+            self.assertEqual(self.expected_values(begin_of_period), values)
+        self.assertFalse(CycleWeeklySummary.objects.filter(updated=True).exists())
+
+    def test_empty_period_is_removed(self):
+        CycleRides.mark_summary_tables(None, update_all=True)
+        CycleMonthlySummary.update_fields()
+        CycleRides.objects.filter(date__year=2019).delete()
+
+        CycleRides.mark_summary_tables(
+            CycleRides(date=datetime.date(2019, 12, 1)), previous_date=datetime.date(2019, 11, 3)
+        )
+        CycleMonthlySummary.update_fields()
+
+        self.assertEqual(datetime.date(2020, 1, 1), CycleMonthlySummary.objects.first().date)
+
+    def test_week_over_new_year(self):
+        CycleRides.objects.all().delete()
+        duration = datetime.timedelta(hours=1)
+        bicycle = Bicycles.objects.first()
+        CycleRides.objects.bulk_create([
+            CycleRides(date=date, distance=10, duration=duration, totaldistance=0, totalduration=duration,
+                       bicycle=bicycle)
+            for date in [datetime.date(2025, 12, 30), datetime.date(2026, 1, 2), datetime.date(2027, 1, 1)]
+        ])
+        # The week of 2026-12-28 only has a ride in the next year
+        CycleWeeklySummary.objects.bulk_create([
+            CycleWeeklySummary(date=datetime.date(2025, 12, 29), updated=True),
+            CycleWeeklySummary(date=datetime.date(2026, 12, 28), updated=True),
+        ])
+
+        CycleWeeklySummary.update_fields()
+
+        self.assertEqual(
+            [(datetime.date(2025, 12, 29), 20, 2), (datetime.date(2026, 12, 28), 10, 1)],
+            list(CycleWeeklySummary.objects.values_list('date', 'distance', 'numberofdays'))
+        )
+
+
+@patch('cycle.gpx_import.hasSrtm', False)
+@patch('cycle.models.backup_instance')
+class TestImportGpxFileToDatabase(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.write_file('track0.gpx', 30)
+        self.write_file('track1.gpx', 40)
+        self.write_file('short.gpx', 5)
+        self.scanner_patch = patch('cycle.models.gpx_folder_scanner', gpx_import.FolderScanner())
+        self.scanner_patch.start()
+        self.folders_patch = patch('cycle.models.GPX_FOLDERS', {self.tmp_dir.name})
+        self.folders_patch.start()
+
+    def tearDown(self) -> None:
+        self.folders_patch.stop()
+        self.scanner_patch.stop()
+        self.tmp_dir.cleanup()
+
+    def write_file(self, filename, number_points):
+        with open(os.path.join(self.tmp_dir.name, filename), 'w') as f:
+            f.write(create_gpx_text(number_points))
+
+    def test_import(self, _backup_instance):
+        with patch('cycle.gpx_import.GPX_IMPORT_WORKERS', 1):
+            GPSData.import_gpx_file_to_database()
+
+        self.assertEqual(
+            {'track0.gpx': 30, 'track1.gpx': 40}, dict(GPSData.objects.values_list('filename', 'number_entries'))
+        )
+        self.assertEqual(
+            {'track0.gpx': 'imported', 'track1.gpx': 'imported', 'short.gpx': 'failed'},
+            dict(GPXFileManifest.objects.values_list('filename', 'status'))
+        )
+        _backup_instance.queue_segment.assert_called_once_with('GPSData', changed={'track0.gpx', 'track1.gpx'})
+
+    def test_import_calculates_metrics(self, _backup_instance):
+        GPSData.import_gpx_file_to_database()
+
+        self.assertEqual(
+            {'track0.gpx': gps_track.track_checksum(GPSData.objects.get(filename='track0.gpx').track)},
+            dict(GPSDataMetrics.objects.filter(gps_id='track0.gpx').values_list('gps_id', 'track_checksum'))
+        )
+        self.assertEqual(30, GPSDataMetrics.objects.get(gps_id='track0.gpx').get_metrics()['Duration'].shape[0])
+
+    def test_update_outdated_metrics(self, _backup_instance):
+        GPSData.import_gpx_file_to_database()
+        GPSDataMetrics.objects.filter(gps_id='track0.gpx').delete()
+        GPSDataMetrics.objects.filter(gps_id='track1.gpx').update(parameters='old')
+
+        GPSDataMetrics.update_outdated()
+
+        self.assertEqual(
+            {'track0.gpx', 'track1.gpx'},
+            set(GPSDataMetrics.objects.filter(parameters=track_metrics.PARAMETERS).values_list('gps_id', flat=True))
+        )
+
+    def test_import_only_changes(self, _backup_instance):
+        GPSData.import_gpx_file_to_database()
+        GPSFilesToIgnore.objects.create(filename='track2.gpx')
+        self.write_file('track2.gpx', 50)
+        self.write_file('track0.gpx', 60)
+
+        with patch('cycle.models.gpx_import.import_gpx_files', wraps=gpx_import.import_gpx_files) as _import:
+            GPSData.import_gpx_file_to_database()
+
+        self.assertEqual(['track0.gpx'], [filename for _, filename in _import.call_args.args[0]])
+        self.assertEqual(60, GPSData.objects.get(filename='track0.gpx').number_entries)
+        self.assertEqual('ignored', GPXFileManifest.objects.get(filename='track2.gpx').status)
+
+    def test_deleted_entry_is_imported_again(self, _backup_instance):
+        GPSData.import_gpx_file_to_database()
+
+        GPSData.objects.filter(filename='track1.gpx').delete()
+        GPSData.import_gpx_file_to_database()
+
+        self.assertTrue(GPSData.objects.filter(filename='track1.gpx').exists())
+
+    def test_deleted_entry_is_imported_again_with_same_manifest_size(self, _backup_instance):
+        GPSData.import_gpx_file_to_database()
+
+        # Another process deletes an entry and adds one
+        GPSData.objects.filter(filename='track1.gpx').delete()
+        GPXFileManifest.objects.create(
+            path='/other/track2.gpx', filename='track2.gpx', size=1, mtime=1, status=GPXFileManifest.IGNORED
+        )
+        GPSData.import_gpx_file_to_database()
+
+        self.assertTrue(GPSData.objects.filter(filename='track1.gpx').exists())
+
+    def test_delete_backup(self, _backup_instance):
+        GPSData.import_gpx_file_to_database()
+        _backup_instance.reset_mock()
+
+        GPSData.objects.filter(filename='missing.gpx').delete()
+        GPSData.objects.filter(filename='track0.gpx').delete(run_backup=False)
+        _backup_instance.queue_segment.assert_not_called()
+
+        GPSData.objects.filter(filename='track1.gpx').delete()
+        _backup_instance.queue_segment.assert_called_once_with('GPSData', deleted=['track1.gpx'])
@@ -0,0 +1,57 @@
+import tempfile
+from math import cos, radians, sin
+import numpy as np
+from django.test import TestCase
+from unittest.mock import patch
+
+from cycle import data_version, no_go_areas
+
+
+class TestTrimRange(TestCase):
+
+    def test_unsafe_points(self):
+        lats = np.radians([50.0, 50.0, 50.0, 51.0])
+        lons = np.radians([11.0, 11.001, 11.1, 11.0])
+        # 1 km around the first point
+        nogos = [[sin(radians(50.0)), cos(radians(50.0)), radians(11.0), 1 / 6371.009]]
+
+        unsafe = no_go_areas.unsafe_points(np.sin(lats), np.cos(lats), lons, np.array(nogos))
+
+        np.testing.assert_array_equal([True, True, False, False], unsafe)
+
+    def test_no_areas(self):
+        unsafe = no_go_areas.unsafe_points(np.zeros(3), np.ones(3), np.zeros(3), np.array([]))
+
+        np.testing.assert_array_equal([False, False, False], unsafe)
+
+    def test_trim_windows(self):
+        unsafe = np.zeros(95, dtype=bool)
+        unsafe[[0, 12, 60, 94]] = True
+
+        # The first two windows and the last window (85 to 94) are removed
+        self.assertEqual((20, 85), no_go_areas.trim_range(unsafe))
+
+    def test_trim_all(self):
+        self.assertEqual((25, 25), no_go_areas.trim_range(np.ones(25, dtype=bool)))
+
+    def test_trim_last_window_aligned(self):
+        unsafe = np.zeros(25, dtype=bool)
+        unsafe[:12] = True
+
+        # Windows 0-9, 10-19 and 15-24: the second window is removed, the last (overlapping) window kept
+        self.assertEqual((20, 25), no_go_areas.trim_range(unsafe))
+
+
+class TestDataVersion(TestCase):
+
+    def test_bump(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, patch('cycle.data_version.DATA_VERSION_FOLDER', tmp_dir):
+            self.assertEqual(0, data_version.get('NoGoAreas'))
+
+            data_version.bump('NoGoAreas')
+            first = data_version.get('NoGoAreas')
+            data_version.bump('NoGoAreas')
+
+            self.assertLess(0, first)
+            self.assertLess(first, data_version.get('NoGoAreas'))
+            self.assertEqual((data_version.get('NoGoAreas'), 0), data_version.get_all('NoGoAreas', 'GPSData'))
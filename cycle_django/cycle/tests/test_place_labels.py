@@ -0,0 +1,63 @@
+import numpy as np
+import pandas
+from django.test import TestCase
+
+from cycle import place_labels
+
+
+def frame(latitudes, longitudes):
+    df = pandas.DataFrame({'Latitudes_deg': latitudes, 'Longitudes_deg': longitudes})
+    df['Longitudes_rad'] = np.radians(df['Longitudes_deg'])
+    df['sin_lat'] = np.sin(np.radians(df['Latitudes_deg']))
+    df['cos_lat'] = np.cos(np.radians(df['Latitudes_deg']))
+    return df
+
+
+def places_frame(latitudes, longitudes, radii):
+    df = frame(latitudes, longitudes)
+    df['radius'] = radii
+    radius_deg = df['radius'] / (place_labels.EARTH_RADIUS * np.radians(1))
+    df['lat_min'] = df['Latitudes_deg'] - radius_deg
+    df['lat_max'] = df['Latitudes_deg'] + radius_deg
+    df['lon_min'] = df['Longitudes_deg'] - radius_deg / df['cos_lat']
+    df['lon_max'] = df['Longitudes_deg'] + radius_deg / df['cos_lat']
+    return df
+
+
+class TestPlaceLabels(TestCase):
+
+    def test_nearest_places(self):
+        rng = np.random.default_rng(1)
+        points = frame(50 + rng.random(500), 11 + rng.random(500))
+        places = places_frame(50 + rng.random(300), 11 + rng.random(300), rng.uniform(0.5, 10, 300))
+
+        place_index, separation = place_labels.nearest_places(points, places)
+
+        # Compare with all points and places
+        angles = np.arccos(
+            points['sin_lat'].to_numpy()[:, None] * places['sin_lat'].to_numpy()[None, :] +
+            points['cos_lat'].to_numpy()[:, None] * places['cos_lat'].to_numpy()[None, :] *
+            np.cos(points['Longitudes_rad'].to_numpy()[:, None] - places['Longitudes_rad'].to_numpy()[None, :])
+        )
+        lats, lons = points['Latitudes_deg'].to_numpy()[:, None], points['Longitudes_deg'].to_numpy()[:, None]
+        inside = ((angles < places['radius'].to_numpy() / place_labels.EARTH_RADIUS) &
+                  (places['lat_min'].to_numpy() < lats) & (lats < places['lat_max'].to_numpy()) &
+                  (places['lon_min'].to_numpy() < lons) & (lons < places['lon_max'].to_numpy()))
+        angles[~inside] = np.inf
+        has_place = inside.any(axis=1)
+        self.assertTrue(has_place.any() and not has_place.all())
+        np.testing.assert_array_equal(np.where(has_place, np.argmin(angles, axis=1), -1), place_index)
+        np.testing.assert_array_equal(np.where(has_place, np.min(angles, axis=1), np.nan), separation)
+
+    def test_no_places(self):
+        place_index, separation = place_labels.nearest_places(frame([50.], [11.]), places_frame([], [], []))
+
+        np.testing.assert_array_equal([-1], place_index)
+        self.assertTrue(np.isnan(separation[0]))
+
+    def test_select_labels(self):
+        positions = np.arange(10.)
+        separation = np.array([np.nan, 0.5, 0.1, 0.3, np.nan, 0.2, 0.6, 0.05, 0.4, 0.4])
+
+        # The closest first, skipping the ones less than 2 away from a selected one
+        self.assertEqual([7, 2, 5, 9], place_labels.select_labels(positions, separation, 2))
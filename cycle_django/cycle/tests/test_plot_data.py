@@ -0,0 +1,47 @@
+import base64
+import json
+import os
+import tempfile
+
+import numpy as np
+import plotly.graph_objects as go
+from django.test import TestCase, override_settings
+
+from cycle import plot_data
+from cycle.background import BackgroundThread
+
+
+def decode(array: dict) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(array['bdata']), dtype='<' + array['dtype'])
+
+
+class TestPlotData(TestCase):
+
+    def test_typed_array(self):
+        self.assertEqual('i4', plot_data.typed_array(np.array([1, -2], dtype=np.int64))['dtype'])
+        self.assertEqual('f8', plot_data.typed_array(np.array([1, 2 ** 40], dtype=np.int64))['dtype'])
+        np.testing.assert_array_equal([2 ** 40, 1], decode(plot_data.typed_array(np.array([2 ** 40, 1]))))
+        np.testing.assert_array_equal([0.5, np.nan], decode(plot_data.typed_array(np.array([0.5, np.nan]))))
+
+    def test_figure_json(self):
+        fig = go.Figure(go.Scatter(x=np.arange(3), y=np.array([1.5, 2, 3]), text=['<b>a', 'b', 'c']))
+
+        figure = json.loads(plot_data.figure_json(fig))
+
+        np.testing.assert_array_equal([0, 1, 2], decode(figure['data'][0]['x']))
+        np.testing.assert_array_equal([1.5, 2, 3], decode(figure['data'][0]['y']))
+        self.assertEqual(['<b>a', 'b', 'c'], figure['data'][0]['text'])
+        self.assertNotIn('<', plot_data.figure_json(fig))
+
+    def test_link_plotly_js(self):
+        with tempfile.TemporaryDirectory() as static_folder, \
+                override_settings(DEBUG=True, STATICFILES_DIRS=[static_folder]):
+            link = os.path.join(static_folder, plot_data.PLOTLY_JS)
+            os.makedirs(os.path.dirname(link))
+            for stale_target in [os.path.join(static_folder, 'missing.js'), plot_data.PLOTLY_JS_SOURCE + '.old']:
+                os.symlink(stale_target, link)
+
+                BackgroundThread.link_plotly_js()
+
+                self.assertEqual(plot_data.PLOTLY_JS_SOURCE, os.readlink(link))
+                os.remove(link)
@@ -0,0 +1,58 @@
+import numpy as np
+from django.test import TestCase
+
+from cycle import records
+
+
+def dates(*days):
+    return np.datetime64('2020-01-01') + np.array(days)
+
+
+class TestRecords(TestCase):
+
+    def test_select_records(self):
+        starts = np.array([0, 1, 2, 5, 8, 9])
+        ends = np.array([1, 2, 3, 6, 9, 10])
+        values = np.array([5., 9., 4., 9., 1., 2.])
+
+        # The earlier of the same values first, overlapping windows are skipped
+        self.assertEqual([1, 3, 5], records.select_records(starts, ends, values, count=4))
+        self.assertEqual([1], records.select_records(starts, ends, values, count=1))
+        self.assertEqual([], records.select_records(starts[:0], ends[:0], values[:0]))
+
+    def test_many_overlapping(self):
+        ends = np.arange(1000)
+        values = np.linspace(1, 2, 1000)
+
+        # The largest 40 windows all overlap with the first one
+        self.assertEqual([999, 949, 899], records.select_records(ends - 49, ends, values, count=3))
+
+    def test_daily_totals(self):
+        totals = records.DailyTotals(dates(0, 3, 3, 4, 10), {'distance': np.array([7., 1., 2., 4., 5.])})
+
+        self.assertEqual(
+            [{'start': '2020-01-01', 'end': '2020-01-01', 'distance': 7.},
+             {'start': '2020-01-04', 'end': '2020-01-05', 'distance': 7.},
+             {'start': '2020-01-11', 'end': '2020-01-11', 'distance': 5.}],
+            totals.records('distance', 2)
+        )
+        # The window starts at its first ride
+        self.assertEqual(
+            [{'start': '2020-01-01', 'end': '2020-01-05', 'distance': 14.},
+             {'start': '2020-01-11', 'end': '2020-01-11', 'distance': 5.}],
+            totals.records('distance', 6)
+        )
+        self.assertEqual(
+            [{'start': '2020-01-05', 'end': '2020-01-11', 'distance': 9.}],
+            totals.records('distance', 10, since=np.datetime64('2020-01-05'), count=1)
+        )
+
+    def test_dist_time_per_days(self):
+        durations = np.array([3600, 1800], dtype='timedelta64[s]')
+        result = records.dist_time_per_days(
+            np.array(['2006-12-01', '2006-12-02'], dtype='datetime64[D]'), np.array([20., 10.]), durations
+        )
+
+        # Only daily data for the short windows
+        self.assertEqual(records.WINDOW_DAYS[7:], [entry['days'] for entry in result])
+        self.assertEqual([{'start': '2006-12-01', 'end': '2006-12-02', 'duration': 5400.}], result[0]['duration'])
@@ -0,0 +1,61 @@
+import numpy as np
+from django.test import TestCase
+
+from cycle import simplify
+
+
+class TestSimplify(TestCase):
+
+    def setUp(self) -> None:
+        # Straight east, then a corner of 0.1 degrees to the north
+        self.lats = np.concatenate((np.full(50, 50.0), 50.0 + np.arange(1, 51) * 0.002))
+        self.lons = np.concatenate((11.0 + np.arange(50) * 0.002, np.full(50, 11.098)))
+
+    def test_level_for_zoom(self):
+        self.assertEqual(0, simplify.level_for_zoom(3))
+        self.assertEqual(1, simplify.level_for_zoom(simplify.LEVEL_ZOOMS[1]))
+        self.assertEqual(2, simplify.level_for_zoom(simplify.LEVEL_ZOOMS[1] + 1))
+        self.assertEqual(simplify.FULL_DETAIL, simplify.level_for_zoom(18))
+
+    def test_point_levels(self):
+        levels = simplify.point_levels(self.lats, self.lons)
+
+        # Only the ends and the corner are needed
+        self.assertEqual([0, 49, 99], list(np.flatnonzero(levels < simplify.FULL_DETAIL)))
+        self.assertEqual(0, levels[49])
+
+    def test_point_levels_noise(self):
+        # A small detour is only shown when zooming in
+        self.lats[20] += 0.0005
+
+        levels = simplify.point_levels(self.lats, self.lons)
+
+        self.assertEqual(2, levels[20])
+
+    def test_pack_unpack(self):
+        levels = simplify.point_levels(self.lats, self.lons)
+
+        np.testing.assert_array_equal(levels, simplify.unpack_levels(simplify.pack_levels(levels)))
+
+    def test_select_points(self):
+        levels = simplify.point_levels(self.lats, self.lons)
+
+        np.testing.assert_array_equal([0, 49, 99], simplify.select_points(levels, 0))
+        np.testing.assert_array_equal([10, 49, 89], simplify.select_points(levels, 0, 10, 90))
+        self.assertEqual(100, simplify.select_points(levels, simplify.FULL_DETAIL).shape[0])
+
+    def test_split_in_bounds(self):
+        indexes = np.arange(100)
+
+        parts = simplify.split_in_bounds(indexes, self.lats, self.lons, [49.9, 10.9, 50.01, 11.01])
+
+        # The first points and the one just outside
+        self.assertEqual(1, len(parts))
+        np.testing.assert_array_equal(np.arange(7), parts[0])
+
+    def test_split_in_bounds_crossing_line(self):
+        # Only the corner and the ends: the line to the corner crosses the bounds
+        parts = simplify.split_in_bounds(np.array([0, 49, 99]), self.lats, self.lons, [49.99, 11.04, 50.01, 11.06])
+
+        self.assertEqual(1, len(parts))
+        np.testing.assert_array_equal([0, 49], parts[0])
@@ -0,0 +1,53 @@
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+
+from cycle.figure_cache import figure_cache
+from cycle.models import Bicycles, CycleRides, CycleWeeklySummary
+from cycle.site_statistics import site_statistics
+
+
+class TestSiteStatistics(TestCase):
+
+    def setUp(self) -> None:
+        figure_cache.clear()
+        self.bicycle = Bicycles.objects.bulk_create([Bicycles(description='a')])[0]
+
+    def add_ride(self, date):
+        duration = datetime.timedelta(hours=1)
+        CycleRides(
+            date=date, distance=20, duration=duration, totaldistance=20, totalduration=duration, bicycle=self.bicycle
+        ).save(run_backup=False)
+
+    def test_no_rides(self):
+        statistics = site_statistics()
+
+        self.assertIsNone(statistics['start_date'])
+        self.assertEqual(0, statistics['number_of_days'])
+
+    def test_cached_until_data_changes(self):
+        self.add_ride(datetime.date(2020, 1, 2))
+        self.add_ride(datetime.date(2020, 1, 1))
+        with self.assertNumQueries(1):
+            statistics = site_statistics()
+        with self.assertNumQueries(0):
+            self.assertEqual(statistics, site_statistics())
+
+        self.assertEqual(datetime.date(2020, 1, 1), statistics['start_date'])
+        self.assertEqual(datetime.date(2020, 1, 2), statistics['end_date'])
+        self.assertEqual(2, statistics['number_of_days'])
+        self.assertEqual(CycleWeeklySummary.objects.count(), statistics['number_of_weeks'])
+        self.assertEqual(0, statistics['number_of_gps_files'])
+
+        self.add_ride(datetime.date(2020, 2, 1))
+        self.assertEqual(3, site_statistics()['number_of_days'])
+
+    def test_index(self):
+        self.add_ride(datetime.date(2020, 1, 1))
+        site_statistics()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+
+        self.assertEqual('2020-01-01', response.context['start_date'])
+        self.assertEqual(1, response.context['number_of_days'])
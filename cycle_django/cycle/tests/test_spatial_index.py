@@ -0,0 +1,93 @@
+import datetime
+import os
+import tempfile
+import numpy as np
+from unittest.mock import patch
+from django.test import TestCase
+
+from cycle import gps_track, spatial_index
+from cycle.models import GeoLocateData, GPSData, PhotoData
+from cycle.spatial_index import spatial_index as index
+
+
+def create_track(filename, lats, lons):
+    times = 1600000000 + np.arange(lats.shape[0])
+    start = datetime.datetime.fromtimestamp(int(times[0]), datetime.timezone.utc)
+    end = datetime.datetime.fromtimestamp(int(times[-1]), datetime.timezone.utc)
+    obj = GPSData(filename=filename, start=start, end=end, track=gps_track.pack_track(times, lats, lons, times * 0))
+    obj.save(run_backup=False)
+    return obj
+
+
+class TestSpatialIndex(TestCase):
+
+    def setUp(self) -> None:
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for item in [
+            patch('cycle.models.backup_instance'),
+            patch('cycle.data_version.DATA_VERSION_FOLDER', os.path.join(folder.name, 'versions')),
+        ]:
+            item.start()
+            self.addCleanup(item.stop)
+        # An L-shaped track: 250 points north, then 250 points east
+        self.lats = np.concatenate((50.0 + np.arange(250) * 1E-3, np.full(250, 50.249)))
+        self.lons = np.concatenate((np.full(250, 11.0), 11.0 + np.arange(1, 251) * 1E-3))
+        create_track('corner.gpx', self.lats, self.lons)
+        # As the background thread does
+        index.sync()
+
+    def test_segment_boxes(self):
+        boxes = spatial_index.segment_boxes(self.lats, self.lons)
+
+        self.assertEqual(5, boxes.shape[0])
+        # The segments include the first point of the next one
+        np.testing.assert_allclose([50.0, 50.1, 11.0, 11.0], boxes[0])
+        np.testing.assert_allclose([50.249, 50.249, 11.151, 11.25], boxes[-1])
+
+    def test_tracks_in_bounds(self):
+        self.assertEqual({'corner.gpx'}, index.tracks_in_bounds([50.1, 10.9, 50.2, 11.1]))
+        # Within the bounding box of the whole track, but not close to any segment
+        self.assertEqual(set(), index.tracks_in_bounds([50.05, 11.1, 50.15, 11.2]))
+
+    def test_changed_tracks(self):
+        create_track('corner.gpx', self.lats + 1, self.lons)
+        create_track('other.gpx', self.lats, self.lons)
+        index.sync()
+
+        self.assertEqual({'other.gpx'}, index.tracks_in_bounds([50.1, 10.9, 50.2, 11.1]))
+
+        GPSData.objects.filter(filename='other.gpx').delete()
+        index.sync()
+
+        self.assertEqual(set(), index.tracks_in_bounds([50.1, 10.9, 50.2, 11.1]))
+        self.assertEqual({'corner.gpx'}, index.tracks_in_bounds([51.1, 10.9, 51.2, 11.1]))
+
+    def test_photos_and_places(self):
+        PhotoData(filename='a.jpg', description='', latitude=50.1, longitude=11.0, thumbnail=b'').save(run_backup=False)
+        place = GeoLocateData(name='Town', latitude=50.3, longitude=11.0, radius=2)
+        place.save(run_backup=False)
+        index.sync()
+
+        self.assertEqual({'a.jpg'}, index.photos_in_bounds([50.0, 10.9, 50.2, 11.1]))
+        # The circle of about 0.018 degrees
+        self.assertEqual({place.pk}, index.places_in_bounds([50.0, 10.9, 50.29, 11.1]))
+        self.assertEqual(set(), index.places_in_bounds([50.0, 10.9, 50.28, 11.1]))
+
+        place.delete()
+        index.sync()
+
+        self.assertEqual(set(), index.places_in_bounds([50.0, 10.9, 50.29, 11.1]))
+
+    def test_requests_only_read(self):
+        versions = index.indexed_versions()
+        create_track('other.gpx', self.lats, self.lons)
+
+        with self.assertNumQueries(1):
+            self.assertEqual({'corner.gpx'}, index.tracks_in_bounds([50.1, 10.9, 50.2, 11.1]))
+        self.assertEqual(versions, index.indexed_versions())
+
+        index.sync()
+
+        self.assertEqual({'corner.gpx', 'other.gpx'}, index.tracks_in_bounds([50.1, 10.9, 50.2, 11.1]))
+        self.assertNotEqual(versions, index.indexed_versions())
@@ -0,0 +1,78 @@
+import numpy as np
+from django.test import TestCase
+
+from cycle import track_metrics
+
+
+class TestTrackMetrics(TestCase):
+
+    def setUp(self) -> None:
+        # 60 points, one per second, going north by about 11 m per point and up by 1 m per point
+        self.times = 1600000000 + np.arange(60)
+        self.track = {
+            'Times': self.times,
+            'Latitudes_deg': 50.0 + np.arange(60) * 1E-4,
+            'Longitudes_deg': np.full(60, 11.0),
+            'Altitudes': 100 + np.arange(60),
+            'Altitudes_srtm': np.zeros(60, dtype=int),
+        }
+
+    def calculate(self):
+        df = track_metrics.points_frame(self.track, 1)
+        metrics = track_metrics.calculate_metrics(df, 1)
+        return df, metrics
+
+    def test_pause(self):
+        self.times[31:] += 100
+
+        df, metrics = self.calculate()
+
+        np.testing.assert_array_equal([31], np.flatnonzero(np.isnan(metrics['Duration'])))
+        np.testing.assert_array_equal([31], np.flatnonzero(np.isnan(metrics['Distance'])))
+        self.assertAlmostEqual(11.1195 / 1000 * 3600, metrics['Speed_5'][20], places=1)
+        totals = track_metrics.summarise(df, metrics)
+        self.assertEqual(58, totals['duration'])
+        self.assertEqual(59, totals['number_moving'])
+        self.assertAlmostEqual(58 * 0.0111195, totals['distance'], places=4)
+        self.assertEqual(50.0, totals['lat_min'])
+
+    def test_pause_close_to_the_end(self):
+        self.times[56:] += 100
+
+        _, metrics = self.calculate()
+
+        np.testing.assert_array_equal(np.arange(56, 60), np.flatnonzero(np.isnan(metrics['Duration'])))
+
+    def test_climbing(self):
+        df, metrics = self.calculate()
+
+        totals = track_metrics.summarise(df, metrics)
+
+        # The rolling median over 5 points starts at the fifth point
+        self.assertEqual(55, totals['climb_up'])
+        self.assertEqual(0, totals['climb_down'])
+
+    def test_pack_unpack(self):
+        _, metrics = self.calculate()
+
+        unpacked = track_metrics.unpack_metrics(track_metrics.pack_metrics(metrics))
+
+        self.assertEqual(set(track_metrics.METRIC_COLUMNS), set(unpacked))
+        for column in track_metrics.METRIC_COLUMNS:
+            np.testing.assert_array_equal(metrics[column], unpacked[column])
+
+    def test_select_points(self):
+        self.times[31:] += 100
+        _, metrics = self.calculate()
+
+        selected = track_metrics.select_points(metrics, 0, 60, 1)
+        for column in track_metrics.METRIC_COLUMNS:
+            np.testing.assert_array_equal(metrics[column], selected[column])
+
+        # Points 10, 13, ..., 58, summed over the 3 steps before each, the pause is in the step to point 31
+        selected = track_metrics.select_points(metrics, 10, 59, 3)
+        self.assertEqual(17, selected['Duration'].shape[0])
+        np.testing.assert_array_equal([0, 3, 3, 3, 3, 3, 3], selected['Duration'][:7])
+        np.testing.assert_array_equal([7], np.flatnonzero(np.isnan(selected['Duration'])))
+        self.assertAlmostEqual(3 * 0.0111195, selected['Distance'][1], places=4)
+        self.assertAlmostEqual(11.1195 / 1000 * 3600, selected['Speed_5'][5], places=1)
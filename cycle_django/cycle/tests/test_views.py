@@ -0,0 +1,225 @@
+import datetime
+import json
+import os
+import tempfile
+from unittest.mock import patch
+import numpy as np
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from cycle import gps_track, no_go_areas, simplify, views
+from cycle.figure_cache import FigureCache
+from cycle.spatial_index import spatial_index
+from cycle.models import Bicycles, CycleRides, GeoLocateData, GPSData, GPSDataLevels, GPSDataMetrics, NoGoAreas
+
+
+class TestGpsPositionsView(TestCase):
+
+    def setUp(self) -> None:
+        backup = patch('cycle.models.backup_instance')
+        backup.start()
+        self.addCleanup(backup.stop)
+        # 100 points going north-east, with a corner at point 50
+        times = 1600000000 + np.arange(100)
+        lats = np.concatenate((50.0 + np.arange(50) * 1E-3, np.full(50, 50.049)))
+        lons = np.concatenate((np.full(50, 11.0), 11.0 + np.arange(1, 51) * 1E-3))
+        start = datetime.datetime.fromtimestamp(int(times[0]), datetime.timezone.utc)
+        end = datetime.datetime.fromtimestamp(int(times[-1]), datetime.timezone.utc)
+        for filename in ['track.gpx', 'other.gpx']:
+            GPSData(filename=filename, start=start, end=end, track=gps_track.pack_track(times, lats, lons, times * 0))\
+                .save(run_backup=False)
+        levels = GPSDataLevels.calculate('other.gpx', GPSData.objects.get(filename='other.gpx').track)
+        levels.lat_min, levels.lat_max = 10, 11
+        levels.save()
+
+    def request_positions(self, zoom, bounds):
+        return self.client.post(
+            reverse('gps_positions'),
+            json.dumps({'filenames': ['track.gpx', 'other.gpx'], 'zoom': zoom, 'bounds': bounds}),
+            content_type='application/json'
+        )
+
+    def test_simplified(self):
+        response = self.request_positions(8, [49, 10, 51, 12])
+
+        self.assertEqual(200, response.status_code)
+        # other.gpx is outside according to its (modified) bounding box
+        np.testing.assert_allclose([[[50.0, 11.0], [50.049, 11.0], [50.049, 11.05]]], response.json()['positions'])
+        self.assertEqual(1, response.json()['level'])
+
+    def test_full_detail_within_bounds(self):
+        response = self.request_positions(17, [50.0095, 10.9, 50.0205, 11.1])
+
+        self.assertEqual(simplify.FULL_DETAIL, response.json()['level'])
+        np.testing.assert_allclose(
+            [[50.009 + ii * 1E-3, 11.0] for ii in range(13)], response.json()['positions'][0]
+        )
+
+    def test_no_go_area(self):
+        NoGoAreas.objects.create(name='Home', latitude=50.0, longitude=11.0, radius=1)
+
+        response = self.request_positions(5, [49, 10, 51, 12])
+
+        # The first 10 points are within the no-go area
+        np.testing.assert_allclose([50.01, 11.0], response.json()['positions'][0][0])
+
+    def test_trimmed_once(self):
+        NoGoAreas.objects.create(name='Home', latitude=50.0, longitude=11.0, radius=1)
+
+        with patch('cycle.views.no_go_areas.unsafe_points', wraps=no_go_areas.unsafe_points) as _unsafe_points, \
+                patch('cycle.views.track_metrics.points_frame', side_effect=AssertionError):
+            self.request_positions(5, [49, 10, 51, 12])
+            self.request_positions(8, [49, 10, 51, 12])
+
+        _unsafe_points.assert_called_once()
+
+    def test_same_trim_as_page(self):
+        # Points 0 to 4 are within the no-go area, the page decimates more than 20 tracks
+        NoGoAreas.objects.create(name='Home', latitude=50.0, longitude=11.0, radius=0.5)
+        track = GPSData.objects.get(filename='track.gpx')
+        for ii in range(20):
+            GPSData(filename=f'track{ii:02d}.gpx', start=track.start, end=track.end, track=track.track)\
+                .save(run_backup=False)
+
+        context = views.calculate_gps_data_sets(GPSData.objects.metadata())
+        response = self.request_positions(17, [49, 10, 51, 12])
+
+        self.assertEqual(2, context['slice'])
+        np.testing.assert_allclose([50.01, 11.0], context['gps_positions'][0][0])
+        np.testing.assert_allclose([50.01, 11.0], response.json()['positions'][0][0])
+
+    def test_bad_request(self):
+        response = self.client.post(reverse('gps_positions'), '{"zoom": 3}', content_type='application/json')
+
+        self.assertEqual(400, response.status_code)
+
+
+class TestTimeLabelIndexes(TestCase):
+
+    def test_steps(self):
+        times = np.array([10., 11, 12, 15, 16, 30, 31, 45])
+
+        np.testing.assert_array_equal([0, 3, 5, 7], views.time_label_indexes(times, 4, 10))
+
+    def test_unsorted(self):
+        # A track starting before the previous one ended, like going through the points one by one
+        times = np.array([10., 20, 12, 13, 21, 30, 25, 33])
+
+        np.testing.assert_array_equal([0, 1, 5, 7], views.time_label_indexes(times, 2, 10))
+
+    def test_too_many(self):
+        self.assertIsNone(views.time_label_indexes(np.arange(100.), 1, 10))
+
+
+class TestPlotDataView(TestCase):
+
+    def test_extra_without_rides(self):
+        response = self.client.get(reverse('plot_data', args=['extra']))
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({}, response.json())
+
+
+class TestExtraPlots(TestCase):
+
+    def setUp(self) -> None:
+        bicycle = Bicycles.objects.bulk_create([Bicycles(description='a')])[0]
+        for day in range(40):
+            distance = 11.11 if day % 4 == 0 else 20 + day
+            duration = datetime.timedelta(seconds=1342 if day == 5 else 1800 + day)
+            CycleRides(
+                date=datetime.date(2020, 1, 1) + datetime.timedelta(days=day), distance=distance, duration=duration,
+                totaldistance=distance, totalduration=duration, bicycle=bicycle
+            ).save(run_backup=False)
+        self.view = views.ExtraPlots()
+        self.view.setup(RequestFactory().get('/'))
+        self.view.data_frame     # loaded before counting the queries
+
+    def test_same_numbers(self):
+        with self.assertNumQueries(1):
+            same_numbers = self.view.get_same_numbers()
+
+        entry = same_numbers['distance'][0]
+        self.assertEqual((10, 11.11), (entry['count'], entry['value']))
+        self.assertEqual(CycleRides.objects.filter(distance=11.11).order_by('date')[0], entry['cycle_obj'][0])
+
+    def test_same_digits(self):
+        with self.assertNumQueries(1):
+            same_digits = self.view.get_same_digits()
+
+        rides = CycleRides.objects.filter(distance=11.11).order_by('date')
+        self.assertEqual({11.11: list(rides)}, same_digits['distances'])
+        # 22:22
+        self.assertEqual(
+            {datetime.timedelta(seconds=1342): [CycleRides.objects.get(date='2020-01-06')]}, same_digits['times']
+        )
+
+
+class TestAnalysisCache(TestCase):
+
+    def setUp(self) -> None:
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        for item in [
+            patch.object(views, 'analysis_cache', FigureCache(folder=os.path.join(folder.name, 'cache'))),
+            patch('cycle.data_version.DATA_VERSION_FOLDER', os.path.join(folder.name, 'versions')),
+            patch('cycle.models.backup_instance'),
+        ]:
+            item.start()
+            self.addCleanup(item.stop)
+        times = 1600000000 + np.arange(100) * 5
+        lats = 50.0 + np.arange(100) * 1E-4
+        start = datetime.datetime.fromtimestamp(int(times[0]), datetime.timezone.utc)
+        end = datetime.datetime.fromtimestamp(int(times[-1]), datetime.timezone.utc)
+        GPSData(filename='track.gpx', start=start, end=end, track=gps_track.pack_track(times, lats, lats * 0 + 11,
+                                                                                      times * 0)).save(run_backup=False)
+        calculate = patch.object(views, 'calculate_gps_data_sets', wraps=views.calculate_gps_data_sets)
+        self.calculate = calculate.start()
+        self.addCleanup(calculate.stop)
+
+    def analyse(self, **kwargs):
+        return views.analyse_gps_data_sets(GPSData.objects.metadata(), **kwargs)
+
+    def test_cached(self):
+        context = self.analyse()
+        context['gpsdatarangeform'] = 'form'
+        self.assertEqual(context['gps_filenames'], self.analyse()['gps_filenames'])
+        self.assertNotIn('gpsdatarangeform', self.analyse())
+        self.assertEqual(1, self.calculate.call_count)
+        # Added for each request, not stored in the cache
+        self.assertEqual({'slice': 1}, context['settings'])
+        self.assertNotIn('settings', list(views.analysis_cache.entries.values())[0])
+
+        self.analyse(admin=True)
+        self.analyse(plot_graphs=False)
+        self.analyse(coords={'zoom': 12, 'cenLat': 50.0, 'cenLng': 11.0})
+        self.assertEqual(4, self.calculate.call_count)
+
+    def test_no_track_in_bounds(self):
+        context = self.analyse(coords={'zoom': 12, 'cenLat': 10.0, 'cenLng': 11.0})
+
+        self.assertIsNone(context['gps'])
+        self.assertEqual({'slice': 1}, context['settings'])
+
+    def test_metrics_not_stored(self):
+        stored = views.calculate_gps_data_sets(GPSData.objects.metadata())
+        GPSDataMetrics.objects.all().delete()
+
+        calculated = views.calculate_gps_data_sets(GPSData.objects.metadata())
+
+        self.assertFalse(GPSDataMetrics.objects.exists())
+        self.assertEqual(stored['individual_gps_list'], calculated['individual_gps_list'])
+        self.assertEqual(stored['plot_figure'], calculated['plot_figure'])
+
+    def test_changed_data(self):
+        self.analyse()
+        NoGoAreas(name='home', latitude=50.0, longitude=11.0, radius=0.1).save()
+        self.analyse()
+        GeoLocateData(name='place', latitude=50.0, longitude=11.0, radius=1).save(run_backup=False)
+        self.analyse()
+        # The place is only found once the background thread has updated the spatial index
+        spatial_index.sync()
+        self.analyse()
+        self.analyse()
+
+        self.assertEqual(4, self.calculate.call_count)
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import threading
+import time
+from django.test import TestCase
+from unittest.mock import patch
+
+from cycle.background import BackgroundThread
+from cycle.watcher import FileWatcher
+
+MODULE_PATH = "cycle.watcher."
+
+
+class TestFileWatcher(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.tmp_dir.name
+        os.makedirs(os.path.join(self.folder, 'sub'))
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write_files(self, watcher, names):
+        # Write the files in a different thread, while waiting for the changes
+        def write():
+            for name in names:
+                with open(os.path.join(self.folder, name), 'w') as f:
+                    f.write(name)
+        thread = threading.Timer(0.1, write)
+        thread.start()
+        changes = watcher.wait_for_changes(5)
+        thread.join()
+        return changes
+
+    def test_inotify(self):
+        watcher = FileWatcher(debounce=0.2)
+        self.assertIsNotNone(watcher.inotify)
+        watcher.watch(self.folder, 'gpx', recursive=True)
+
+        changes = self.write_files(watcher, ['a.gpx', os.path.join('sub', 'b.gpx')])
+        watcher.close()
+
+        self.assertEqual(
+            {'gpx': {os.path.join(self.folder, 'a.gpx'), os.path.join(self.folder, 'sub', 'b.gpx')}}, changes
+        )
+
+    def test_polling(self):
+        watcher = FileWatcher(poll_interval=0, debounce=0.2, use_inotify=False)
+        watcher.watch(self.folder, 'dumps')
+
+        changes = self.write_files(watcher, ['Bicycles_dump.json.gz'])
+
+        self.assertEqual({'dumps': {os.path.join(self.folder, 'Bicycles_dump.json.gz')}}, changes)
+
+    def test_same_file_written_again(self):
+        watcher = FileWatcher(debounce=0.3)
+        watcher.watch(self.folder, 'dumps')
+        last_write = []
+
+        def write():
+            # Each write is within the debounce time of the previous one
+            for i in range(5):
+                with open(os.path.join(self.folder, 'Bicycles_dump.json.gz'), 'a') as f:
+                    f.write(str(i))
+                last_write[:] = [time.time()]
+                time.sleep(0.15)
+        thread = threading.Thread(target=write)
+        thread.start()
+        changes = watcher.wait_for_changes(5)
+        reported = time.time()
+        thread.join()
+        watcher.close()
+
+        self.assertEqual({'dumps': {os.path.join(self.folder, 'Bicycles_dump.json.gz')}}, changes)
+        self.assertGreaterEqual(reported - last_write[0], 0.3)
+
+    def test_timeout(self):
+        watcher = FileWatcher(debounce=0.2)
+        watcher.watch(self.folder, 'gpx')
+
+        self.assertEqual({}, watcher.wait_for_changes(0.3))
+
+
+@patch('cycle.models.PhotoData.load_data')
+@patch('cycle.models.GPSData.import_gpx_file_to_database')
+@patch('cycle.models.CycleRides.load_data')
+@patch('cycle.models.NoGoAreas.load_data')
+@patch('cycle.models.Bicycles.load_data')
+class TestLoadChangedData(TestCase):
+
+    def test_only_changed_dump(self, _bicycles_load, _nogo_load, _rides_load, _import_gpx, _photo_load):
+        BackgroundThread.load_changed_data({'dumps': {'load_db_dump_at_startup/NoGoAreas_dump.json.gz'}})
+
+        _bicycles_load.assert_not_called()
+        _rides_load.assert_not_called()
+        _nogo_load.assert_called_once()
+        _import_gpx.assert_called_once()
+
+    def test_unknown_change_loads_all(self, _bicycles_load, _nogo_load, _rides_load, _import_gpx, _photo_load):
+        BackgroundThread.load_changed_data({'dumps': {'load_db_dump_at_startup'}})
+
+        _bicycles_load.assert_called_once()
+        _rides_load.assert_called_once()
+        _nogo_load.assert_called_once()
+
+    def test_segment_changed(self, _bicycles_load, _nogo_load, _rides_load, _import_gpx, _photo_load):
+        with patch('cycle.models.GPSData.load_data') as _gps_load:
+            BackgroundThread.load_changed_data({'dumps': {'load_db_dump_at_startup/GPSData_segments/manifest.json'}})
+
+        _gps_load.assert_called_once()
+        _nogo_load.assert_not_called()
@@ -0,0 +1,132 @@
+""" Values derived from the GPS tracks: durations and distances between the points, pauses, speeds and totals
+
+They are calculated for all points of the track and stored in GPSDataMetrics, again if the track or PARAMETERS
+change. The decimated (every slice-th point) and trimmed (see no_go_areas.py) tracks select their points from them.
+"""
+from typing import Dict, Union
+
+import numpy as np
+import pandas
+
+EARTH_RADIUS = 6371.009     # km
+WINDOW_MEDIAN_DURATION = 50
+PAUSED_AFTER = 30       # s, assume a pause if the next data point took this long to appear (times the slice)
+MIN_CONSECUTIVE_POINTS = 10     # exclude sections with breaks within this number of points
+MIN_PERIODS = 3     # to calculate rolling median/sum at least these number of datapoints should not be nans
+PARAMETERS = f"1_{WINDOW_MEDIAN_DURATION}_{PAUSED_AFTER}_{MIN_CONSECUTIVE_POINTS}_{MIN_PERIODS}"
+METRIC_COLUMNS = ('Duration', 'Distance', 'Speed_5', 'Speed_50')
+_metric_type = np.dtype('<f8')
+
+
+def points_frame(
+        track: Dict[str, np.ndarray], slice: int, begin: int = 0, end: Union[int, None] = None
+) -> pandas.DataFrame:
+    """ The points begin, begin + slice, ... before end of the track, angles also in radians """
+    points = np.s_[begin:end:slice]
+    lats = track['Latitudes_deg'][points]
+    has_srtm = track['Altitudes_srtm'] is not None
+    df = pandas.DataFrame({
+        'Times': track['Times'][points],  # e.g. 1269530756
+        'Latitudes_deg': lats,
+        'Longitudes_deg': track['Longitudes_deg'][points],
+        'Altitudes': track['Altitudes'][points] if has_srtm else np.zeros(lats.shape[0], dtype=int),
+        'Altitudes_srtm': track['Altitudes_srtm'][points] if has_srtm else np.zeros(lats.shape[0], dtype=int),
+    })
+    df['Latitudes_rad'] = np.radians(df['Latitudes_deg'])
+    df['Longitudes_rad'] = np.radians(df['Longitudes_deg'])
+    df['sin_lat'] = np.sin(df['Latitudes_rad'])
+    df['cos_lat'] = np.cos(df['Latitudes_rad'])
+    return df
+
+
+def calculate_metrics(df: pandas.DataFrame, slice: int) -> Dict[str, np.ndarray]:
+    """ Duration [s] and Distance [km] to the previous point, which are nan during and around pauses, and the
+    speeds [km/h] over 5 and 50 points
+    """
+    number_points = df.shape[0]
+    times = df['Times'].to_numpy(dtype=np.float64)
+    sin_lats = df['sin_lat'].to_numpy()
+    cos_lats = df['cos_lat'].to_numpy()
+    lons = df['Longitudes_rad'].to_numpy()
+
+    duration = np.zeros(number_points)
+    duration[1:] = times[1:] - times[:-1]
+    # Exclude datapoints after/during a stop
+    duration[duration > PAUSED_AFTER * slice] = np.nan
+    duration_rolling_median = pandas.Series(duration).rolling(
+        window=WINDOW_MEDIAN_DURATION, min_periods=int(0.1 * WINDOW_MEDIAN_DURATION)
+    ).median().to_numpy()
+    with np.errstate(invalid='ignore'):
+        duration[duration > 3 * duration_rolling_median] = np.nan
+    duration_is_nan = np.flatnonzero(np.isnan(duration))
+    if duration_is_nan.shape[0] >= 1:
+        if duration_is_nan[0] <= MIN_CONSECUTIVE_POINTS:
+            duration[0:duration_is_nan[0]] = np.nan
+        if duration_is_nan[-1] >= number_points - MIN_CONSECUTIVE_POINTS:
+            duration[duration_is_nan[-1]:] = np.nan
+        # Indexes, where gap between spaces <= MIN_CONSECUTIVE_POINTS:
+        space_nan = np.flatnonzero(duration_is_nan[1:] - duration_is_nan[:-1] <= MIN_CONSECUTIVE_POINTS)
+        for index in space_nan:
+            duration[duration_is_nan[index]:duration_is_nan[index + 1]] = np.nan
+
+    distance = np.zeros(number_points)
+    with np.errstate(invalid='ignore'):
+        distance[1:] = np.arccos(
+            sin_lats[:-1] * sin_lats[1:] + cos_lats[:-1] * cos_lats[1:] * np.cos(lons[:-1] - lons[1:])
+        ) * EARTH_RADIUS
+    distance[np.isnan(duration)] = np.nan
+
+    return add_speeds({'Duration': duration, 'Distance': distance})
+
+
+def add_speeds(metrics: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """ The speeds [km/h] over 5 and 50 points, added to the metrics """
+    duration_series = pandas.Series(metrics['Duration'])
+    distance_series = pandas.Series(metrics['Distance'])
+    for window in (5, 50):
+        duration_rolling_sum = duration_series.rolling(window=window, min_periods=MIN_PERIODS).sum().to_numpy()
+        distance_rolling_sum = distance_series.rolling(window=window, min_periods=MIN_PERIODS).sum().to_numpy()
+        metrics[f'Speed_{window}'] = distance_rolling_sum / duration_rolling_sum * 3600
+    return metrics
+
+
+def select_points(metrics: Dict[str, np.ndarray], begin: int, end: int, slice: int) -> Dict[str, np.ndarray]:
+    """ The metrics of the points begin, begin + slice, ... before end, from the metrics of all points: durations and
+    distances are summed since the previous of these points (nan if the track paused in between), the first point
+    has none. The speeds are over 5 and 50 of these points.
+    """
+    last = begin + (end - 1 - begin) // slice * slice
+    selected = {}
+    for column in ('Duration', 'Distance'):
+        values = metrics[column]
+        steps = np.add.reduceat(values[begin + 1:last + 1], np.arange(0, last - begin, slice)) if last > begin else []
+        selected[column] = np.concatenate(([np.nan if np.isnan(values[begin]) else 0.], steps))
+    return add_speeds(selected)
+
+
+def summarise(df: pandas.DataFrame, metrics: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """ Totals of the moving parts of the track """
+    moving = ~np.isnan(metrics['Duration'])
+    totals = {
+        'distance': float(np.nansum(metrics['Distance'])),
+        'duration': float(np.nansum(metrics['Duration'])),
+        'number_moving': int(moving.sum()),
+    }
+    altitudes = df['Altitudes'].to_numpy(dtype=np.float64)[moving]
+    altitude_diff = np.diff(pandas.Series(altitudes).rolling(window=5).median().to_numpy())
+    totals['climb_up'] = float(altitude_diff[altitude_diff > 0].sum())
+    totals['climb_down'] = float(altitude_diff[altitude_diff < 0].sum())
+    for name, column in (('lat', 'Latitudes_deg'), ('lon', 'Longitudes_deg')):
+        values = df[column].to_numpy()[moving]
+        totals[f'{name}_min'] = float(values.min()) if values.shape[0] else None
+        totals[f'{name}_max'] = float(values.max()) if values.shape[0] else None
+    return totals
+
+
+def pack_metrics(metrics: Dict[str, np.ndarray]) -> bytes:
+    return b''.join(metrics[column].astype(_metric_type).tobytes() for column in METRIC_COLUMNS)
+
+
+def unpack_metrics(data: bytes) -> Dict[str, np.ndarray]:
+    columns = np.frombuffer(data, dtype=_metric_type).reshape(len(METRIC_COLUMNS), -1)
+    return {column: columns[ii] for ii, column in enumerate(METRIC_COLUMNS)}
@@ -9,9 +9,11 @@ urlpatterns = [
     path('cycle_datam', views.DataMListView.as_view(), name='cycle_data_m'),
     path('cycle_datay', views.DataYListView.as_view(), name='cycle_data_y'),
     path('gps_data', views.GPSDataListView.as_view(), name='gps_data'),
+    path('plot_data/<str:name>', views.plot_data_view, name='plot_data'),  # figures of the list views, as JSON
     path('cycle_data/<int:entryid>', views.data_detail_view, name='cycle-detail'),
     path('gps_data/<str:filename>', views.gps_detail_view, name='gps_detail'),
     path('gps_data/all', views.gps_detail_view, name='gps_detail_all'),  # show all gps tracks
+    path('gps_positions', views.gps_positions_view, name='gps_positions'),  # tracks for the map, as JSON
     path('add_new_places', views.add_places_admin_view, name='add_places_admin'),
     path('thumbnail/<str:filename>/', views.thumbnail_view, name='thumbnail'),
     re_path(r'^cycle_data/(?P<date_wmy>[w,m,y]\d{4}-\d{2}-\d{2})/$', views.data_detail_view, name='cycle-detail'),
@@ -1,55 +1,59 @@
-import abc
 import copy
 import datetime
+import hashlib
+import json
 from math import log10, radians, sin, cos, acos
 import numpy as np
 import os
 import pandas
-from plotly.offline import plot
 import plotly.express as px
 import plotly.graph_objects as go
-from typing import Dict, List, Union
+from typing import Dict, List, Tuple, Union
 
 from django.shortcuts import get_object_or_404, render, redirect
 from django.conf import settings
-from django.core import serializers
-from django.db.models import Avg, Max, Min, Sum
-from django.http import HttpResponse
+from django.db.models import Avg, Max, Min, QuerySet, Sum
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag, urlencode
 from django.views import generic
+from django.views.decorators.http import require_POST
 
 from .models import (
-    CycleRides, CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary, GPSData, NoGoAreas, GeoLocateData,
-    PhotoData
+    CycleRides, CycleWeeklySummary, CycleMonthlySummary, CycleYearlySummary, GPSData, GPSDataLevels, GPSDataMetrics,
+    NoGoAreas, GeoLocateData, PhotoData
 )
 from .forms import PlotDataForm, PlotDataFormSummary, GpsDateRangeForm
+from . import curiosity_numbers, data_version, no_go_areas, place_labels, plot_data, records, simplify, track_metrics
+from .columns import load_columns
+from .figure_cache import analysis_cache, figure_cache
+from .site_statistics import site_statistics
+from .spatial_index import spatial_index
 from my_base import Logging, create_timezone_object, photoStorage, TILES_FOLDERS
 
 logger = Logging.setup_logger(__name__)
 
 FIELDS_TO_LABELS = {"date": "Date", "distance": "Distance [km]", "duration": "Duration", "speed": "Speed [km/h]",
                     "days": "Days", "numberofdays": "Number of Days", "bicycle": "Bicycle"}
+MAX_TIME_LABELS = 1000     # more labels of the time make the elevation profile unreadable and slow
 
 
 def index(request):
     """View function for home page of site."""
 
-    # Find the minimum date:
-    start_date = CycleRides.objects.all().aggregate(Min('date'))["date__min"]
-    end_date = CycleRides.objects.all().aggregate(Max('date'))["date__max"]
-    number_of_days = CycleRides.objects.all().count()
-    number_of_weeks = CycleWeeklySummary.objects.all().count()
-    number_of_months = CycleMonthlySummary.objects.all().count()
-    number_of_years = CycleYearlySummary.objects.all().count()
-    number_of_gps_files = GPSData.objects.all().count()
+    statistics = site_statistics()
+    start_date = statistics['start_date']
+    end_date = statistics['end_date']
 
     context = {
         'start_date': start_date.strftime('%Y-%m-%d') if start_date is not None else None,
         'end_date': end_date.strftime('%Y-%m-%d') if end_date is not None else None,
-        'number_of_days': number_of_days,
-        'number_of_weeks': number_of_weeks,
-        'number_of_months': number_of_months,
-        'number_of_years': number_of_years,
-        'number_of_gps_files': number_of_gps_files
+        'number_of_days': statistics['number_of_days'],
+        'number_of_weeks': statistics['number_of_weeks'],
+        'number_of_months': statistics['number_of_months'],
+        'number_of_years': statistics['number_of_years'],
+        'number_of_gps_files': statistics['number_of_gps_files']
     }
 
     # Render the HTML template index.html with the data in the context variable
@@ -60,6 +64,8 @@ class BaseDataListView(generic.ListView):
     context_object_name = 'cycle_data_list'  # This is used as variable in cycle_data_list.html
     template_name = 'cycle_data/cycle_data_list.html'  # https://developer.mozilla.org/en-US/docs/Learn/Server-side/Django/Generic_views
     context_dataset = None
+    plot_name = None    # in the url of plot_data_view
+    data_tables: Tuple[str, ...] = ()    # the plots are cached for these versions of the data
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -90,7 +96,7 @@ class BaseDataListView(generic.ListView):
         self.request.GET = request_get
         # Create any data and add it to the context
         context['dataset'] = self.context_dataset
-        context['plot_div'] = self.create_plot()
+        context['plot_url'] = self.plot_url()
         context['sort_by'] = self.request.GET.get('sort', 'date')
 
         return context
@@ -101,32 +107,46 @@ class BaseDataListView(generic.ListView):
             self._data_frame = self.create_data_frame()
         return self._data_frame
 
-    @abc.abstractmethod
-    def add_data_serialized_models(self, serialized_models):
-        pass
+    def data_frame_fields(self, model) -> List[str]:
+        return [field.name for field in model._meta.concrete_fields if not field.primary_key]
 
     def create_data_frame(self):
         queryset = self.get_queryset()
+        data_frame = load_columns(queryset, self.data_frame_fields(queryset.model))
 
-        if queryset.exists():
-            serialized_models = serializers.serialize(format='python', queryset=queryset)
-            self.add_data_serialized_models(serialized_models)
-            serialized_objects = [s['fields'] for s in serialized_models]
-            data = [x.values() for x in serialized_objects]
-            columns = serialized_objects[0].keys()
-
-            data_frame = pandas.DataFrame(data, columns=columns)
-            # Convert the duration fields from string into timedelta fields
-            columns_time = [col for col in columns if col.find("duration") != -1]
+        if len(data_frame):
+            # Keep the duration fields as timedelta and as datetime
+            columns_time = [col for col in data_frame.columns if col.find("duration") != -1]
             for col in columns_time:
-                data_frame[col + "_td"] = pandas.to_timedelta(data_frame[col])
+                data_frame[col + "_td"] = data_frame[col]
                 data_frame[col] = data_frame[col + "_td"] + pandas.to_datetime('1970/01/01')
             return data_frame[data_frame['distance'] > 0.01]
 
-    def create_plot(self):
-        x = self.request.GET.get("x_data", "date")
-        y = self.request.GET.get("y_data", "distance")
-        z = self.request.GET.get("z_data", "speed")
+    def cache_key(self, *args) -> Tuple:
+        return (self.__class__.__name__, *args, data_version.get_all(*self.data_tables))
+
+    def plot_choice(self) -> Tuple[str, str, str, str]:
+        # The order of the points depends on the sorting of the table
+        return (
+            self.request.GET.get("x_data", "date"), self.request.GET.get("y_data", "distance"),
+            self.request.GET.get("z_data", "speed"), self.request.GET.get('sort', 'date')
+        )
+
+    def plot_url(self) -> str:
+        """ The figures are loaded by the page from plot_data_view """
+        x, y, z, sort_by = self.plot_choice()
+        return reverse('plot_data', args=[self.plot_name]) + '?' + urlencode(
+            {'x_data': x, 'y_data': y, 'z_data': z, 'sort': sort_by}
+        )
+
+    def plot_cache_key(self) -> Tuple:
+        return self.cache_key('figures', *self.plot_choice())
+
+    def create_figures(self) -> Dict[str, Union[go.Figure, None]]:
+        x, y, z, _ = self.plot_choice()
+        return {'plot': self.create_scatter_plot(x, y, z)}
+
+    def create_scatter_plot(self, x: str, y: str, z: str) -> Union[go.Figure, None]:
         xl = FIELDS_TO_LABELS[x]
         yl = FIELDS_TO_LABELS[y]
         plot_args = {"x": x, "y": y, "labels": {x: xl, y: yl}}
@@ -138,13 +158,15 @@ class BaseDataListView(generic.ListView):
         if self.data_frame is not None:
             fig = px.scatter(self.data_frame, **plot_args)
             # fig.update_yaxes(autorange="reversed")
-            return plot(fig, output_type="div")
+            return fig
 
 
 class DataListView(BaseDataListView):
     # executed when server is initialised
     # model = CycleRides
     context_dataset = "day"
+    plot_name = 'day'
+    data_tables = ('CycleRides',)
     paginate_by = 200
 
     def get_queryset(self):
@@ -157,9 +179,6 @@ class DataListView(BaseDataListView):
 
         return context
 
-    def add_data_serialized_models(self, serialized_models):
-        pass
-
 
 class DataSummaryView(BaseDataListView):
 
@@ -169,15 +188,16 @@ class DataSummaryView(BaseDataListView):
 
         return context
 
-    def add_data_serialized_models(self, serialized_models):
-        # The primary key is not included in the serialized data
-        for s in serialized_models:
-            s["fields"]["date"] = s['pk']
+    def data_frame_fields(self, model) -> List[str]:
+        # The primary key is the date
+        return super().data_frame_fields(model) + ['date']
 
 
 class DataWListView(DataSummaryView):
     paginate_by = 100
     context_dataset = "week"
+    plot_name = 'week'
+    data_tables = ('CycleWeeklySummary',)
 
     def get_queryset(self):
         return self.sort_queryset(CycleWeeklySummary.objects.all())
@@ -185,6 +205,8 @@ class DataWListView(DataSummaryView):
 
 class DataMListView(DataSummaryView):
     context_dataset = "month"
+    plot_name = 'month'
+    data_tables = ('CycleMonthlySummary',)
 
     def get_queryset(self):
         return self.sort_queryset(CycleMonthlySummary.objects.all())
@@ -192,6 +214,8 @@ class DataMListView(DataSummaryView):
 
 class DataYListView(DataSummaryView):
     context_dataset = "year"
+    plot_name = 'year'
+    data_tables = ('CycleYearlySummary',)
 
     def get_queryset(self):
         return self.sort_queryset(CycleYearlySummary.objects.all())
@@ -202,191 +226,116 @@ class ExtraPlots(BaseDataListView):
     context_object_name = None
     template_name = 'cycle_data/cycle_extra_plots.html'
     context_dataset = None
+    plot_name = 'extra'
+    data_tables = ('CycleRides',)
 
     def get_queryset(self):
         # executed when the page is opened
         return CycleRides.objects.all()
 
+    def data_frame_fields(self, model) -> List[str]:
+        # To link the rides with the same numbers
+        return super().data_frame_fields(model) + ['entryid']
+
     def get_context_data(self, **kwargs):
         if self.data_frame is None:
             return {}
-        context = self.create_extra_plots()
-        data_frame = self.data_frame[['distance', 'duration_td', 'date']].copy()
-        data_frame['duration'] = data_frame['duration_td'].dt.total_seconds()
-        data_frame['Date_datetime'] = pandas.to_datetime(data_frame['date'])
-        data_frame.set_index('Date_datetime', inplace=True)
-        data_frame['Date_dt'] = pandas.to_datetime(data_frame['date'])
-
-        context['dist_per_days'] = self.get_dist_time_per_days(data_frame)
+        context = {'plot_url': self.plot_url()}
+        context['dist_per_days'] = figure_cache.get_or_calculate(
+            self.cache_key('records'), self.get_dist_time_per_days
+        )
         context['same_numbers'] = self.get_same_numbers()
         context['same_digits'] = self.get_same_digits()
 
         return context
 
-    def get_dist_time_per_days(self, data_frame):
-        dist_per_days = []
-        for days in (list(range(1, 8)) + [10, 14, 21] + list(range(30, 91, 20)) + list(range(120, 181, 30)) +
-                     [270, 365, 365 * 2, 365 * 4 + 1]):
-            result_all = {'days': days}
-            for data_source in ['distance', 'duration']:
-                if days < 10:       # needed because of no daily data before that date
-                    dist = data_frame[data_frame['Date_dt'] >= pandas.to_datetime('2006-12-06')][data_source].rolling(window=f'{days}D').sum()  # this is only consecutive days
-                else:
-                    dist = data_frame[data_source].rolling(window=f'{days}D').sum()  # this is only consecutive days
-                dist_sort = dist.sort_values(ascending=False)
-                result = []
-                diff = datetime.timedelta(days=days - 1)
-                for date, value in dist_sort.items():
-                    date_start = data_frame['Date_dt'][(data_frame['Date_dt'] >= date-diff)].min()
-                    for start, end, _ in result:
-                        if date >= start and date_start <= end:
-                            break
-                    else:
-                        result.append([date_start, date, value])
-                        if len(result) == 5:
-                            break
-                if result:
-                    result = [{'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d'), data_source: value}
-                              for start, end, value in result]
-                    result_all[data_source] = result
-            if len(result_all.keys()) > 1:
-                dist_per_days.append(result_all)
-
-        return dist_per_days
+    def get_dist_time_per_days(self):
+        return records.dist_time_per_days(
+            self.data_frame['date'].to_numpy(dtype='datetime64[D]'), self.data_frame['distance'].to_numpy(),
+            self.data_frame['duration_td'].to_numpy()
+        )
 
     def get_same_numbers(self):
         same_numbers = dict()
         for column in ['distance', 'duration_td', 'speed']:
             if column in ['distance', 'speed']:
                 # Round to 2 digits and then count same values
-                count_entries = self.data_frame[column].round(2).value_counts()
+                values = self.data_frame[column].round(2)
             else:
-                count_entries = self.data_frame[column].value_counts()
+                values = self.data_frame[column]
+            count_entries = values.value_counts()
             # counted values are sorted from highest down
             # keep the counted values that are one higher than the 20th highest
             threshold = count_entries.iloc[min(20, count_entries.count())]
             count_filtered = count_entries[count_entries > threshold]
             result = []
             for value, count in count_filtered.items():
-                if column in ['distance', 'speed']:
-                    dates = self.data_frame.loc[self.data_frame[column].round(2) == value, 'date'].sort_values().tolist()
-                else:
-                    dates = self.data_frame.loc[self.data_frame[column] == value, 'date'].sort_values().tolist()
-                result. append({
-                    'count': count, 'value': value,
-                    'cycle_obj': [CycleRides.objects.filter(date=date)[0] for date in dates]
-                })
+                rides = self.data_frame.loc[values == value, ['date', 'entryid']].sort_values('date', kind='stable')
+                result.append({'count': count, 'value': value, 'cycle_obj': rides['entryid'].tolist()})
             same_numbers[column] = result
 
+        # All the rides in one query
+        rides = CycleRides.objects.in_bulk(
+            [entryid for result in same_numbers.values() for entry in result for entryid in entry['cycle_obj']]
+        )
+        for result in same_numbers.values():
+            for entry in result:
+                entry['cycle_obj'] = [rides[entryid] for entryid in entry['cycle_obj']]
+
         return same_numbers
 
     def get_same_digits(self):
-        def convert_number_to_hms(number):
-            m, s = divmod(number, 100)
-            if m > 100:
-                h, m = divmod(m, 100)
-            else:
-                h = 0
-            if s < 60 and m < 60 and h < 24:
-                return h * 3600 + m * 60 + s
-            return None
-
-        def convert_number_to_dhm(number):
-            h, m = divmod(number, 100)
-            if h > 100:
-                d, h = divmod(h, 100)
-            else:
-                d = 0
-            if m < 60 and h < 24:
-                return (d * 24 + h) * 3600 + m * 60
-            return None
-
-        def convert_number_to_hm(number):
-            h, m = divmod(number, 100)
-            if m < 60:
-                return h * 3600 + m * 60
-            return None
-
-        def add_results(key, this_table):
-            if key not in this_table.keys():
-                this_table[key] = []
-            this_table[key].append(obj)
-
-        possible_numbers = {
-            31415, 314159, 3141592, 31415926, 314159265, 27182, 271828, 2718281, 27182818, 271828182,
-            2468, 8642, 86420, 1357, 7531, 13579, 97531
-        }
-        possible_times_s = {convert_number_to_hms(i) for i in possible_numbers}
-        possible_times_s_total = {convert_number_to_dhm(i) for i in possible_numbers}
-        possible_times_s_total.update({convert_number_to_hm(i) for i in possible_numbers})
-        """ Add all the numbers with the same digit for 4 to 7 digits: 1111 to 9999999 """
-        for i in range(1, 10):
-            number = 0
-            for repeat in range(7):
-                number += int(i * 10**repeat)
-                if repeat >= 3:
-                    possible_numbers.add(number)
-                    possible_times_s_total.add(convert_number_to_hm(number))
-        for i in range(1, 6):
-            possible_times_s.add(671 * i)        # (11 * i) * (60 + 1), e.g. 22:22
-            possible_times_s.add(4271 * i)       # (11 * i) * (60 + 1) + 3600 * i, e.g 5:55:55
-            if i <= 2:
-                possible_times_s.add(40271 * i)  # (11 * i) * (3600 + 60 + 1), e.g. 11:11:11
-                days = 0
-                for j in range(5):
-                    days += int(i * 10**j)
-                    possible_times_s_total.add(40260 * i + 86400 * days)  # (11 * i) * (60 + 3600) + 24 * 3600 * days
-        """ All the number with increasing digits 3210, 9876543, 9876 and the reverses"""
-        for i in range(7):
-            number = 0
-            for repeat in range(min(10 if i == 0 else 9, 10-i)):     # for i == 0 create a 10 digit number, as the inverse would start with a 0
-                number += int((i + repeat) * 10**repeat)
-                if repeat < 3:
-                    continue
-                possible_numbers.add(number)
-                possible_times_s.add(convert_number_to_hms(number))
-                possible_times_s_total.add(convert_number_to_dhm(number))
-                possible_times_s_total.add(convert_number_to_hm(number))
-                if i == 0 and repeat < 4:   # don't use 0123
-                    continue
-                number_r = int(str(number)[::-1])   # reverse number
-                possible_numbers.add(number_r)
-                possible_times_s.add(convert_number_to_hms(number_r))
-                possible_times_s_total.add(convert_number_to_dhm(number_r))
-                possible_times_s_total.add(convert_number_to_hm(number_r))
-        possible_numbers.update(
-            {round(0.1 * number, 1) for number in possible_numbers} |
-            {round(0.01 * number, 2) for number in possible_numbers}
-        )
-
-        distances = dict()
-        totaldistances = dict()
-        times = dict()
-        totaltimes = dict()
-        speeds = dict()
-        for obj in CycleRides.objects.all():
-            if obj.distance in possible_numbers:
-                add_results(obj.distance, distances)
-            if obj.duration.total_seconds() in possible_times_s:
-                add_results(obj.duration, times)
-            if obj.totaldistance in possible_numbers:
-                add_results(obj.totaldistance, totaldistances)
-            if obj.totalduration.total_seconds() in possible_times_s_total:
-                add_results(obj.totalduration, totaltimes)
-            obj_speed = round(obj.speed, 2)
-            if obj_speed in possible_numbers:
-                add_results(obj_speed, speeds)
-
-        same_digits = {
-            'distances': distances, 'totaldistances': totaldistances, 'times': times, 'totaltimes': totaltimes,
-            'speeds': speeds
+        # For each table: the matching rides and the number shown for a ride
+        matches = {
+            'distances': (
+                curiosity_numbers.matches(self.data_frame['distance'].to_numpy(), 'numbers'),
+                lambda obj: obj.distance
+            ),
+            'totaldistances': (
+                curiosity_numbers.matches(self.data_frame['totaldistance'].to_numpy(), 'numbers'),
+                lambda obj: obj.totaldistance
+            ),
+            'times': (
+                curiosity_numbers.matches(self.data_frame['duration_td'].dt.total_seconds().to_numpy(), 'times_s'),
+                lambda obj: obj.duration
+            ),
+            'totaltimes': (
+                curiosity_numbers.matches(
+                    self.data_frame['totalduration_td'].dt.total_seconds().to_numpy(), 'times_s_total'
+                ),
+                lambda obj: obj.totalduration
+            ),
+            'speeds': (
+                curiosity_numbers.matches(self.data_frame['speed'].round(2).to_numpy(), 'numbers'),
+                lambda obj: round(obj.speed, 2)
+            ),
         }
+        entryids = self.data_frame['entryid'].to_numpy()
+        matching = np.logical_or.reduce([matched for matched, _ in matches.values()])
+        rides = CycleRides.objects.in_bulk(entryids[matching].tolist())
+
+        same_digits = dict()
+        for name, (matched, number) in matches.items():
+            this_table = dict()
+            for entryid in entryids[matched].tolist():
+                obj = rides[entryid]
+                this_table.setdefault(number(obj), []).append(obj)
+            same_digits[name] = this_table
         return same_digits
 
-    def add_data_serialized_models(self, serialized_models):
-        pass
+    def plot_url(self) -> str:
+        return reverse('plot_data', args=[self.plot_name])
+
+    def plot_cache_key(self) -> Tuple:
+        return self.cache_key('figures')
+
+    def create_figures(self) -> Dict[str, go.Figure]:
+        if self.data_frame is None:
+            # No rides, the page has no figures either
+            return {}
+        return self.create_extra_plots()
 
-    def create_extra_plots(self) -> Dict:
+    def create_extra_plots(self) -> Dict[str, go.Figure]:
         ax = "date"
         ay1 = "totalspeed"
         ay2 = "totaldistance"
@@ -511,17 +460,42 @@ class ExtraPlots(BaseDataListView):
         )
 
         plot_dict = {
-            "plot_total_div": plot(fig_total, output_type="div"),
-            "plot_hist_dist": plot(fig_hist_dist, output_type="div"),
-            "plot_hist_dur": plot(fig_hist_dur, output_type="div"),
-            "plot_hist_speed": plot(fig_hist_spd, output_type="div"),
-            "plot_diff_div": plot(fig_diff, output_type="div"),
-            "plot_frac_div": plot(fig_frac, output_type="div"),
+            "plot_total_div": fig_total,
+            "plot_hist_dist": fig_hist_dist,
+            "plot_hist_dur": fig_hist_dur,
+            "plot_hist_speed": fig_hist_spd,
+            "plot_diff_div": fig_diff,
+            "plot_frac_div": fig_frac,
         }
 
         return plot_dict
 
 
+PLOT_VIEWS = {view.plot_name: view for view in (DataListView, DataWListView, DataMListView, DataYListView, ExtraPlots)}
+
+
+def plot_data_view(request, name: str):
+    """ The figures of the list views as compact JSON (see plot_data.py), the ETag changes with the data """
+    if name not in PLOT_VIEWS:
+        raise Http404(f"No plots for {name}")
+    view = PLOT_VIEWS[name]()
+    view.setup(request)
+    key = view.plot_cache_key()
+    etag = quote_etag(hashlib.sha1(repr((key, plot_data.PLOTLY_JS)).encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    content = figure_cache.get_or_calculate(key, lambda: "{" + ", ".join(
+        f"{json.dumps(figure_name)}: {plot_data.figure_json(fig) if fig else 'null'}"
+        for figure_name, fig in view.create_figures().items()
+    ) + "}")
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    # The browser may keep the figures, but needs to ask whether the data changed
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 def data_detail_view(request, date_wmy=None, entryid=None):
     if entryid is not None:
         cycleThisData = get_object_or_404(CycleRides, pk=entryid)
@@ -566,23 +540,131 @@ def data_detail_view(request, date_wmy=None, entryid=None):
     if 'min_max_coords' in gps_context:
         coords = gps_context['min_max_coords']
         context['photo_data'] = PhotoData.objects.filter(
-            latitude__gte=coords[0], latitude__lte=coords[1], longitude__gte=coords[2], longitude__lte=coords[3])
+            filename__in=spatial_index.photos_in_bounds([coords[0], coords[2], coords[1], coords[3]]))
 
     context['tile_dyn_range'] = get_tile_dynamic_ranges()
 
     return render(request, 'cycle_data/cycle_detail.html', context=context)
 
 
+def trimmed_range(
+        filename: str, track: Dict[str, np.ndarray], versions: Tuple[int, ...], nogos: np.ndarray
+) -> Tuple[int, int]:
+    """ Begin and end (exclusive) of the points of the whole track outside of the no-go areas, the same for the
+    decimated tracks of the page and the map. The points are only checked if the range is not cached.
+    """
+    def calculate():
+        lats = np.radians(track['Latitudes_deg'])
+        return no_go_areas.trim_range(no_go_areas.unsafe_points(
+            np.sin(lats), np.cos(lats), np.radians(track['Longitudes_deg']), nogos
+        ))
+    return no_go_areas.trim_cache.get_or_calculate((filename, versions), calculate)
+
+
+def time_label_indexes(times: np.ndarray, min_step: float, max_labels: int) -> Union[np.ndarray, None]:
+    """ Indexes of the points labelled with their time: the first point later than the previous label plus
+    min_step. None if there would be more than max_labels.
+    """
+    # The running maximum is sorted and finds the same points as the times
+    running_max = np.maximum.accumulate(times)
+    indexes = []
+    index = np.searchsorted(running_max, 0, side='right')
+    while index < running_max.shape[0]:
+        if len(indexes) == max_labels:
+            return None
+        indexes.append(index)
+        index = np.searchsorted(running_max, times[index] + min_step, side='right')
+    return np.array(indexes, dtype=int)
+
+
+def track_positions(track: Dict[str, np.ndarray], levels: np.ndarray, level: int, begin: int, end: int,
+                    bounds: Union[List[float], None] = None) -> List[List[List[float]]]:
+    """ The lines of [latitude, longitude] to show on the map """
+    lats = track['Latitudes_deg']
+    lons = track['Longitudes_deg']
+    indexes = simplify.select_points(levels, level, begin, end)
+    parts = [indexes] if bounds is None else simplify.split_in_bounds(indexes, lats, lons, bounds)
+    return [np.column_stack((lats[part], lons[part])).tolist() for part in parts]
+
+
+@require_POST
+def gps_positions_view(request):
+    """ The tracks within the bounds of the map, simplified for its zoom, requested as
+    {"filenames": [...], "zoom": 12, "bounds": [south, west, north, east]}
+    """
+    try:
+        query = json.loads(request.body)
+        filenames = [str(filename) for filename in query['filenames']]
+        zoom = int(query['zoom'])
+        south, west, north, east = [float(value) for value in query['bounds']]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected filenames, zoom and bounds'}, status=400)
+
+    # Only load the tracks that can be within the bounds
+    outside = {
+        filename for filename, lat_min, lat_max, lon_min, lon_max in GPSDataLevels.objects.filter(
+            gps_id__in=filenames
+        ).values_list('gps_id', 'lat_min', 'lat_max', 'lon_min', 'lon_max')
+        if lat_min > north or lat_max < south or lon_min > east or lon_max < west
+    }
+    gps_objs = GPSData.objects.filter(filename__in=set(filenames) - outside)
+    tracks = {obj.filename: obj for obj in gps_objs}
+    track_levels = GPSDataLevels.for_tracks({
+        filename: (obj.track, obj.track_checksum) for filename, obj in tracks.items()
+    })
+    admin = request.user.is_superuser
+    nogos = None if admin else NoGoAreas.as_vectors()
+    versions = data_version.get_all('GPSData', 'NoGoAreas')
+    level = simplify.level_for_zoom(zoom)
+    positions = []
+    for filename, obj in tracks.items():
+        track = obj.get_track()
+        begin, end = 0, track['Times'].shape[0]
+        if not admin:
+            begin, end = trimmed_range(filename, track, versions, nogos)
+        if end - begin < 10:
+            continue
+        positions.extend(track_positions(track, track_levels[filename], level, begin, end, [south, west, north, east]))
+    return JsonResponse({'positions': positions, 'level': level})
+
+
 def analyse_gps_data_sets(
         objs_in: List[GPSData],
         coords: Union[None, Dict] = None,
         plot_graphs: bool = True,
         admin: bool = False
 ) -> Dict:
-    """ Be careful to apply sin/cos only on radians!
+    """ The result is kept in the analysis cache until the tracks, no-go areas or places change, or the spatial
+    index has caught up with a change
     """
     if not objs_in:
         return {}
+    # The order of the tracks matters for the elevation profile
+    filenames = tuple(obj.filename for obj in objs_in)
+    key = (
+        'analysis', filenames, tuple(sorted(coords.items())) if coords else None, admin, plot_graphs,
+        data_version.get_all('GPSData', 'NoGoAreas', 'GeoLocateData'), spatial_index.indexed_versions()
+    )
+    # A copy, the views add to the context
+    context = dict(analysis_cache.get_or_calculate(
+        key, lambda: calculate_gps_data_sets(objs_in, coords, plot_graphs, admin)
+    ))
+    # Like the forms, the settings of the page are not part of the cached result
+    context['settings'] = {'slice': context.pop('slice')}
+    return context
+
+
+def calculate_gps_data_sets(
+        objs_in: List[GPSData],
+        coords: Union[None, Dict] = None,
+        plot_graphs: bool = True,
+        admin: bool = False
+) -> Dict:
+    """ Be careful to apply sin/cos only on radians!
+    """
+    if isinstance(objs_in, QuerySet):
+        # The views only select the metadata, load the tracks with a single query
+        objs_in = objs_in.defer(None)
 
     if coords:
         # This won't work for +/- 180 deg longitude
@@ -592,68 +674,50 @@ def analyse_gps_data_sets(
         lat_max = coords['cenLat'] + delta_lat
         lon_min = coords['cenLng'] - delta_lon
         lon_max = coords['cenLng'] + delta_lon
+        # Only load the tracks that pass through the shown area
+        in_bounds = spatial_index.tracks_in_bounds([lat_min, lon_min, lat_max, lon_max])
+        if isinstance(objs_in, QuerySet):
+            objs_in = objs_in.filter(filename__in=in_bounds)
+        else:
+            objs_in = [obj for obj in objs_in if obj.filename in in_bounds]
 
     objs = []
+    objs_in_tracks = []
+    filenames = []
+    checksums = []
     individual_gps_list = []
+    tracks_bounds = [np.inf, np.inf, -np.inf, -np.inf]    # south, west, north, east
     for obj in objs_in:
-        lats = np.array(obj.latitudes[1:-1].split(", "), dtype=np.float64)  # degrees
-        lons = np.array(obj.longitudes[1:-1].split(", "), dtype=np.float64)  # degrees
-        # This won't work for +/- 180 deg longitude
-        if coords and not (np.max(lats) > lat_min and np.min(lats) < lat_max and
-                           np.max(lons) > lon_min and np.min(lons) < lon_max):
-            continue
-        objs.append({
-            'Times': np.array(obj.datetimes[1:-1].split(", "), dtype=int),  # e.g. 1269530756
-            'Latitudes_deg': lats,
-            'Longitudes_deg': lons,
-            'Altitudes': np.array(obj.altitudes[1:-1].split(", ") if len(obj.alt_srtm[1:-1]) else lats * 0, dtype=int),
-            'Altitudes_srtm':
-                np.array(obj.alt_srtm[1:-1].split(", ") if len(obj.alt_srtm[1:-1]) else lats * 0, dtype=int),
-        })
+        track = obj.get_track()
+        lats = track['Latitudes_deg']  # degrees
+        lons = track['Longitudes_deg']  # degrees
+        if lats.shape[0]:
+            tracks_bounds = [min(tracks_bounds[0], np.min(lats)), min(tracks_bounds[1], np.min(lons)),
+                             max(tracks_bounds[2], np.max(lats)), max(tracks_bounds[3], np.max(lons))]
+        objs.append(track)
+        objs_in_tracks.append(obj.track)
+        filenames.append(obj.filename)
+        checksums.append(obj.track_checksum)
         individual_gps_list.append({'url': obj.get_absolute_url(), 'start': obj.start, 'end': obj.end})
 
-    def check_no_go(nogos, df: pandas.DataFrame, position: str):
-        steps = 10
-        if position == 'begin':
-            my_range = list(range(0, df.shape[0], steps))
-            my_range[-1] = df.shape[0] - steps
-        elif position == 'end':
-            my_range = list(range(df.shape[0] - steps, steps, -steps))
-            if len(my_range) > 0:
-                my_range[-1] = 0
-        else:
-            raise TypeError(f"Coding error: position {position} is not know")
-        tokeep = np.ones(df.shape[0], dtype=bool)
-        for ii in my_range:
-            subset = df.iloc[ii:ii + steps]
-            sin_lats = subset['sin_lat'].to_numpy()
-            cos_lats = subset['cos_lat'].to_numpy()
-            lons = subset['Longitudes_rad'].to_numpy()
-            for nogo in nogos:
-                temp = np.arccos(sin_lats * nogo[0] + cos_lats * nogo[1] * np.cos(lons - nogo[2]))
-                if np.min(temp) < nogo[3]:
-                    tokeep[ii:ii + steps] = np.zeros(steps, dtype=bool)
-                    break
-            else:  # Stop deleting (no break)
-                break
-
-        return df.iloc[tokeep]
-
-    all_positions = []
-    all_df = pandas.DataFrame({
-        'Duration': [], 'Distance': [], 'Altitudes': [], 'Altitudes_srtm': [], 'Speed_5': [], 'Speed_50': [],
-        'Times': [], 'Latitudes_deg': [], 'Longitudes_deg': [], 'Longitudes_rad': [], 'sin_lat': [], 'cos_lat': []
-    })
-
-    earth_radius = 6371.009
-    nogos = []
-    if not admin:
-        for nogo in NoGoAreas.objects.all():
-            lat = radians(nogo.latitude)
-            lon = radians(nogo.longitude)
-            nogos.append([sin(lat), cos(lat), lon, nogo.radius / earth_radius])
-
-    df_geoloc = pandas.DataFrame.from_records(list(GeoLocateData.objects.all().values()))
+    shown_tracks = []
+    all_columns = [
+        'Duration', 'Distance', 'Altitudes', 'Altitudes_srtm', 'Speed_5', 'Speed_50',
+        'Times', 'Latitudes_deg', 'Longitudes_deg', 'Longitudes_rad', 'sin_lat', 'cos_lat'
+    ]
+    # The arrays of each file, concatenated once after the loop
+    all_arrays = {column: [] for column in all_columns}
+
+    earth_radius = track_metrics.EARTH_RADIUS
+    nogos = None if admin else NoGoAreas.as_vectors()
+    versions = data_version.get_all('GPSData', 'NoGoAreas')
+
+    # Only the places close to the tracks
+    place_ids = spatial_index.places_in_bounds(tracks_bounds) if objs else set()
+    df_geoloc = pandas.DataFrame.from_records(
+        list(GeoLocateData.objects.filter(pk__in=place_ids).values()),
+        columns=['id', 'name', 'latitude', 'longitude', 'radius']
+    )
     radius_deg = df_geoloc['radius'] / (earth_radius * radians(1))
     radius_deg_lat = radius_deg / np.cos(np.radians(df_geoloc['latitude']))
     # Doesn't work for longitudes at +- 180 and poles
@@ -671,85 +735,46 @@ def analyse_gps_data_sets(
         slice = max(2, min(10, int(number_of_files / 60) + 1))
     else:
         slice = 1
-    settings = {'slice': slice}
-    for obj_index, data in enumerate(objs):
-        df = pandas.DataFrame(data)
-        if slice > 1:
-            df = df.iloc[::slice]
-        df['Latitudes_rad'] = np.radians(df['Latitudes_deg'])
-        df['Longitudes_rad'] = np.radians(df['Longitudes_deg'])
-        df['sin_lat'] = np.sin(df['Latitudes_rad'])
-        df['cos_lat'] = np.cos(df['Latitudes_rad'])
+    stored_metrics = GPSDataMetrics.stored(dict(zip(filenames, checksums)))
+    for obj_index, track in enumerate(objs):
+        begin, end = 0, track['Times'].shape[0]
         if not admin:
-            df = check_no_go(nogos, df, 'begin')
-            df = check_no_go(nogos, df, 'end')
+            begin, end = trimmed_range(filenames[obj_index], track, versions, nogos)
+        df = track_metrics.points_frame(track, slice, begin, end)
 
         if df.shape[0] < 10:
             continue
-        window_med_duration = 50
-        paused_after = 30 * slice  # assume a pause if the next data point took 30s to appear
-        min_consecutive_points = 10  # exclude sections with breaks within min_consecutive_points points
-        min_periods = 3  # to calculate rolling median/sum at least these number of datapoints should not be nans
-        # Duration
-        duration = np.zeros(df.shape[0])
-        duration[1:] = (df['Times'].shift(-1) - df['Times'])[:-1]  # in Seconds
-        df['Duration'] = duration
-        ## Exclude datapoints after/during a stop
-        df.loc[df['Duration'] > paused_after, 'Duration'] = np.nan
-        duration_rolling_median = df['Duration'].rolling(
-            window=window_med_duration, min_periods=int(0.1 * window_med_duration)
-        ).median().to_numpy()
-        df.loc[df['Duration'] > 3 * duration_rolling_median, 'Duration'] = np.nan
-        duration_is_nan = np.where(df['Duration'].isna().to_numpy())[0]
-        if duration_is_nan.shape[0] >= 1:
-            if duration_is_nan[0] <= min_consecutive_points:
-                df['Duration'][0:duration_is_nan[0]] = np.nan
-            if duration_is_nan[-1] >= df.shape[0] - min_consecutive_points:
-                df['Duration'][duration_is_nan[-1]:] = np.nan
-            # Indexes, where gap between spaces <= min_consecutive_points:
-            space_nan = np.where(duration_is_nan[1:] - duration_is_nan[:-1] <= min_consecutive_points)[0]
-            for index in space_nan:
-                index_df_beg = duration_is_nan[index]
-                index_df_end = duration_is_nan[index + 1]
-                df['Duration'][index_df_beg:index_df_end] = np.nan
+        point_metrics = stored_metrics.get(filenames[obj_index])
+        if point_metrics is None:
+            # Only until the background thread has calculated them, e.g. after a database dump was loaded
+            point_metrics = track_metrics.calculate_metrics(track_metrics.points_frame(track, 1), 1)
+        metrics = track_metrics.select_points(point_metrics, begin, end, slice)
+        for column, values in metrics.items():
+            df[column] = values
         df.loc[df['Duration'].isna(), 'Altitudes'] = np.nan
-        # Distance
-        distance = np.zeros(df.shape[0])
-        distance[1:] = (np.arccos(
-            df['sin_lat'] * df['sin_lat'].shift(-1) +
-            df['cos_lat'] * df['cos_lat'].shift(-1) * np.cos(df['Longitudes_rad'] - df['Longitudes_rad'].shift(-1))
-        ) * earth_radius)[:-1]
-        df['Distance'] = distance
-        df.loc[df['Duration'].isna(), 'Distance'] = np.nan
-        # Speed
-        duration_rolling_sum = df['Duration'].rolling(window=5, min_periods=min_periods).sum().to_numpy()
-        distance_rolling_sum = df['Distance'].rolling(window=5, min_periods=min_periods).sum().to_numpy()
-        df['Speed_5'] = distance_rolling_sum / duration_rolling_sum * 3600
-        duration_rolling_sum = df['Duration'].rolling(window=50, min_periods=min_periods).sum().to_numpy()
-        distance_rolling_sum = df['Distance'].rolling(window=50, min_periods=min_periods).sum().to_numpy()
-        df['Speed_50'] = distance_rolling_sum / duration_rolling_sum * 3600
-
-        # Add markers for each GPS data point
-        positions = df[['Latitudes_deg', 'Longitudes_deg']].values.tolist()
-
-        distance = df['Distance'].sum()
-        duration = df['Duration'].sum()
-        individual_gps_list[obj_index]['Distance'] = distance
-        individual_gps_list[obj_index]['Duration'] = duration
-        individual_gps_list[obj_index]['Speed'] = distance / duration * 3600
-
-        all_positions.append(positions)
-        all_df = pandas.concat(
-            [all_df, df[[
-                'Duration', 'Distance', 'Altitudes', 'Altitudes_srtm', 'Speed_5', 'Speed_50', 'Times',
-                'Latitudes_deg', 'Longitudes_deg', 'Longitudes_rad', 'sin_lat', 'cos_lat'
-            ]][~df['Duration'].isna()]], ignore_index=True
+
+        # The points for the map, in indexes of the whole track
+        shown_tracks.append((obj_index, begin, end))
+
+        totals = track_metrics.summarise(df, metrics)
+        individual_gps_list[obj_index]['Distance'] = totals['distance']
+        individual_gps_list[obj_index]['Duration'] = totals['duration']
+        individual_gps_list[obj_index]['Speed'] = (
+            totals['distance'] / totals['duration'] * 3600 if totals['duration'] else float('nan')
         )
 
-    if all_df.shape[0] == 0:
-        return {'gps': None}
+        has_duration = ~df['Duration'].isna().to_numpy()
+        for column in all_columns:
+            all_arrays[column].append(df[column].to_numpy()[has_duration])
 
-    context = {'gps': None, 'gps_positions': all_positions, 'individual_gps_list': individual_gps_list}
+    if sum(array.shape[0] for array in all_arrays['Duration']) == 0:
+        return {'gps': None, 'slice': slice}
+    # float64 like the previous concatenation with an empty frame
+    all_df = pandas.DataFrame({
+        column: np.concatenate(arrays, dtype=np.float64) for column, arrays in all_arrays.items()
+    })
+
+    context = {'gps': None, 'individual_gps_list': individual_gps_list}
 
     if plot_graphs:
         all_df['Cum_dist'] = all_df['Distance'].cumsum()
@@ -772,13 +797,14 @@ def analyse_gps_data_sets(
                                  mode='lines', marker=dict(color='#FF0000')))
 
         covered_time_d = (all_df['Times'].max() - all_df['Times'].min()) / 3600 / 24
-        if all_df.shape[0] < 30000:
-            prev_time = 0
+        diff_sec = all_df.shape[0] / 15
+        times = all_df['Times'].to_numpy()
+        time_labels = time_label_indexes(times, diff_sec, MAX_TIME_LABELS)
+        if time_labels is not None:
             min_alt = all_df['Altitudes'].min()
             max_alt = all_df['Altitudes'].max()
 
             diff_dist = all_df['Cum_dist'].max() / 200.
-            diff_sec = all_df.shape[0] / 15
             # make dependent on number of datapoints
             if covered_time_d < 1:
                 time_str = '%H:%M'
@@ -788,50 +814,29 @@ def analyse_gps_data_sets(
                 time_str = '%Y-%m-%d'
             else:
                 time_str = '%Y-%m-%d'
-            for index, row in all_df.iterrows():
-                if row['Times'] > prev_time:
-                    prev_time = row['Times'] + diff_sec
-                    fig.add_annotation(go.layout.Annotation(
-                        x=row[ax], y=min_alt,
-                        text=datetime.datetime.utcfromtimestamp(row['Times']).strftime(time_str),
-                        align='center', showarrow=False, yanchor='bottom', textangle=90, clicktoshow=False,
-                        font=dict(color='rgb(125,125,125)', size=10)
-                    ))
+            # Added with a single update of the layout, each add_annotation copies all annotations
+            x_values = all_df[ax].to_numpy()
+            annotations = [
+                dict(
+                    x=x_values[index], y=min_alt,
+                    text=datetime.datetime.utcfromtimestamp(times[index]).strftime(time_str),
+                    align='center', showarrow=False, yanchor='bottom', textangle=90, clicktoshow=False,
+                    font=dict(color='rgb(125,125,125)', size=10)
+                ) for index in time_labels
+            ]
             font_places = dict(color='rgb(125,125,125)', size=10)
-            df10th = all_df.iloc[::10].copy()
-            df10th['place_sep'] = np.zeros(df10th.shape[0]) + earth_radius
-            df10th['places'] = df10th.apply(lambda _: '', axis=1)
-            for index_geo, geoloc in df_geoloc.iterrows():
-                sub_sec = ((geoloc['lat_min'] < df10th['Latitudes_deg']) & (df10th['Latitudes_deg'] < geoloc['lat_max']) &
-                           (geoloc['lon_min'] < df10th['Longitudes_deg']) & (df10th['Longitudes_deg'] < geoloc['lon_max'])).to_numpy()
-                if not sub_sec.any():
-                    # All false
-                    continue
-                separation = np.arccos(
-                    df10th.loc[sub_sec, 'sin_lat'] * geoloc['sin_lat'] +
-                    df10th.loc[sub_sec, 'cos_lat'] * geoloc['cos_lat'] * np.cos(df10th.loc[sub_sec, 'Longitudes_rad'] - geoloc['Longitudes_rad'])
-                ).to_numpy()
-                sub_sub_sec = (separation < df10th.loc[sub_sec, 'place_sep']) & (separation < geoloc['radius'] / earth_radius)
-                if not sub_sub_sec.all():
-                    index_to_false = np.where(sub_sec)[0][~sub_sub_sec]
-                    sub_sec[index_to_false] = False
-                df10th.loc[sub_sec, 'place_sep'] = separation[sub_sub_sec]
-                df10th.loc[sub_sec, 'places'] = geoloc['name']
-            df10th.loc[df10th['Distance'].isna(), 'place_sep'] = np.nan
-            while df10th['place_sep'].min() < earth_radius:
-                index = df10th['place_sep'].idxmin()
-                cum_dist = df10th['Cum_dist'][index]
-                name = df10th['places'][index]
-                if isinstance(cum_dist, pandas.core.series.Series):
-                    cum_dist = cum_dist.to_numpy()[0]
-                    name = name.to_numpy()[0]
-                df10th.loc[((cum_dist - diff_dist) < df10th['Cum_dist']) &
-                           (df10th['Cum_dist'] < (cum_dist + diff_dist)), 'place_sep'] = earth_radius
-                fig.add_annotation(go.layout.Annotation(
-                    x=cum_dist, y=max_alt, text=name,
+            df10th = all_df.iloc[::10]
+            place_index, place_sep = place_labels.nearest_places(df10th, df_geoloc)
+            place_sep[df10th['Distance'].isna().to_numpy()] = np.nan
+            cum_dists = df10th['Cum_dist'].to_numpy()
+            place_names = df_geoloc['name'].to_numpy()
+            for index in place_labels.select_labels(cum_dists, place_sep, diff_dist):
+                annotations.append(dict(
+                    x=cum_dists[index], y=max_alt, text=place_names[place_index[index]],
                     align='center', showarrow=False, yanchor='top', textangle=90, clicktoshow=False,
                     font=font_places
                 ))
+            fig.update_layout(annotations=annotations)
 
         fig.add_trace(go.Scatter(x=all_df[ax], y=all_df[ay2], name="Speed (5 points)", yaxis="y2",
                                  mode='lines', marker=dict(color='#00FF00'), opacity=0.5))
@@ -866,7 +871,7 @@ def analyse_gps_data_sets(
                 position=0.92
             ),
         )
-        context["plot_div"] = plot(fig, output_type="div")
+        context["plot_figure"] = plot_data.figure_json(fig)
     # map_center and zoom won't work for +/- 180 deg longitude
     max_lat = all_df['Latitudes_deg'].max()
     min_lat = all_df['Latitudes_deg'].min()
@@ -877,7 +882,20 @@ def analyse_gps_data_sets(
     context['center'] = map_center
     context['zoom'] = zoom
     context['min_max_coords'] = [min_lat, max_lat, min_lon, max_lon]
-    context['settings'] = settings
+    context['slice'] = slice
+
+    # The map gets the simplified tracks for the zoom and loads more details when zooming in
+    level = simplify.level_for_zoom(zoom)
+    track_levels = GPSDataLevels.for_tracks({
+        filenames[obj_index]: (objs_in_tracks[obj_index], checksums[obj_index]) for obj_index, _, _ in shown_tracks
+    })
+    context['gps_positions'] = [
+        track_positions(objs[obj_index], track_levels[filenames[obj_index]], level, begin, end)[0]
+        for obj_index, begin, end in shown_tracks
+    ]
+    context['gps_filenames'] = [filenames[obj_index] for obj_index, _, _ in shown_tracks]
+    context['gps_level'] = level
+    context['level_zooms'] = list(simplify.LEVEL_ZOOMS)
 
     return context
 
@@ -900,7 +918,7 @@ def read_GpsDateRangeForm(request):
             initial_values['end_date'] = end_date
             beg_date = create_timezone_object(begin_date)
             end_date = create_timezone_object(end_date) + datetime.timedelta(days=1) - datetime.timedelta(seconds=1)
-            gpsData = GPSData.objects.filter(end__gte=beg_date, start__lte=end_date).order_by('start')
+            gpsData = GPSData.objects.metadata().filter(end__gte=beg_date, start__lte=end_date).order_by('start')
         if zoom:
             # only if the user selects to use coordinates
             coords = {'zoom': int(zoom), 'cenLat': float(cenLat), 'cenLng': float(cenLng)}
@@ -912,7 +930,7 @@ def gps_detail_view(request, filename=None):
     form, gpsData, coords, initial_values = read_GpsDateRangeForm(request)
     if not gpsData:
         if filename == "all":
-            gpsData = GPSData.objects.all()
+            gpsData = GPSData.objects.metadata()
             begin_date = GPSData.objects.all().aggregate(Min('start'))['start__min']
             end_date = GPSData.objects.all().aggregate(Max('end'))['end__max']
             initial_values['begin_date'] = begin_date
@@ -931,7 +949,7 @@ def gps_detail_view(request, filename=None):
     if 'min_max_coords' in context:
         coords = context['min_max_coords']
         context['photo_data'] = PhotoData.objects.filter(
-            latitude__gte=coords[0], latitude__lte=coords[1], longitude__gte=coords[2], longitude__lte=coords[3])
+            filename__in=spatial_index.photos_in_bounds([coords[0], coords[2], coords[1], coords[3]]))
 
     return render(request, 'cycle_data/cycle_detail.html', context=context)
 
@@ -947,7 +965,7 @@ class GPSDataListView(generic.ListView):
 
     def get_queryset(self):
         # executed when the page is opened
-        return GPSData.objects.all()
+        return GPSData.objects.metadata()
 
 
 def add_places_admin_view(request):
@@ -995,7 +1013,7 @@ def add_places_admin_view(request):
                             f"No file found for {filename}, description was: {desc}, lat/lon: {lat:.7f}/{lon:.7f}"
                         )
 
-    gpsData = GPSData.objects.all()
+    gpsData = GPSData.objects.metadata()
     context = analyse_gps_data_sets(gpsData, coords=None, plot_graphs=False, admin=request.user.is_superuser)
 
     context['markers'] = GeoLocateData.objects.all()
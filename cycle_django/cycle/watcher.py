@@ -0,0 +1,214 @@
+""" Wait for changes in folders instead of polling them
+
+Uses inotify (through ctypes, Linux only). Folders that can't be watched that way (other OS, missing folder,
+too many watches) are compared against a snapshot of their mtimes every poll interval instead.
+Events are debounced, so copying many files results in one reload.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from typing import Dict, List, Set, Tuple, Union
+
+from my_base import Logging
+
+logger = Logging.setup_logger(__name__)
+
+WATCH_DEBOUNCE = float(os.environ.get('WATCH_DEBOUNCE', 2))    # seconds without events before reporting them
+WATCH_MAX_DELAY = 30    # report a continuous stream of events at least this often
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+# IN_MODIFY, so files that are still being written keep delaying the report
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ATTRIB
+_event_header = struct.Struct('iIII')   # wd, mask, cookie, length of the name
+
+
+class Inotify:
+    """ Minimal wrapper of the inotify system calls """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Can't watch {path}: {os.strerror(errno)}")
+        return wd
+
+    def read_events(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """ Returns (watch descriptor, mask, name) of the events, waits up to timeout seconds for the first one """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _event_header.unpack_from(data, offset)
+            offset += _event_header.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """ Collects the changed paths per topic, e.g. {'gpx': {'/folder/subfolder/file.gpx'}} """
+
+    def __init__(
+            self, poll_interval: float = 60, debounce: float = WATCH_DEBOUNCE, use_inotify: bool = True
+    ):
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                logger.warning(f"Can't use inotify, will poll the folders instead: {e}")
+        self.watches: Dict[int, Tuple[str, str, bool]] = {}   # watch descriptor: (directory, topic, recursive)
+        self.polled: Dict[Tuple[str, str, bool], Dict[str, float]] = {}    # (folder, topic, recursive): snapshot
+        self.last_poll = time.time()
+
+    def watch(self, folder: str, topic: str, recursive: bool = False):
+        if self.inotify and os.path.isdir(folder):
+            try:
+                self._add_inotify_watches(folder, topic, recursive)
+                return
+            except OSError as e:
+                logger.warning(f"Will poll {folder}: {e}")
+        self.polled[(folder, topic, recursive)] = self.snapshot(folder, recursive)
+
+    def _add_inotify_watches(self, folder: str, topic: str, recursive: bool):
+        self.watches[self.inotify.add_watch(folder)] = (folder, topic, recursive)
+        if recursive:
+            for foldername, subfolders, _ in os.walk(folder):
+                for subfolder in subfolders:
+                    path = os.path.join(foldername, subfolder)
+                    self.watches[self.inotify.add_watch(path)] = (path, topic, recursive)
+
+    @staticmethod
+    def snapshot(folder: str, recursive: bool) -> Dict[str, float]:
+        """ mtimes of the directories (and of the files directly in the folder, if not recursive) """
+        result = {}
+        if not os.path.isdir(folder):
+            return result
+        if recursive:
+            for foldername, _, _ in os.walk(folder):
+                try:
+                    result[foldername] = os.stat(foldername).st_mtime
+                except OSError:
+                    pass
+        else:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        result[entry.path] = entry.stat().st_mtime
+                    except OSError:
+                        pass
+        return result
+
+    def _poll(self, changes: Dict[str, Set[str]]) -> int:
+        """ Returns the number of changed paths, also the ones that already changed before """
+        self.last_poll = time.time()
+        number_changes = 0
+        for key, old_snapshot in self.polled.items():
+            folder, topic, recursive = key
+            new_snapshot = self.snapshot(folder, recursive)
+            changed = {
+                path for path in set(old_snapshot) | set(new_snapshot)
+                if old_snapshot.get(path) != new_snapshot.get(path)
+            }
+            if changed:
+                changes.setdefault(topic, set()).update(changed)
+                number_changes += len(changed)
+            self.polled[key] = new_snapshot
+        return number_changes
+
+    def _read_inotify(self, changes: Dict[str, Set[str]], timeout: float) -> int:
+        """ Returns the number of events, also the ones for paths that already changed before """
+        number_events = 0
+        for wd, mask, name in self.inotify.read_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, report all watched folders as changed
+                for directory, topic, _ in self.watches.values():
+                    changes.setdefault(topic, set()).add(directory)
+                number_events += 1
+                continue
+            if wd not in self.watches:
+                continue
+            directory, topic, recursive = self.watches[wd]
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(directory, name)
+            if recursive and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_inotify_watches(path, topic, recursive)
+                except OSError as e:
+                    logger.warning(f"Can't watch new folder {path}: {e}")
+            changes.setdefault(topic, set()).add(path)
+            number_events += 1
+        return number_events
+
+    def wait_for_changes(self, timeout: float, stopped: Union[threading.Event, None] = None) -> Dict[str, Set[str]]:
+        """ Returns the changed paths per topic, after no further changes happened for the debounce time, also not to
+        the paths that already changed (e.g. a file that is still being written).
+        Returns an empty dict if nothing changed within the timeout.
+        """
+        changes: Dict[str, Set[str]] = {}
+        begin = time.time()
+        first_change = None
+        last_change = None
+        while not (stopped and stopped.is_set()):
+            now = time.time()
+            if first_change is None and now - begin >= timeout:
+                break
+            if first_change is not None and (
+                    now - last_change >= self.debounce or now - first_change >= WATCH_MAX_DELAY
+            ):
+                break
+            wait = 1 if first_change is None else min(1., self.debounce)
+            number_events = 0
+            if self.inotify and self.watches:
+                number_events += self._read_inotify(changes, wait)
+            elif stopped:
+                stopped.wait(wait)
+            else:
+                time.sleep(wait)
+            if self.polled and time.time() - self.last_poll >= self.poll_interval:
+                number_events += self._poll(changes)
+            if number_events:
+                last_change = time.time()
+                if first_change is None:
+                    first_change = last_change
+        return changes
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
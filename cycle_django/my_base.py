@@ -49,9 +49,14 @@ def create_timezone_object(input_date: datetime.date) -> datetime.datetime:
 class PhotoStorage:
     filenames_ = set()
     def __init__(self):
+        self.refresh()
+
+    def refresh(self):
+        filenames = set()
         for folder in PHOTO_FOLDERS:
-            for foldername, subfolders, filenames in os.walk(folder):
-                self.filenames_ |= {os.path.join(foldername, filename) for filename in filenames}
+            for foldername, subfolders, filenames_in_folder in os.walk(folder):
+                filenames |= {os.path.join(foldername, filename) for filename in filenames_in_folder}
+        self.filenames_ = filenames
 
     def full_fillname_or_false(self, filename: str) -> Union[bool, str]:
         for entry in self.filenames_: